@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures the CPU used by the event loop while many artifacts are being joined.
+
+The artifacts are started with an offline client (no XMPP server is needed) and
+just wait until they are killed, so all the CPU time measured is spent by the loop
+waiting in ``join``.
+
+Usage::
+
+    python benchmarks/join_idle_cpu.py --artifacts 1000 --seconds 5
+    python benchmarks/join_idle_cpu.py --artifacts 1000 --seconds 5 --polling
+"""
+import argparse
+import asyncio
+import time
+
+import spade_artifact.artifact
+from spade_artifact import Artifact
+
+
+class _OfflineClient:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def add_event_handler(self, *args, **kwargs):
+        pass
+
+
+class _OfflinePubSub:
+    async def create(self, *args, **kwargs):
+        return None
+
+
+class IdleArtifact(Artifact):
+    async def _async_connect(self):
+        pass
+
+    async def _hook_plugin_after_connection(self, *args, **kwargs):
+        self.pubsub = _OfflinePubSub()
+
+    async def run(self):
+        await self.join()
+
+
+async def polling_join(artifact):
+    """The previous implementation of ``join``, kept as a baseline."""
+    while artifact.is_alive():
+        await asyncio.sleep(0.001)
+
+
+async def main(n_artifacts, seconds, polling):
+    spade_artifact.artifact.XMPPClient = _OfflineClient
+    artifacts = [
+        IdleArtifact(f"idle{i}@localhost", "secret") for i in range(n_artifacts)
+    ]
+    for artifact in artifacts:
+        artifact.set_loop(asyncio.get_running_loop())
+        await artifact.start(auto_register=False)
+
+    join = polling_join if polling else (lambda a: a.join())
+    joins = asyncio.gather(*[join(artifact) for artifact in artifacts])
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.sleep(seconds)
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+    for artifact in artifacts:
+        artifact.kill()
+    await joins
+
+    mode = "polling" if polling else "event"
+    print(
+        f"{n_artifacts} artifacts joined ({mode}): "
+        f"{cpu:.3f}s CPU in {wall:.3f}s wall ({100 * cpu / wall:.1f}% of a core)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--artifacts", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument(
+        "--polling", action="store_true", help="use the old 1 ms polling join"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.artifacts, args.seconds, args.polling))
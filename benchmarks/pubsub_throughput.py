@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures the throughput and latency from publish to focus callbacks.
+
+Artifacts and agents are attached to an in-process ``FakePubSubServer``, so no
+XMPP server is needed and the figures only include the cost of the library.
+Two topologies are measured:
+
+* fan-out (1→N): one artifact publishes and N agents focus on it
+* fan-in (N→1): N artifacts publish and one agent focuses on all of them
+
+Usage::
+
+    python benchmarks/pubsub_throughput.py --peers 10 --messages 10000
+    python benchmarks/pubsub_throughput.py --peers 100 --messages 1000 --batch 50
+    python benchmarks/pubsub_throughput.py --peers 10 --messages 10000 --loopback
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+from loguru import logger
+from spade.agent import Agent
+
+from spade_artifact import Artifact, ArtifactMixin
+from spade_artifact.fake_pubsub import FakePubSubServer
+
+
+class BenchmarkArtifact(Artifact):
+    async def run(self):
+        await self.join()
+
+
+class BenchmarkAgent(ArtifactMixin, Agent):
+    pass
+
+
+class Collector(object):
+    """Records the latency of every delivered payload."""
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.latencies = []
+        self.done = asyncio.Event()
+
+    def __call__(self, jid, payload):
+        self.latencies.append(time.perf_counter() - float(payload))
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def publish(artifact, messages, batch):
+    if batch is None:
+        for _ in range(messages):
+            await artifact.publish(str(time.perf_counter()))
+        return
+    for i in range(0, messages, batch):
+        now = str(time.perf_counter())
+        await artifact.publish_many([now] * min(batch, messages - i))
+
+
+async def start(server, entities):
+    for entity in entities:
+        server.attach(entity)
+        if isinstance(entity, Artifact):
+            entity.set_loop(asyncio.get_running_loop())
+        await entity.start(auto_register=False)
+
+
+async def run_topology(
+    name, n_publishers, n_subscribers, messages, batch, latency, local
+):
+    # Every topology gets its own service, since created nodes are remembered per service
+    server = FakePubSubServer(jid=f"pubsub.{name}.localhost", latency=latency)
+    publishers = [
+        BenchmarkArtifact(f"publisher{i}@localhost", "secret")
+        for i in range(n_publishers)
+    ]
+    subscribers = [
+        BenchmarkAgent(f"subscriber{i}@localhost", "secret")
+        for i in range(n_subscribers)
+    ]
+    for publisher in publishers:
+        publisher.set_loopback(local)
+    await start(server, publishers + subscribers)
+
+    collector = Collector(messages * n_publishers * n_subscribers)
+    for subscriber in subscribers:
+        for publisher in publishers:
+            await subscriber.artifacts.focus(str(publisher.jid), collector)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(
+        *[publish(publisher, messages, batch) for publisher in publishers]
+    )
+    await collector.done.wait()
+    elapsed = time.perf_counter() - start_time
+
+    for entity in publishers + subscribers:
+        await entity.stop()
+
+    latencies = collector.latencies
+    print(
+        f"{name:<8} {n_publishers:>4}→{n_subscribers:<4} "
+        f"{len(latencies):>9} msgs {len(latencies) / elapsed:>11.0f} msgs/s "
+        f"p50 {1000 * percentile(latencies, 0.5):>8.3f} ms "
+        f"p99 {1000 * percentile(latencies, 0.99):>8.3f} ms"
+    )
+
+
+async def main(peers, messages, batch, latency, local):
+    await run_topology("fan-out", 1, peers, messages, batch, latency, local)
+    await run_topology("fan-in", peers, 1, messages, batch, latency, local)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--peers",
+        type=int,
+        default=10,
+        help="subscribers (fan-out) or publishers (fan-in)",
+    )
+    parser.add_argument(
+        "--messages",
+        type=int,
+        default=1000,
+        help="payloads published by every publisher",
+    )
+    parser.add_argument(
+        "--batch",
+        type=int,
+        default=None,
+        help="publish payloads in batches of this size",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0, help="simulated network latency in seconds"
+    )
+    parser.add_argument(
+        "--loopback",
+        action="store_true",
+        help="deliver payloads in-process (see Artifact.set_loopback)",
+    )
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    asyncio.run(
+        main(args.peers, args.messages, args.batch, args.latency, args.loopback)
+    )
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures the time to import every reader module once spade_artifact is loaded.
+
+Every module is imported in a fresh interpreter, several times, and the best time
+is reported together with the database and dataframe drivers it loaded (none is
+expected, since drivers are only imported when an artifact connects).
+
+Usage::
+
+    python benchmarks/reader_imports.py --repeat 5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = [
+    "apireader",
+    "csvreader",
+    "sqlreader",
+    "mongodbreader",
+    "context_broker_inserter",
+]
+DRIVERS = ["psycopg", "pymysql", "sqlite3", "pandas", "motor"]
+
+COLD_IMPORT = """
+import json, sys, time
+import spade_artifact
+start = time.perf_counter()
+import spade_artifact.common.readers.{module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "elapsed": elapsed,
+    "loaded": [name for name in {drivers!r} if name in sys.modules],
+}}))
+"""
+
+
+def cold_import(module):
+    code = COLD_IMPORT.format(module=module, drivers=DRIVERS)
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main(repeat):
+    for module in MODULES:
+        results = [cold_import(module) for _ in range(repeat)]
+        best = min(result["elapsed"] for result in results)
+        loaded = ", ".join(results[-1]["loaded"]) or "no drivers"
+        print(f"{module}: {1000 * best:.1f} ms ({loaded})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.repeat)
@@ -44,6 +44,10 @@ setup(
     ],
     description="Plugin for SPADE 3 to develop artifacts.",
     install_requires=requirements,
+    extras_require={
+        "msgpack": ["msgpack>=1.0.0"],
+        "zstd": ["zstandard>=0.21.0"],
+    },
     license="MIT license",
     long_description=readme + "\n\n" + history,
     include_package_data=True,
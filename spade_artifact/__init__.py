@@ -6,8 +6,12 @@ __author__ = """Javi Palanca"""
 __email__ = "jpalanca@gmail.com"
 __version__ = "0.3.1"
 
-from .artifact import Artifact
+from .artifact import Artifact, MailboxPolicy
 from .agent import ArtifactMixin
+from .host import ArtifactHost
+from .launcher import ArtifactSpec, Launcher
+from .scheduler import Priority
+from .startup import start_all
 
-__all__ = ['Artifact', 'ArtifactMixin']
+__all__ = ['Artifact', 'ArtifactHost', 'ArtifactMixin', 'ArtifactSpec', 'Launcher', 'MailboxPolicy', 'Priority', 'start_all']
 
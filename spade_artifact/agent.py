@@ -1,7 +1,19 @@
+import asyncio
+from collections import Counter
+from functools import partial
+from typing import Any, Optional
+
 from loguru import logger
 from spade_pubsub import PubSubMixin
+from slixmpp.exceptions import IqError, IqTimeout
 from slixmpp.stanza.message import Message as SlixmppMessage
 
+from . import loopback, metrics
+from .delta import DeltaDecoder
+from .dispatch import CallbackDispatcher
+from .nodes import property_node
+from .payload import PayloadError, is_delta, publisher_of, unpack
+
 
 class ArtifactMixin(PubSubMixin):
     def __init__(self, *args, pubsub_server=None, **kwargs):
@@ -24,19 +36,220 @@ class ArtifactComponent:
     def __init__(self, agent):
         self.agent = agent
         self.focus_callbacks = {}
+        self.focused_properties = {}
+        self._deltas = DeltaDecoder()
+        self._dispatcher = CallbackDispatcher()
+        self._last_values = {}
+        self._deliveries = Counter()
+        self._metrics = metrics.bind(agent.jid)
+        if self._metrics is not None:
+            self._dispatcher.histogram = self._metrics.callback_seconds
 
     def on_item_published(self, msg: SlixmppMessage):
         node = msg["pubsub_event"]["items"]["node"]
         if node in self.focus_callbacks:
             item = msg["pubsub_event"]["items"]["item"]["payload"]
-            jid = msg["pubsub_event"]["items"]["item"]["publisher"]
-            self.focus_callbacks[node](jid, item.text)
+            jid = publisher_of(item, msg["pubsub_event"]["items"]["item"]["publisher"])
+            try:
+                payloads = unpack(item)
+            except PayloadError as e:
+                logger.error(f"Discarding item from node <{node}>: {e}")
+                return
+            if is_delta(item):
+                payloads = self._apply_deltas(node, payloads)
+            self._deliver(node, jid, payloads)
+
+    def _deliver(self, node, jid, payloads):
+        callbacks = self.focus_callbacks.get(node)
+        if callbacks is None or not payloads:
+            return
+        self._last_values[node] = payloads[-1]
+        self._deliveries[node] += 1
+        if self._metrics is not None:
+            self._metrics.received_items.inc(len(payloads))
+        for payload in payloads:
+            for callback in list(callbacks):
+                self._dispatcher.dispatch(node, callback, jid, payload)
+
+    def _apply_deltas(self, node, deltas):
+        states = [self._deltas.apply(node, delta) for delta in deltas]
+        return [state for state in states if state is not None]
+
+    def set_dispatch(
+        self, queue_size: Optional[int] = 100, max_concurrency: Optional[int] = None
+    ):
+        """
+        Enables (or disables) queued dispatch of the focus callbacks.
+        While enabled, every focused node gets its own bounded queue and worker
+        task, so a slow callback does not delay the other artifacts nor the
+        XMPP stream. When a queue is full its oldest item is dropped.
+        Coroutine functions can be used as callbacks with or without queued dispatch.
+
+        Args:
+            queue_size (int or None): maximum number of pending items per focused node.
+                None disables queued dispatch and callbacks are invoked as soon as items arrive.
+            max_concurrency (int, optional): maximum number of callbacks running at once.
+        """
+        self._dispatcher.configure(queue_size, max_concurrency)
+
+    async def focus(self, artifact_jid, callback, properties=None, last: int = 0):
+        """
+        Subscribe to an artifact's publications.
+        Items published with a codec are decoded before calling the callback,
+        and the full state is rebuilt if the artifact publishes deltas.
+
+        Several callbacks may focus on the same artifact. They share a single
+        subscription and every payload is decoded once and handed to all of them,
+        so callbacks should not modify the payloads they receive.
+
+        If properties are given, the agent only subscribes to the nodes of those
+        properties (see ``Artifact.set_property_nodes``) and the callback is
+        invoked with a dict holding the name and the new value of the property.
+
+        If ``last`` is given, the last items kept by the node are fetched in a single request
+        and handed to the callback, so the agent gets the current state without waiting for
+        the next publication (see ``snapshot``). Pubsub fetches the items of one node per
+        request, so focusing on properties sends a request per property node, all of them
+        at once. Fetched items are skipped if a new item arrives while they are fetched.
+
+        Args:
+            artifact_jid (str): The JID of the artifact to focus on.
+            callback (Callable): The callback to invoke with the publisher JID and each payload.
+            properties (list of str, optional): The properties to focus on.
+            last (int): The number of items already published to fetch (Default value = 0).
+        """
+        if properties is None:
+            await self._add_callback(str(artifact_jid), callback)
+            if last:
+                await self._fetch_last(str(artifact_jid), callback, last, artifact_jid)
+            return
+
+        focused = self.focused_properties.setdefault(str(artifact_jid), set())
+        fetches = []
+        for name in properties:
+            node = property_node(artifact_jid, name)
+            property_callback = partial(_property_callback, callback, name)
+            await self._add_callback(node, property_callback)
+            focused.add(name)
+            if last:
+                fetches.append(
+                    self._fetch_last(node, property_callback, last, artifact_jid)
+                )
+        await asyncio.gather(*fetches)
+
+    async def ignore(self, artifact_jid, callback=None):
+        """
+        Stop receiving an artifact's publications, including its property nodes.
+        The agent unsubscribes from a node when no callback is left focusing on it.
+
+        Args:
+            artifact_jid (str): The JID of the artifact to ignore.
+            callback (Callable, optional): The callback to remove. All the callbacks
+                focusing on the artifact are removed if not provided.
+        """
+        focused = self.focused_properties.get(str(artifact_jid), set())
+        for name in list(focused):
+            node = property_node(artifact_jid, name)
+            await self._remove_callback(node, callback)
+            if node not in self.focus_callbacks:
+                focused.discard(name)
+        if not focused:
+            self.focused_properties.pop(str(artifact_jid), None)
+        await self._remove_callback(str(artifact_jid), callback)
+
+    def snapshot(self, artifact_jid, name: Optional[str] = None) -> Any:
+        """
+        Returns the last payload received from a focused artifact, without waiting
+        for its next publication.
+
+        Args:
+            artifact_jid (str): The JID of the artifact.
+            name (str, optional): The name of a focused property. If given, the last
+                value of the property is returned instead.
+
+        Returns:
+            object: The last payload (or property value), or None if nothing was received yet.
+        """
+        node = str(artifact_jid) if name is None else property_node(artifact_jid, name)
+        return self._last_values.get(node)
+
+    async def _fetch_last(self, node, callback, last, artifact_jid):
+        deliveries = self._deliveries[node]
+        try:
+            result = await self.agent.pubsub.pubsub.get_items(
+                self.agent.pubsub_server, node, max_items=last
+            )
+        except (IqError, IqTimeout) as e:
+            logger.warning(f"Could not fetch the last items of node <{node}>: {e}")
+            return
+        if self._deliveries[node] != deliveries or node not in self.focus_callbacks:
+            return
+        received = []
+        decoder = DeltaDecoder()
+        for item in result["pubsub"]["items"]:
+            payload = item["payload"]
+            if payload is None:
+                continue
+            try:
+                payloads = unpack(payload)
+            except PayloadError as e:
+                logger.error(f"Discarding item from node <{node}>: {e}")
+                continue
+            if is_delta(payload):
+                states = [decoder.apply(node, delta) for delta in payloads]
+                payloads = [state for state in states if state is not None]
+            jid = publisher_of(payload, str(artifact_jid))
+            received.extend((jid, value) for value in payloads)
+        self._deltas.merge(decoder)
+        if received:
+            self._last_values[node] = received[-1][1]
+        for jid, value in received:
+            self._dispatcher.dispatch(node, callback, jid, value)
+
+    async def _add_callback(self, node, callback):
+        if node in self.focus_callbacks:
+            self.focus_callbacks[node].append(callback)
+            return
+        self.focus_callbacks[node] = [callback]
+        if loopback.is_local(self.agent.pubsub_server, node):
+            loopback.subscribe(
+                self.agent.pubsub_server, node, self._deliver, self._leave_loopback
+            )
+            return
+        try:
+            await self.agent.pubsub.subscribe(self.agent.pubsub_server, node)
+        except Exception:
+            del self.focus_callbacks[node]
+            raise
+
+    async def _remove_callback(self, node, callback):
+        callbacks = self.focus_callbacks.get(node)
+        if callbacks is None:
+            return
+        if callback is None:
+            callbacks.clear()
+        else:
+            for i, focused in enumerate(callbacks):
+                if focused == callback or (
+                    isinstance(focused, partial) and focused.args[0] == callback
+                ):
+                    del callbacks[i]
+                    break
+        if callbacks:
+            return
+        del self.focus_callbacks[node]
+        self._last_values.pop(node, None)
+        self._deliveries.pop(node, None)
+        if not loopback.unsubscribe(self.agent.pubsub_server, node, self._deliver):
+            await self.agent.pubsub.unsubscribe(self.agent.pubsub_server, node)
+        self._dispatcher.close(node)
+        self._deltas.forget(node)
+
+    async def _leave_loopback(self, node):
+        """Subscribes through pubsub to a node whose publisher left loopback."""
+        if node in self.focus_callbacks:
+            await self.agent.pubsub.subscribe(self.agent.pubsub_server, node)
 
-    async def focus(self, artifact_jid, callback):
-        await self.agent.pubsub.subscribe(self.agent.pubsub_server, str(artifact_jid))
-        self.focus_callbacks[artifact_jid] = callback
 
-    async def ignore(self, artifact_jid):
-        await self.agent.pubsub.unsubscribe(self.agent.pubsub_server, str(artifact_jid))
-        if artifact_jid in self.focus_callbacks:
-            del self.focus_callbacks[artifact_jid]
+def _property_callback(callback, name, jid, value):
+    return callback(jid, {name: value})
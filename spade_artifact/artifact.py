@@ -1,12 +1,18 @@
 # -*- coding: utf-8 -*-
 import abc
 import asyncio
+import threading
 import time
 from asyncio import Event
-from typing import Union, Optional
+from collections import Counter, deque
+from enum import Enum
+from functools import partial
+from itertools import groupby
+from typing import Union, Optional, List, Callable, Any, AsyncIterator
+from xml.etree.ElementTree import Element
 
 from slixmpp import JID
-from slixmpp.exceptions import IqError, _DEFAULT_ERROR_TYPES
+from slixmpp.exceptions import IqError, IqTimeout
 from slixmpp.stanza.message import Message as SlixmppMessage
 
 from loguru import logger
@@ -14,9 +20,46 @@ from spade.agent import AuthenticationFailure, DisconnectedException
 from spade.container import Container
 from spade.message import Message
 from spade.presence import PresenceManager
+from spade.template import BaseTemplate
 from spade.xmpp_client import XMPPClient
 from spade_pubsub import PubSubMixin
 
+from . import compression, loopback, metrics
+from .codecs import Codec, JSONCodec, get_codec, resolve_codec
+from .delta import DeltaDecoder, DeltaEncoder
+from .dispatch import CallbackDispatcher
+from .knowledge import KnowledgeBase
+from .message import LazyMessage, MessageQueue
+from .nodes import (
+    forget_node,
+    is_node_known,
+    node_config,
+    properties_node,
+    property_node,
+    remember_nodes,
+)
+from .payload import (
+    DELTA_MARKER,
+    PUBLISHER_MARKER,
+    PayloadError,
+    compress_payload,
+    is_delta,
+    pack_batch,
+    pack_item,
+    publisher_of,
+    unpack,
+)
+from .routing import MessageRouter
+from .scheduler import Priority, PublishScheduler, TokenBucket
+
+
+class MailboxPolicy(Enum):
+    """Behaviour of a bounded mailbox when a message arrives and it is full"""
+
+    DROP_OLDEST = "drop-oldest"
+    DROP_NEWEST = "drop-newest"
+    REJECT = "reject"
+
 
 class AbstractArtifact(object, metaclass=abc.ABCMeta):
     async def _hook_plugin_before_connection(self, *args, **kwargs):
@@ -55,8 +98,16 @@ class Artifact(PubSubMixin, AbstractArtifact):
 
         self.client: Optional[XMPPClient] = None
         self.presence: Optional[PresenceManager] = None
+        self._host = None
+        self.startup_times = {}
 
-        self._values = {}
+        self._values = KnowledgeBase()
+        self._versions = Counter()
+        self._observables = {}
+        self._observables_changed = set()
+        self._observables_handle = None
+        self._observables_task = None
+        self._property_nodes: Optional[set] = None
 
         self.message_dispatcher = None
 
@@ -65,13 +116,448 @@ class Artifact(PubSubMixin, AbstractArtifact):
 
         self.loop = self.container.loop
 
-        self.queue = asyncio.Queue()
+        self.queue = MessageQueue()
+        self._mailbox_capacity: Optional[int] = None
+        self._mailbox_policy = MailboxPolicy.DROP_OLDEST
+        self._mailbox_overflows = Counter()
+        self._router = MessageRouter()
+        self._handlers = CallbackDispatcher()
         self._alive = Event()
+        self._stopped = Event()
+        self._stopped.set()
+        self._stopped_threadsafe = threading.Event()
+        self._stopped_threadsafe.set()
         self.subscriptions = {}
+        self._dispatcher = CallbackDispatcher()
+        self._metrics: Optional[metrics.ArtifactMetrics] = None
+
+        self._batch_max_items = None
+        self._batch_window = None
+        self._batch = []
+        self._batch_handle = None
+        self._batch_task = None
+
+        self._codec: Optional[Codec] = None
+        self._compression: Optional[str] = None
+        self._compression_threshold = 0
+        self._compression_stats = Counter()
+
+        self._delta: Optional[DeltaEncoder] = None
+        self._delta_key: Optional[Callable] = None
+        self._deltas = DeltaDecoder()
+
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._in_flight_tasks = set()
+        self._on_publish_error: Optional[Callable] = None
+
+        self._offline = False
+        self._offline_buffer: Optional[deque] = None
+        self._reconnect_delays = (1.0, 60.0)
+        self._reconnect_timeout = 30.0
+        self._reconnect_task = None
+        self._connection_stats = Counter()
+
+        self._loopback = False
+        self._loopback_remote = True
+
+        self._scheduler: Optional[PublishScheduler] = None
+        self._scheduler_stop_timeout: Optional[float] = 10
 
     def set_loop(self, loop):
         self.loop = loop
 
+    def set_batching(self, max_items: Optional[int], window: float = 0.05):
+        """
+        Enables (or disables) the auto-batching mode of ``publish``.
+        While enabled, published payloads are buffered and packed into a single
+        pubsub item when ``max_items`` are pending or ``window`` seconds have
+        passed since the first pending payload, whatever happens first.
+
+        Args:
+            max_items (int or None): maximum number of payloads per item. None disables batching.
+            window (float): maximum number of seconds a payload waits in the buffer
+        """
+        if max_items is not None and max_items < 1:
+            raise ValueError("max_items must be a positive integer")
+        self._batch_max_items = max_items
+        self._batch_window = window
+        if self._scheduler is not None:
+            self._scheduler.max_items = max_items
+
+    def set_codec(self, codec: Union[Codec, str, None]):
+        """
+        Sets the codec used to serialize published payloads.
+        With a codec, ``publish`` accepts any structured object supported by it
+        (dicts, lists, numbers...) and subscribers receive the decoded object.
+        The codec name travels with every item, so subscribers do not need to
+        be configured. If the codec cannot be loaded JSON is used instead.
+
+        Args:
+            codec (Codec, str or None): a codec or the name of a registered one ("json", "msgpack").
+                None publishes plain strings.
+        """
+        self._codec = resolve_codec(codec)
+
+    @property
+    def codec(self) -> Optional[Codec]:
+        """Returns the codec used to serialize published payloads"""
+        return self._codec
+
+    def set_compression(self, threshold: Optional[int], algorithm: str = "zlib"):
+        """
+        Compresses the published items larger than a threshold.
+        Compressed items are marked, so subscribers decompress them transparently.
+        If zstd is not installed, zlib is used instead.
+
+        Args:
+            threshold (int or None): minimum size of an item (in characters) to be compressed.
+                None disables compression.
+            algorithm (str): the compression algorithm, "zlib" or "zstd" (Default value = "zlib")
+        """
+        if threshold is None:
+            self._compression = None
+            return
+        if not compression.is_available(algorithm):
+            if algorithm != "zstd":
+                raise ValueError(f"Unsupported compression algorithm: {algorithm}")
+            logger.warning("zstandard is not installed. Falling back to zlib.")
+            algorithm = "zlib"
+        self._compression = algorithm
+        self._compression_threshold = threshold
+
+    def compression_stats(self) -> dict:
+        """
+        Returns the statistics of the compression of published items
+
+        Returns:
+          dict: number of items over the threshold (items), how many were sent compressed
+          (compressed), their total size before (size_in) and after (size_out) compression,
+          the compression ratio (size_out / size_in) and the seconds spent compressing (time)
+
+        """
+        stats = self._compression_stats
+        return {
+            "items": stats["items"],
+            "compressed": stats["compressed"],
+            "size_in": stats["size_in"],
+            "size_out": stats["size_out"],
+            "ratio": stats["size_out"] / stats["size_in"] if stats["size_in"] else None,
+            "time": stats["time"],
+        }
+
+    def set_delta(
+        self, snapshot_every: Optional[int] = 10, key: Optional[Callable] = None
+    ):
+        """
+        Enables (or disables) delta publishing.
+        While enabled, ``publish`` takes dicts and only publishes the fields that were added,
+        changed or removed since the last state published with the same key, plus a full
+        snapshot every ``snapshot_every`` publications. States that did not change are not
+        published. Subscribers rebuild the full state, so their callbacks receive whole dicts.
+        Delta publishing needs a codec; JSON is used if the artifact has none.
+
+        Args:
+            snapshot_every (int or None): publications of a key between full snapshots.
+                None disables delta publishing.
+            key (Callable, optional): extracts the key of a state (e.g. ``lambda row: row["id"]``).
+                By default all the states share the same key.
+        """
+        if snapshot_every is None:
+            self._delta = None
+            return
+        self._delta = DeltaEncoder(snapshot_every)
+        self._delta_key = key
+        if self._codec is None:
+            self._codec = get_codec(JSONCodec.name)
+
+    def set_property_nodes(self, enabled: bool = True):
+        """
+        Enables (or disables) publishing each property in its own pubsub node.
+        Property nodes are leaf nodes grouped under a collection node of the artifact,
+        so agents can focus on the properties they need instead of every update.
+        The collection node is created when the artifact starts, or before the first
+        property node if they are enabled afterwards.
+        Observable properties are published to their nodes when they change,
+        instead of publishing all of them to the artifact's node.
+        Property nodes need a codec; JSON is used if the artifact has none.
+
+        Args:
+          enabled (bool): whether properties are published to their own nodes
+
+        """
+        if not enabled:
+            self._property_nodes = None
+            return
+        if self._codec is None:
+            self._codec = get_codec(JSONCodec.name)
+        if self._property_nodes is None:
+            self._property_nodes = set()
+
+    def set_pipelining(
+        self, max_in_flight: Optional[int], on_error: Optional[Callable] = None
+    ):
+        """
+        Enables (or disables) pipelined publishing.
+        While enabled, ``publish`` returns as soon as the item is sent, keeping up to
+        ``max_in_flight`` items waiting for the acknowledgement of the server.
+        When the window is full, ``publish`` waits until an item is acknowledged.
+
+        Args:
+            max_in_flight (int or None): maximum number of unacknowledged items. None disables pipelining.
+            on_error (Callable, optional): called with the list of failed payloads and the
+                exception when a publication is rejected. Failures are logged if not provided.
+        """
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError("max_in_flight must be a positive integer")
+        self._in_flight = (
+            asyncio.Semaphore(max_in_flight) if max_in_flight is not None else None
+        )
+        self._on_publish_error = on_error
+
+    def set_rate_limit(
+        self,
+        rate: Optional[float],
+        burst: Optional[float] = None,
+        queue_size: int = 1000,
+        stop_timeout: Optional[float] = 10,
+    ):
+        """
+        Limits (or stops limiting) the rate of publications of the artifact.
+        While enabled, ``publish``, ``publish_many`` and ``publish_property`` queue the
+        payloads in a lane per priority and return at once, unless the lane already holds
+        ``queue_size`` payloads, in which case they wait until there is room. A worker
+        task publishes the queued payloads, highest priority first, with at most ``rate``
+        pubsub items per second after an initial burst. Consecutive payloads are packed
+        into a single item up to the auto-batching size (see ``set_batching``).
+        When the artifact stops, the queued payloads are published for up to ``stop_timeout``
+        seconds, and the ones still queued afterwards are discarded.
+
+        Args:
+            rate (float or None): maximum number of items published per second. None disables the rate limit.
+            burst (float, optional): number of items that can be published at once.
+                Defaults to one second of publications.
+            queue_size (int): maximum number of payloads queued per priority (Default value = 1000)
+            stop_timeout (float or None): seconds to keep publishing the queued payloads when
+                the artifact stops. None waits until the queue is empty (Default value = 10)
+        """
+        self._close_scheduler()
+        self._scheduler = None
+        self._scheduler_stop_timeout = stop_timeout
+        if rate is None:
+            return
+        self._scheduler = PublishScheduler(
+            self._publish_scheduled,
+            TokenBucket(rate, burst),
+            queue_size=queue_size,
+            max_items=self._batch_max_items,
+        )
+        self._scheduler.metrics = self._metrics
+
+    async def _drain_scheduler(self):
+        if self._scheduler is None:
+            return
+        try:
+            await asyncio.wait_for(
+                self._scheduler.join(), timeout=self._scheduler_stop_timeout
+            )
+        except asyncio.TimeoutError:
+            pass
+
+    def _close_scheduler(self):
+        if self._scheduler is None:
+            return
+        discarded = self._scheduler.close()
+        if discarded:
+            logger.warning(f"Artifact {self.jid} discarded {discarded} queued payloads")
+
+    def publish_queue_stats(self) -> dict:
+        """
+        Returns the statistics of the rate limited publish queue (see ``set_rate_limit``)
+
+        Returns:
+          dict: the payloads ``queued`` now in every priority lane, the ``capacity`` of each lane,
+          the payloads ``published`` and ``failed``, and the times the queue was ``throttled``
+          by the rate limit and ``publish`` was ``blocked`` by a full lane
+
+        """
+        scheduler = self._scheduler
+        if scheduler is None:
+            return {
+                "queued": {priority.value: 0 for priority in Priority},
+                "capacity": None,
+                "published": 0,
+                "failed": 0,
+                "throttled": 0,
+                "blocked": 0,
+            }
+        return {
+            "queued": scheduler.depth(),
+            "capacity": scheduler.queue_size,
+            "published": scheduler.stats["published"],
+            "failed": scheduler.stats["failed"],
+            "throttled": scheduler.stats["throttled"],
+            "blocked": scheduler.stats["blocked"],
+        }
+
+    def set_reconnect(
+        self,
+        buffer_size: Optional[int] = 1000,
+        initial_delay: float = 1.0,
+        max_delay: float = 60.0,
+        timeout: float = 30.0,
+    ):
+        """
+        Enables (or disables) automatic reconnection.
+        When the connection is lost, the artifact reconnects with exponential backoff.
+        Meanwhile, published payloads are kept in a bounded buffer (the oldest are
+        dropped when it is full) and they are published in order, in batches, once the
+        session is restored. Subscriptions to linked artifacts are renewed.
+
+        Args:
+            buffer_size (int or None): maximum number of payloads kept while disconnected.
+                None disables automatic reconnection.
+            initial_delay (float): seconds before the first reconnection attempt
+            max_delay (float): maximum seconds between reconnection attempts
+            timeout (float): seconds to wait for every reconnection attempt
+        """
+        if buffer_size is None:
+            self._offline_buffer = None
+            return
+        if buffer_size < 1:
+            raise ValueError("buffer_size must be a positive integer")
+        self._offline_buffer = deque(self._offline_buffer or (), maxlen=buffer_size)
+        self._reconnect_delays = (initial_delay, max_delay)
+        self._reconnect_timeout = timeout
+
+    def set_loopback(self, enabled: bool = True, remote: bool = True):
+        """
+        Enables (or disables) the in-process delivery of publications.
+        While enabled, agents and artifacts of the same process that focus on (or link to)
+        this artifact afterwards get its payloads directly as Python objects, without
+        serialization nor a round trip to the XMPP server. Payloads are delivered through
+        the event loop in publication order. Remote subscribers are still served through
+        pubsub unless ``remote`` is False. When disabled, the local subscribers of the
+        artifact subscribe to its nodes through pubsub.
+        Published objects are shared with the local subscribers, so they must not be
+        modified once published.
+
+        Args:
+            enabled (bool): whether payloads are delivered to local subscribers
+            remote (bool): whether payloads are also published to the pubsub node
+        """
+        self._loopback = enabled
+        self._loopback_remote = remote or not enabled
+        if self.is_alive():
+            self._register_loopback()
+
+    def _register_loopback(self):
+        if self._loopback:
+            loopback.register_publisher(self.pubsub_server, self.jid.bare)
+        else:
+            loopback.unregister_publisher(self.pubsub_server, self.jid.bare)
+
+    def connection_stats(self) -> dict:
+        """
+        Returns the statistics of the automatic reconnection
+
+        Returns:
+          dict: whether the artifact is ``connected``, the number of ``reconnections`` and
+          reconnection ``attempts``, the payloads ``buffered`` now, and the payloads
+          ``dropped`` and ``replayed`` since the artifact started
+
+        """
+        buffered = len(self._offline_buffer) if self._offline_buffer is not None else 0
+        return {
+            "connected": not self._is_offline(),
+            "reconnections": self._connection_stats["reconnections"],
+            "attempts": self._connection_stats["attempts"],
+            "buffered": buffered,
+            "dropped": self._connection_stats["dropped"],
+            "replayed": self._connection_stats["replayed"],
+        }
+
+    def set_dispatch(
+        self, queue_size: Optional[int] = 100, max_concurrency: Optional[int] = None
+    ):
+        """
+        Enables (or disables) queued dispatch of the callbacks of ``link``.
+        While enabled, every linked artifact gets its own bounded queue and worker
+        task, so a slow callback does not delay the other subscriptions nor the
+        XMPP stream. When a queue is full its oldest item is dropped.
+        Coroutine functions can be used as callbacks with or without queued dispatch.
+
+        Args:
+            queue_size (int or None): maximum number of pending items per subscription.
+                None disables queued dispatch and callbacks are invoked as soon as items arrive.
+            max_concurrency (int, optional): maximum number of callbacks running at once.
+        """
+        self._dispatcher.configure(queue_size, max_concurrency)
+
+    def set_mailbox(
+        self,
+        capacity: Optional[int],
+        policy: Union[MailboxPolicy, str] = MailboxPolicy.DROP_OLDEST,
+    ):
+        """
+        Bounds the number of messages waiting in the mailbox.
+        When a message arrives and the mailbox is full, the policy decides what happens:
+
+            * drop-oldest: the oldest message in the mailbox is discarded
+            * drop-newest: the incoming message is discarded
+            * reject: the incoming message is bounced to its sender with a
+              ``resource-constraint`` error. Incoming errors are discarded instead,
+              so two full mailboxes never bounce errors back and forth
+
+        Args:
+            capacity (int or None): maximum number of messages in the mailbox. None makes it unbounded.
+            policy (MailboxPolicy or str): the overflow policy (Default value = drop-oldest)
+        """
+        if capacity is not None and capacity < 1:
+            raise ValueError("capacity must be a positive integer")
+        self._mailbox_capacity = capacity
+        self._mailbox_policy = MailboxPolicy(policy)
+
+    def add_route(self, template: BaseTemplate, handler: Optional[Callable] = None):
+        """
+        Routes the messages matching a template to their own queue or handler instead of
+        the mailbox. Without a handler, the messages are received passing the template to
+        ``receive``, ``receive_many`` or ``messages``, and the queue of the route is bounded
+        like the mailbox (see ``set_mailbox``). When several templates match a message,
+        the route added first wins. Messages matching no template go to the mailbox.
+        Templates matching exact values are indexed, so adding routes does not slow down
+        the delivery of messages. Templates combined with operators are checked in order.
+
+        Args:
+            template (spade.template.BaseTemplate): the template of the messages
+            handler (Callable, optional): invoked with every matching message
+                (a spade.message.Message). It may be a coroutine function.
+        """
+        self.remove_route(template)
+        self._router.add(template, handler)
+
+    def remove_route(self, template: BaseTemplate):
+        """
+        Stops routing the messages matching a template.
+        The messages still queued in the route are moved to the mailbox.
+
+        Args:
+            template (spade.template.BaseTemplate): the template of the route
+        """
+        route = self._router.remove(template)
+        if route is None:
+            return
+        self._handlers.close(id(route))
+        while route.queue is not None and not route.queue.empty():
+            self.queue.put_nowait(route.queue.get_nowait())
+
+    def _mailbox(self, template: Optional[BaseTemplate]) -> asyncio.Queue:
+        if template is None:
+            return self.queue
+        route = self._router.get(template)
+        if route is None or route.queue is None:
+            raise ValueError(f"There is no queued route for template {template}")
+        return route.queue
+
     def set_container(self, container):
         """
         Sets the container to which the artifact is attached
@@ -109,42 +595,181 @@ class Artifact(PubSubMixin, AbstractArtifact):
             * connects the agent to the server
             * runs the registered behaviours
 
+        The time spent in every phase (connect, node and setup) is stored in ``startup_times``.
+
         Args:
           auto_register (bool, optional): register the agent in the server (Default value = True)
 
         """
+        await self._startup_connect(auto_register)
+        await self._startup_node()
+        await self._startup_run()
 
-        await self._hook_plugin_before_connection()
+    async def _startup_connect(self, auto_register=True):
+        start = time.perf_counter()
+        if self._host is None:
+            await self._hook_plugin_before_connection()
 
-        self.client = XMPPClient(
-            self.jid, self.password, self.verify_security, auto_register
-        )
-
-        # Presence service
-        self.presence = PresenceManager(agent=self, approve_all=False)
+            self.client = XMPPClient(
+                self.jid, self.password, self.verify_security, auto_register
+            )
 
-        await self._async_connect()
-        await self._hook_plugin_after_connection()
-
-        # pubsub initialization
-        try:
-            self._node = str(self.jid.bare)
-            await self.pubsub.create(self.pubsub_server, f"{self._node}")
-        except IqError as e:
-            if e.condition == _DEFAULT_ERROR_TYPES["conflict"]:
-                logger.info(f"Node {self._node} already registered")
-            elif e.condition == _DEFAULT_ERROR_TYPES["forbidden"]:
-                logger.error(
-                    f"Artifact {self._node} is not allowed to publish properties."
-                )
-            else:
-                logger.error(f"Error creating node: {e.format()}")
-            raise e
+            # Presence service
+            self.presence = PresenceManager(agent=self, approve_all=False)
 
+            await self._async_connect()
+            await self._hook_plugin_after_connection()
+            self.client.add_event_handler("disconnected", self._on_disconnected)
+        else:
+            self._share_connection()
+        self.startup_times["connect"] = time.perf_counter() - start
+
+    async def _startup_node(self):
+        start = time.perf_counter()
+        self._node = str(self.jid.bare)
+        await self._create_node(self._node)
+        self.startup_times["node"] = time.perf_counter() - start
+
+    async def _startup_run(self):
+        start = time.perf_counter()
+        self._metrics = metrics.bind(self.jid)
+        if self._metrics is not None:
+            self._dispatcher.histogram = self._metrics.callback_seconds
+        if self._scheduler is not None:
+            self._scheduler.metrics = self._metrics
         await self.setup()
+        self._stopped.clear()
+        self._stopped_threadsafe.clear()
         self._alive.set()
+        if self._loopback:
+            self._register_loopback()
+        if self._property_nodes is not None:
+            await self._create_properties_node()
+        if self._observables:
+            self._observables_changed.update(self._observables)
+            self._schedule_observables()
+        self.startup_times["setup"] = time.perf_counter() - start
         asyncio.run_coroutine_threadsafe(self.run(), loop=self.loop)
 
+    async def _abort_startup(self):
+        """Disconnects and stops an artifact that connected but failed to start."""
+        if not self.is_alive() and self._host is None and self.client is not None:
+            await self.client.disconnect()
+        await self._async_stop()
+
+    async def _create_node(self, node: str, config=None):
+        """
+        Creates a node unless it is known to exist (see ``spade_artifact.nodes``).
+
+        Args:
+            node (str): the name of the node
+            config (slixmpp.plugins.xep_0004.Form, optional): the configuration of the node
+        """
+        if is_node_known(self.pubsub_server, node):
+            logger.debug(f"Node {node} already exists. Skipping its creation.")
+            return
+        if await self.pubsub.create(self.pubsub_server, node, config) is not None:
+            remember_nodes(self.pubsub_server, [node])
+
+    def _share_connection(self):
+        if not self._host.is_alive():
+            raise RuntimeError(
+                f"The host {self._host.jid} must be started before its artifacts"
+            )
+        self.client = self._host.client
+        self.pubsub = self._host.pubsub
+
+    def _is_offline(self) -> bool:
+        return (self._host or self)._offline
+
+    def _on_disconnected(self, event):
+        if self._offline_buffer is None or self._offline or not self.is_alive():
+            return
+        logger.warning(f"Artifact {self.jid} disconnected. Reconnecting.")
+        self._offline = True
+        self._reconnect_task = asyncio.ensure_future(self._reconnect())
+
+    async def _reconnect(self):
+        delay, max_delay = self._reconnect_delays
+        while True:
+            await asyncio.sleep(delay)
+            if not self.is_alive():
+                return
+            self._connection_stats["attempts"] += 1
+            if await self._connect_again():
+                break
+            delay = min(delay * 2, max_delay)
+        self._offline = False
+        self._connection_stats["reconnections"] += 1
+        logger.info(f"Artifact {self.jid} reconnected.")
+        await self._on_reconnected()
+
+    async def _connect_again(self) -> bool:
+        outcome = asyncio.get_running_loop().create_future()
+
+        def resolve(result):
+            def handler(_):
+                if not outcome.done():
+                    outcome.set_result(result)
+
+            return handler
+
+        handlers = [
+            ("session_start", resolve(True)),
+            ("disconnected", resolve(False)),
+            ("failed_all_auth", resolve(False)),
+            ("connection_failed", resolve(False)),
+        ]
+        for event, handler in handlers:
+            self.client.add_event_handler(event, handler)
+        try:
+            self.client.connect(host=self.jid.host, port=self.xmpp_port)
+            connected = await asyncio.wait_for(outcome, self._reconnect_timeout)
+        except asyncio.TimeoutError:
+            connected = False
+        finally:
+            for event, handler in handlers:
+                self.client.del_event_handler(event, handler)
+        if not connected:
+            self.client.cancel_connection_attempt()
+        return connected
+
+    async def _on_reconnected(self):
+        for node in list(self.subscriptions):
+            if not loopback.is_subscribed(self.pubsub_server, node, self._deliver):
+                await self.pubsub.subscribe(self.pubsub_server, node)
+        await self._replay_offline_buffer()
+
+    def _buffer_offline(self, name: Optional[str], payloads: List[Any]) -> bool:
+        if self._offline_buffer is None or not self._is_offline():
+            return False
+        overflow = (
+            len(self._offline_buffer) + len(payloads) - self._offline_buffer.maxlen
+        )
+        if overflow > 0:
+            self._connection_stats["dropped"] += overflow
+            logger.warning(
+                f"Artifact {self.jid} is disconnected and its buffer is full. "
+                f"Dropping {overflow} payloads."
+            )
+        self._offline_buffer.extend((name, payload) for payload in payloads)
+        return True
+
+    async def _replay_offline_buffer(self):
+        if not self._offline_buffer:
+            return
+        entries = list(self._offline_buffer)
+        self._offline_buffer.clear()
+        for name, group in groupby(entries, key=lambda entry: entry[0]):
+            payloads = [payload for _, payload in group]
+            size = self._batch_max_items or len(payloads)
+            for i in range(0, len(payloads), size):
+                if name is None:
+                    await self._publish_batch(payloads[i : i + size])
+                else:
+                    await self._publish_property_values(name, payloads[i : i + size])
+            self._connection_stats["replayed"] += len(payloads)
+
     async def _async_connect(self):  # pragma: no cover
         """ connect and authenticate to the XMPP server. Async mode. """
 
@@ -210,6 +835,15 @@ class Artifact(PubSubMixin, AbstractArtifact):
 
     def kill(self):
         self._alive.clear()
+        self._stopped_threadsafe.set()
+        try:
+            in_loop = asyncio.get_running_loop() == self.loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop or not self.loop.is_running():
+            self._stopped.set()
+        else:
+            self.loop.call_soon_threadsafe(self._stopped.set)
 
     async def run(self):
         """
@@ -228,6 +862,11 @@ class Artifact(PubSubMixin, AbstractArtifact):
         """
         Stops this agent.
         """
+        await self._publish_observables()
+        await self.flush()
+        await self._drain_scheduler()
+        self._close_scheduler()
+        await self.drain()
         self.kill()
         return await self._async_stop()
 
@@ -236,11 +875,19 @@ class Artifact(PubSubMixin, AbstractArtifact):
         if self.presence:
             self.presence.set_unavailable()
 
-        if self.is_alive():
+        if self.is_alive() and self._host is None:
             await self.client.disconnect()
             logger.info("Client disconnected.")
 
-        self._alive.clear()
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._loopback:
+            loopback.unregister_publisher(self.pubsub_server, self.jid.bare)
+        self._close_scheduler()
+        self._dispatcher.close_all()
+        self._handlers.close_all()
+        self.kill()
 
     def is_alive(self):
         """
@@ -252,16 +899,83 @@ class Artifact(PubSubMixin, AbstractArtifact):
         """
         return self._alive.is_set()
 
-    def set(self, name, value):
+    def set(self, name, value, ttl: Optional[float] = None):
         """
         Stores a knowledge item in the artifact knowledge base.
+        If the item is an observable property, a publication of the
+        observable properties is scheduled.
 
         Args:
           name (str): name of the item
           value (object): value of the item
+          ttl (float, optional): seconds until the item expires (see ``set_knowledge_base``)
+
+        """
+        self._values.set(name, value, ttl)
+        self._versions[name] += 1
+        if name in self._observables:
+            self._observables_changed.add(name)
+            self._schedule_observables()
+
+    def define_observable(self, name, value=None):
+        """
+        Defines an observable property in the artifact knowledge base.
+        Observable properties are published as a dict with all of them whenever
+        any of them changes. Changes made within the same loop iteration are
+        coalesced into a single publication. Enable delta publishing (see ``set_delta``)
+        to only send the properties that changed, or property nodes (see
+        ``set_property_nodes``) to publish each property in its own node.
+        Observable properties need a codec; JSON is used if the artifact has none.
+
+        Args:
+          name (str): name of the property
+          value (object): initial value of the property
+
+        """
+        if self._codec is None:
+            self._codec = get_codec(JSONCodec.name)
+        self._observables[name] = None
+        self._values.pin(name)
+        self.set(name, value)
 
+    def version(self, name) -> int:
         """
-        self._values[name] = value
+        Returns how many times a knowledge item has been set.
+
+        Args:
+          name(str): name of the item
+
+        Returns:
+          int: the version of the item (0 if it was never set)
+
+        """
+        return self._versions[name]
+
+    def _schedule_observables(self):
+        if self._observables_handle is None and self.is_alive():
+            self._observables_handle = self.loop.call_soon_threadsafe(
+                self._on_observables_changed
+            )
+
+    def _on_observables_changed(self):
+        self._observables_handle = None
+        self._observables_task = asyncio.ensure_future(self._publish_observables())
+
+    async def _publish_observables(self):
+        if self._observables_handle is not None:
+            self._observables_handle.cancel()
+            self._observables_handle = None
+        if not self._observables_changed:
+            return
+        changed, self._observables_changed = self._observables_changed, set()
+        if self._property_nodes is not None:
+            for name in self._observables:
+                if name in changed:
+                    await self.publish_property(name, self._values.peek(name))
+            return
+        await self.publish(
+            {name: self._values.peek(name) for name in self._observables}
+        )
 
     def get(self, name):
         """
@@ -274,23 +988,109 @@ class Artifact(PubSubMixin, AbstractArtifact):
           object: the object retrieved or None
 
         """
-        if name in self._values:
-            return self._values[name]
-        else:
-            return None
+        return self._values.get(name)
+
+    def set_knowledge_base(
+        self, max_items: Optional[int] = None, default_ttl: Optional[float] = None
+    ):
+        """
+        Limits the artifact knowledge base, so it can be safely used as a cache.
+        When it is full, the least recently used items are evicted, except
+        observable properties.
+        Expired items are removed lazily, when the knowledge base is accessed.
+
+        Args:
+          max_items (int, optional): maximum number of items. Unbounded if None.
+          default_ttl (float, optional): seconds an item lives if ``set`` is called without a ttl.
+            Items never expire if None.
+
+        """
+        self._values.configure(max_items, default_ttl)
+
+    def knowledge_stats(self) -> dict:
+        """
+        Returns the statistics of the artifact knowledge base
+
+        Returns:
+          dict: number of items (size), hits and misses of ``get``, and
+          items evicted (evictions) or expired (expirations)
+
+        """
+        stats = self._values.stats
+        return {
+            "size": len(self._values),
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "evictions": stats["evictions"],
+            "expirations": stats["expirations"],
+        }
 
     def _message_received(self, msg) -> None:
         """
         Callback run when an XMPP Message is reveived.
-        The slixmpp.stanza.Message is converted to spade.message.Message
+        The slixmpp.stanza.Message is queued according to the mailbox policy
+        and converted to spade.message.Message when it is received.
+        If any route was added, the message is converted at once to find its route.
 
         Args:
           msg (slixmpp.stanza.Messagge): the message just received.
         """
+        queue = self.queue
+        lazy = None
+        if self._router:
+            lazy = LazyMessage(msg)
+            route = self._router.route(lazy.message)
+            if route is not None and route.handler is not None:
+                self._handle(route, lazy.message)
+                return
+            if route is not None:
+                queue = route.queue
+
+        if (
+            self._mailbox_capacity is not None
+            and queue.qsize() >= self._mailbox_capacity
+        ):
+            self._mailbox_overflows[self._mailbox_policy] += 1
+            if self._mailbox_policy == MailboxPolicy.DROP_NEWEST:
+                logger.debug("Mailbox full. Dropping message from {}", msg["from"])
+                return
+            elif self._mailbox_policy == MailboxPolicy.REJECT:
+                if msg["type"] == "error":
+                    logger.debug("Mailbox full. Dropping error from {}", msg["from"])
+                    return
+                logger.debug("Mailbox full. Bouncing message from {}", msg["from"])
+                self._bounce(msg)
+                return
+            else:
+                dropped = queue.discard_nowait()
+                logger.opt(lazy=True).debug(
+                    "Mailbox full. Dropping message: {}", lambda: str(dropped)
+                )
 
-        msg = Message.from_node(msg)
-        logger.debug(f"Got message: {msg}")
-        self.queue.put_nowait(msg)
+        msg = lazy or LazyMessage(msg)
+        logger.opt(lazy=True).debug("Got message: {}", lambda: str(msg))
+        queue.put_nowait(msg)
+        if self._metrics is not None:
+            self._metrics.received_messages.inc()
+            if queue is self.queue:
+                self._metrics.mailbox_messages.set(queue.qsize())
+
+    def _handle(self, route, msg: Message) -> None:
+        logger.opt(lazy=True).debug("Got message: {}", lambda: str(msg))
+        if self._metrics is not None:
+            self._metrics.received_messages.inc()
+        try:
+            self._handlers.dispatch(id(route), route.handler, msg)
+        except Exception:
+            logger.exception(f"Error handling message from {msg.sender}")
+
+    @staticmethod
+    def _bounce(msg) -> None:
+        bounce = msg.reply(clear=False).error()
+        bounce["error"]["type"] = "wait"
+        bounce["error"]["condition"] = "resource-constraint"
+        bounce["error"]["text"] = "Mailbox is full"
+        bounce.send()
 
     async def send(self, msg: Message):
         """
@@ -305,8 +1105,12 @@ class Artifact(PubSubMixin, AbstractArtifact):
         slixmpp_msg = msg.prepare(self.client)
         slixmpp_msg.send()
         msg.sent = True
+        if self._metrics is not None:
+            self._metrics.sent_messages.inc()
 
-    async def receive(self, timeout: float = None) -> Union[Message, None]:
+    async def receive(
+        self, timeout: float = None, template: Optional[BaseTemplate] = None
+    ) -> Union[Message, None]:
         """
         Receives a message for this artifact.
         If timeout is not None it returns the message or "None"
@@ -314,32 +1118,140 @@ class Artifact(PubSubMixin, AbstractArtifact):
 
         Args:
             timeout (float): number of seconds until return
+            template (spade.template.BaseTemplate, optional): receives the message from
+                the queue of the route of this template instead (see ``add_route``)
 
         Returns:
             spade.message.Message: a Message or None
         """
+        queue = self._mailbox(template)
         if timeout:
-            coro = self.queue.get()
+            coro = queue.get()
             try:
                 msg = await asyncio.wait_for(coro, timeout=timeout)
             except asyncio.TimeoutError:
                 msg = None
         else:
             try:
-                msg = self.queue.get_nowait()
+                msg = queue.get_nowait()
             except asyncio.QueueEmpty:
                 msg = None
+        if self._metrics is not None:
+            self._metrics.mailbox_messages.set(self.queue.qsize())
         return msg
 
-    def mailbox_size(self) -> int:
+    async def receive_many(
+        self,
+        max_items: int = 100,
+        timeout: float = None,
+        template: Optional[BaseTemplate] = None,
+    ) -> List[Message]:
+        """
+        Receives several messages for this artifact at once.
+        If timeout is not None it waits until the first message arrives or the timeout
+        is done. Then it takes up to ``max_items`` messages from the mailbox without
+        waiting any more.
+
+        Args:
+            max_items (int): maximum number of messages to return (Default value = 100)
+            timeout (float): number of seconds to wait for the first message
+            template (spade.template.BaseTemplate, optional): receives the messages from
+                the queue of the route of this template instead (see ``add_route``)
+
+        Returns:
+            list of spade.message.Message: the messages, in the order they arrived.
+            Empty if there are none.
+        """
+        if max_items < 1:
+            raise ValueError("max_items must be a positive integer")
+        queue = self._mailbox(template)
+        messages = []
+        if timeout and queue.empty():
+            try:
+                messages.append(await asyncio.wait_for(queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                return messages
+        for _ in range(min(max_items - len(messages), queue.qsize())):
+            messages.append(queue.get_nowait())
+        if self._metrics is not None:
+            self._metrics.mailbox_messages.set(self.queue.qsize())
+        return messages
+
+    async def messages(
+        self, template: Optional[BaseTemplate] = None
+    ) -> AsyncIterator[Message]:
+        """
+        Iterates over the messages of this artifact, waiting for new ones::
+
+            async for msg in self.messages():
+                ...
+
+        Queued messages are taken without waiting. The iteration ends when the
+        artifact stops and its mailbox is empty.
+
+        Args:
+            template (spade.template.BaseTemplate, optional): iterates over the queue of
+                the route of this template instead (see ``add_route``)
+
+        Yields:
+            spade.message.Message: the messages, in the order they arrived
+        """
+        queue = self._mailbox(template)
+        while True:
+            if queue.empty():
+                msg = await self._next_message(queue)
+                if msg is None:
+                    return
+            else:
+                msg = queue.get_nowait()
+            if self._metrics is not None:
+                self._metrics.mailbox_messages.set(self.queue.qsize())
+            yield msg
+
+    async def _next_message(self, queue: asyncio.Queue) -> Optional[Message]:
+        if not self.is_alive():
+            return None
+        getter = asyncio.ensure_future(queue.get())
+        stopped = asyncio.ensure_future(self._stopped.wait())
+        try:
+            done, _ = await asyncio.wait(
+                {getter, stopped}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            stopped.cancel()
+            if not getter.done():
+                getter.cancel()
+        return getter.result() if getter in done else None
+
+    def mailbox_size(self, template: Optional[BaseTemplate] = None) -> int:
         """
         Checks if there is a message in the mailbox
 
+        Args:
+          template (spade.template.BaseTemplate, optional): checks the queue of the
+            route of this template instead (see ``add_route``)
+
         Returns:
           int: the number of messages in the mailbox
 
         """
-        return self.queue.qsize()
+        return self._mailbox(template).qsize()
+
+    def mailbox_stats(self) -> dict:
+        """
+        Returns the occupation of the mailbox and how many times it overflowed
+
+        Returns:
+          dict: size, capacity and overflow counters (dropped_oldest, dropped_newest, rejected)
+
+        """
+        return {
+            "size": self.queue.qsize(),
+            "capacity": self._mailbox_capacity,
+            "dropped_oldest": self._mailbox_overflows[MailboxPolicy.DROP_OLDEST],
+            "dropped_newest": self._mailbox_overflows[MailboxPolicy.DROP_NEWEST],
+            "rejected": self._mailbox_overflows[MailboxPolicy.REJECT],
+        }
 
     def join(self, timeout=None):
         try:
@@ -348,62 +1260,405 @@ class Artifact(PubSubMixin, AbstractArtifact):
             in_coroutine = False
 
         if not in_coroutine:
-            t_start = time.time()
-            while self.is_alive():
-                time.sleep(0.001)
-                t = time.time()
-                if timeout is not None and t - t_start > timeout:
-                    raise TimeoutError
+            if not self._stopped_threadsafe.wait(timeout):
+                raise TimeoutError
         else:
             return self._async_join(timeout=timeout)
 
     async def _async_join(self, timeout):
-        t_start = time.time()
-        while self.is_alive():
-            await asyncio.sleep(0.001)
-            t = time.time()
-            if timeout is not None and t - t_start > timeout:
-                raise TimeoutError
+        try:
+            await asyncio.wait_for(self._stopped.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError
+
+    async def publish(
+        self, payload: Any, priority: Union[Priority, str] = Priority.NORMAL
+    ) -> None:
+        """
+        Publishes a payload in the artifact's node.
+        If auto-batching is enabled the payload is buffered (see ``set_batching``).
+        If delta publishing is enabled only the changes are published (see ``set_delta``).
+        If a rate limit is set the payload is queued (see ``set_rate_limit``).
+
+        Args:
+            payload (str or object): the payload to be published. Any object supported
+                by the codec can be published if a codec is set (see ``set_codec``).
+            priority (Priority or str): the priority of the payload when the publications
+                are rate limited (Default value = normal)
+        """
+        if self._loopback and not self._publish_local(self._node, [payload]):
+            return
+
+        if self._scheduler is not None:
+            await self._scheduler.put(None, [payload], priority)
+            return
+
+        if self._delta is not None:
+            payload = self._encode_delta(payload)
+            if payload is None:
+                return
+
+        if self._batch_max_items is None:
+            await self._publish_item(payload)
+            return
+
+        self._batch.append(payload)
+        if len(self._batch) >= self._batch_max_items:
+            await self.flush()
+        elif self._batch_handle is None:
+            self._batch_handle = asyncio.get_running_loop().call_later(
+                self._batch_window, self._schedule_flush
+            )
+
+    async def publish_many(
+        self,
+        payloads: List[Any],
+        max_items: Optional[int] = None,
+        priority: Union[Priority, str] = Priority.NORMAL,
+    ) -> None:
+        """
+        Publishes several payloads packing them into as few pubsub items as possible.
+        Any payload already buffered by the auto-batching mode is published first.
+
+        Args:
+            payloads (list): the payloads to be published
+            max_items (int, optional): maximum number of payloads per item.
+                Defaults to the auto-batching size or to all the payloads in one item.
+            priority (Priority or str): the priority of the payloads when the publications
+                are rate limited (Default value = normal)
+        """
+        await self.flush()
+        payloads = list(payloads)
+        if self._loopback and not self._publish_local(self._node, payloads):
+            return
+        if self._scheduler is not None and payloads:
+            size = max_items or self._batch_max_items or len(payloads)
+            for i in range(0, len(payloads), size):
+                await self._scheduler.put(None, payloads[i : i + size], priority)
+            return
+        if self._delta is not None:
+            payloads = [self._encode_delta(payload) for payload in payloads]
+            payloads = [payload for payload in payloads if payload is not None]
+        if not payloads:
+            return
+        size = max_items or self._batch_max_items or len(payloads)
+        for i in range(0, len(payloads), size):
+            await self._publish_batch(payloads[i : i + size])
+
+    async def publish_property(
+        self, name: str, value: Any, priority: Union[Priority, str] = Priority.NORMAL
+    ) -> None:
+        """
+        Publishes the value of a property in its own node (see ``set_property_nodes``).
+        The node is created the first time the property is published.
+
+        Args:
+            name (str): the name of the property
+            value (object): the value of the property
+            priority (Priority or str): the priority of the value when the publications
+                are rate limited (Default value = normal)
+        """
+        if self._property_nodes is None:
+            raise RuntimeError(
+                "Property nodes are disabled. Enable them with set_property_nodes()"
+            )
+        if self._loopback and not self._publish_local(
+            property_node(self._node, name), [value]
+        ):
+            return
+        if self._scheduler is not None:
+            await self._scheduler.put(name, [value], priority)
+            return
+        await self._publish_property_values(name, [value])
+
+    async def flush(self) -> None:
+        """
+        Publishes the payloads buffered by the auto-batching mode.
+        """
+        if self._batch_handle is not None:
+            self._batch_handle.cancel()
+            self._batch_handle = None
+        payloads, self._batch = self._batch, []
+        if payloads:
+            await self._publish_batch(payloads)
+
+    async def drain(self) -> None:
+        """
+        Waits until every pipelined publication has been acknowledged or has failed,
+        after publishing the payloads queued by the rate limit (see ``set_rate_limit``).
+        """
+        if self._scheduler is not None:
+            await self._scheduler.join()
+        if self._in_flight_tasks:
+            await asyncio.gather(*self._in_flight_tasks, return_exceptions=True)
+
+    def publications_in_flight(self) -> int:
+        """
+        Checks how many pipelined publications are waiting for acknowledgement
+
+        Returns:
+          int: the number of unacknowledged publications
+
+        """
+        return len(self._in_flight_tasks)
+
+    async def _publish_scheduled(self, name: Optional[str], payloads: List[Any]):
+        if name is not None:
+            await self._publish_property_values(name, payloads)
+            return
+        if self._delta is not None:
+            payloads = [self._encode_delta(payload) for payload in payloads]
+            payloads = [payload for payload in payloads if payload is not None]
+        if payloads:
+            await self._publish_batch(payloads)
+
+    def _encode_delta(self, state: dict) -> Optional[dict]:
+        key = self._delta_key(state) if self._delta_key is not None else None
+        return self._delta.encode(state, key)
+
+    def _publish_local(self, node: str, payloads: List[Any]) -> bool:
+        """
+        Delivers payloads to the local subscribers of a node.
+
+        Returns:
+            bool: whether the payloads must be published to the pubsub node too
+        """
+        loopback.deliver(self.pubsub_server, node, str(self.jid.bare), payloads)
+        return self._loopback_remote
+
+    def _publisher_jid(self):
+        return self._host.jid.bare if self._host is not None else self.jid.bare
+
+    def _identity(self) -> dict:
+        return {PUBLISHER_MARKER: str(self.jid.bare)} if self._host is not None else {}
+
+    def _markers(self) -> dict:
+        markers = self._identity()
+        if self._delta is not None:
+            markers[DELTA_MARKER] = "1"
+        return markers
 
-    async def publish(self, payload: str) -> None:
-        await self.pubsub.publish(
-            self.pubsub_server, self._node, payload, ifrom=self.jid.bare
+    async def _create_properties_node(self):
+        await self._create_node(
+            properties_node(self._node), node_config(node_type="collection")
         )
 
+    def _schedule_flush(self):
+        self._batch_handle = None
+        self._batch_task = asyncio.ensure_future(self.flush())
+
+    async def _publish_property_values(self, name: str, values: List[Any]) -> None:
+        if self._buffer_offline(name, values):
+            return
+        node = property_node(self._node, name)
+        if name not in self._property_nodes:
+            await self._create_properties_node()
+            await self._create_node(
+                node, node_config(collection=properties_node(self._node))
+            )
+            self._property_nodes.add(name)
+        if len(values) == 1:
+            element = pack_item(values[0], self._codec, **self._identity())
+        else:
+            element = pack_batch(values, self._codec, **self._identity())
+        await self._send_element(self._compress(element), values, node)
+
+    async def _publish_item(self, payload: Any) -> None:
+        if self._buffer_offline(None, [payload]):
+            return
+        element = self._compress(pack_item(payload, self._codec, **self._markers()))
+        await self._send_element(element, [payload])
+
+    async def _publish_batch(self, payloads: List[Any]) -> None:
+        if self._buffer_offline(None, payloads):
+            return
+        if len(payloads) == 1:
+            await self._publish_item(payloads[0])
+            return
+        element = self._compress(pack_batch(payloads, self._codec, **self._markers()))
+        await self._send_element(element, payloads)
+
+    def _compress(self, element: Element) -> Element:
+        if (
+            self._compression is None
+            or not isinstance(element.text, str)
+            or len(element.text) < self._compression_threshold
+        ):
+            return element
+        start = time.perf_counter()
+        compressed = compress_payload(element, self._compression)
+        self._compression_stats["time"] += time.perf_counter() - start
+        self._compression_stats["items"] += 1
+        if len(compressed.text) >= len(element.text):
+            return element
+        self._compression_stats["compressed"] += 1
+        self._compression_stats["size_in"] += len(element.text)
+        self._compression_stats["size_out"] += len(compressed.text)
+        return compressed
+
+    async def _send_element(
+        self, element: Element, payloads: List[Any], node: Optional[str] = None
+    ) -> None:
+        node = node or self._node
+        if self._metrics is not None:
+            self._metrics.published_items.inc(len(payloads))
+        if self._in_flight is not None:
+            await self._publish_pipelined(element, payloads, node)
+            return
+        try:
+            await self._publish_element(element, node)
+        except IqError as e:
+            if e.condition == "item-not-found":
+                forget_node(self.pubsub_server, node)
+            logger.error(
+                f"Error publishing {len(payloads)} items to node <{node}>: {e}"
+            )
+        except IqTimeout as e:
+            name = None if node == self._node else node.rsplit("/", 1)[-1]
+            if not self._buffer_offline(name, payloads):
+                logger.error(
+                    f"Timeout publishing {len(payloads)} items to node <{node}>: {e}"
+                )
+
+    async def _publish_element(self, element: Element, node: Optional[str] = None):
+        publish = self.pubsub.pubsub.publish(
+            self.pubsub_server,
+            node or self._node,
+            None,
+            element,
+            ifrom=self._publisher_jid(),
+        )
+        if self._metrics is None:
+            return await publish
+        with self._metrics.publish_seconds.time():
+            return await publish
+
+    async def _publish_pipelined(
+        self, element: Element, payloads: List[Any], node: str
+    ) -> None:
+        semaphore = self._in_flight
+        await semaphore.acquire()
+        task = asyncio.ensure_future(self._publish_element(element, node))
+        self._in_flight_tasks.add(task)
+        task.add_done_callback(
+            partial(self._on_publish_done, semaphore, payloads, node)
+        )
+
+    def _on_publish_done(self, semaphore, payloads, node, task):
+        self._in_flight_tasks.discard(task)
+        semaphore.release()
+        if task.cancelled() or task.exception() is None:
+            return
+        if self._on_publish_error is not None:
+            self._on_publish_error(payloads, task.exception())
+        else:
+            logger.error(
+                f"Error publishing {len(payloads)} items to node <{node}>: {task.exception()}"
+            )
+
     def on_item_published(self, msg: SlixmppMessage):
         """
         Callback to handle an item published event.
+        Batched items are unpacked and encoded items are decoded, so the
+        subscription callback is invoked once per published payload.
 
         Args:
-            jid (str): The JID of the publisher.
-            node (str): The node/topic from which the item was published.
-            item (object): The item that was published.
-            message (str, optional): Additional message or data associated with the publication.
+            msg (slixmpp.stanza.Message): The pubsub event message.
         """
         node = msg["pubsub_event"]["items"]["node"]
         if node in self.subscriptions:
             item = msg["pubsub_event"]["items"]["item"]["payload"]
-            jid = msg["pubsub_event"]["items"]["item"]["publisher"]
-            self.subscriptions[node](jid, item)
+            jid = publisher_of(item, msg["pubsub_event"]["items"]["item"]["publisher"])
+            try:
+                payloads = unpack(item)
+            except PayloadError as e:
+                logger.error(f"Discarding item from node <{node}>: {e}")
+                return
+            if is_delta(item):
+                payloads = self._apply_deltas(node, payloads)
+            self._deliver(node, jid, payloads)
+
+    def _deliver(self, node: str, jid: str, payloads: List[Any]):
+        callbacks = self.subscriptions.get(node)
+        if callbacks is None:
+            return
+        if self._metrics is not None:
+            self._metrics.received_items.inc(len(payloads))
+        for payload in payloads:
+            for callback in list(callbacks):
+                self._dispatcher.dispatch(node, callback, jid, payload)
+
+    def _apply_deltas(self, node, deltas):
+        states = [self._deltas.apply(node, delta) for delta in deltas]
+        return [state for state in states if state is not None]
 
     async def link(self, target_artifact_jid, callback):
         """
         Subscribe to another artifact's publications.
+        Several callbacks may be linked to the same artifact. They share a single
+        subscription and every payload is decoded once and handed to all of them.
 
         Args:
             target_artifact_jid (str): The JID of the target artifact to subscribe to.
             callback (Callable): The callback to invoke when an item is published.
         """
-        await self.pubsub.subscribe(self.pubsub_server, str(target_artifact_jid))
-        self.subscriptions[target_artifact_jid] = callback
+        node = str(target_artifact_jid)
+        if node in self.subscriptions:
+            self.subscriptions[node].append(callback)
+            return
+        self.subscriptions[node] = [callback]
+        if loopback.is_local(self.pubsub_server, node):
+            loopback.subscribe(
+                self.pubsub_server, node, self._deliver, self._leave_loopback
+            )
+            return
+        try:
+            await self._subscribe(node)
+        except Exception:
+            del self.subscriptions[node]
+            raise
 
-    async def unlink(self, target_artifact_jid):
+    async def unlink(self, target_artifact_jid, callback=None):
         """
-        Unsubscribe from another artifact's publications.
+        Stop receiving another artifact's publications.
+        The artifact unsubscribes when no callback is left linked to the target.
 
         Args:
             target_artifact_jid (str): The JID of the target artifact to unsubscribe from.
+            callback (Callable, optional): The callback to remove. All the callbacks
+                linked to the target are removed if not provided.
         """
-        await self.pubsub.unsubscribe(self.pubsub_server, str(target_artifact_jid))
-        if target_artifact_jid in self.subscriptions:
-            del self.subscriptions[target_artifact_jid]
+        node = str(target_artifact_jid)
+        callbacks = self.subscriptions.get(node)
+        if callbacks is None:
+            return
+        if callback is None:
+            callbacks.clear()
+        elif callback in callbacks:
+            callbacks.remove(callback)
+        if callbacks:
+            return
+        del self.subscriptions[node]
+        if not loopback.unsubscribe(self.pubsub_server, node, self._deliver):
+            await self._unsubscribe(node)
+        self._dispatcher.close(node)
+        self._deltas.forget(node)
+
+    async def _leave_loopback(self, node: str):
+        """Subscribes through pubsub to a node whose publisher left loopback."""
+        if node in self.subscriptions:
+            await self._subscribe(node)
+
+    async def _subscribe(self, node: str):
+        """Subscribes to a node, through the host if the artifact is hosted."""
+        if self._host is not None:
+            await self._host._subscribe(node)
+            return
+        await self.pubsub.subscribe(self.pubsub_server, node)
+
+    async def _unsubscribe(self, node: str):
+        """Unsubscribes from a node, through the host if the artifact is hosted."""
+        if self._host is not None:
+            await self._host._unsubscribe(node)
+            return
+        await self.pubsub.unsubscribe(self.pubsub_server, node)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Codecs used to serialize structured payloads published by artifacts."""
+
+import abc
+import base64
+import json
+from typing import Any, Dict, Union
+
+from loguru import logger
+
+
+def _to_builtin(obj: Any) -> Any:
+    """Converts numpy scalars, timestamps and similar objects to builtin types."""
+    if hasattr(obj, "item"):
+        return obj.item()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+class Codec(object, metaclass=abc.ABCMeta):
+    """
+    Serializes payloads to text that can be embedded in a pubsub item.
+    The ``name`` of the codec is sent with every item, so subscribers
+    know how to decode it.
+    """
+
+    name: str = None
+
+    @abc.abstractmethod
+    def encode(self, obj: Any) -> str:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def decode(self, text: str) -> Any:
+        raise NotImplementedError
+
+
+class JSONCodec(Codec):
+    """Compact JSON. It is always available."""
+
+    name = "json"
+
+    def encode(self, obj: Any) -> str:
+        return json.dumps(obj, separators=(",", ":"), default=_to_builtin)
+
+    def decode(self, text: str) -> Any:
+        return json.loads(text)
+
+
+class MsgPackCodec(Codec):
+    """MessagePack embedded as base64. Requires the ``msgpack`` package."""
+
+    name = "msgpack"
+
+    def __init__(self):
+        import msgpack
+
+        self._msgpack = msgpack
+
+    def encode(self, obj: Any) -> str:
+        packed = self._msgpack.packb(obj, default=_to_builtin)
+        return base64.b64encode(packed).decode("ascii")
+
+    def decode(self, text: str) -> Any:
+        return self._msgpack.unpackb(base64.b64decode(text))
+
+
+_codecs: Dict[str, Union[type, Codec]] = {
+    JSONCodec.name: JSONCodec,
+    MsgPackCodec.name: MsgPackCodec,
+}
+
+
+def register_codec(codec: Union[type, Codec]) -> None:
+    """
+    Registers a codec, replacing any other codec with the same name.
+
+    Args:
+        codec (Codec or type): the codec to be registered, or its class
+            to instantiate it the first time it is used
+    """
+    _codecs[codec.name] = codec
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Returns the registered codec with the given name.
+
+    Args:
+        name (str): the name of the codec
+
+    Returns:
+        Codec: the codec
+
+    Raises:
+        KeyError: if there is no codec with that name
+        ImportError: if the codec depends on a package that is not installed
+    """
+    codec = _codecs[name]
+    if isinstance(codec, type):
+        codec = codec()
+        _codecs[name] = codec
+    return codec
+
+
+def resolve_codec(codec: Union[Codec, str, None]) -> Union[Codec, None]:
+    """
+    Resolves the codec preferred by an artifact.
+    Falls back to JSON if the preferred codec cannot be loaded.
+
+    Args:
+        codec (Codec, str or None): a codec, the name of a registered codec or None
+
+    Returns:
+        Codec or None: the codec to use
+    """
+    if codec is None or isinstance(codec, Codec):
+        return codec
+    try:
+        return get_codec(codec)
+    except ImportError as e:
+        logger.warning(f"Codec {codec} is not available ({e}). Falling back to JSON.")
+        return get_codec(JSONCodec.name)
@@ -0,0 +1,55 @@
+"""
+Readers that publish data from external sources.
+
+Readers are imported the first time they are used, so importing this package
+does not load the drivers of the sources that are not needed::
+
+    from spade_artifact.common.readers import get_reader
+
+    SQLReader = get_reader("sql")
+    from spade_artifact.common.readers import CSVReaderArtifact  # also lazy
+"""
+
+import importlib
+
+READERS = {
+    "api": "spade_artifact.common.readers.apireader:APIReaderArtifact",
+    "csv": "spade_artifact.common.readers.csvreader:CSVReaderArtifact",
+    "sql": "spade_artifact.common.readers.sqlreader:DatabaseQueryArtifact",
+    "mongodb": "spade_artifact.common.readers.mongodbreader:MongoDBQueryArtifact",
+    "context_broker": "spade_artifact.common.readers.context_broker_inserter:InserterArtifact",
+}
+
+_CLASSES = {path.rsplit(":", 1)[1]: path for path in READERS.values()}
+
+__all__ = ["READERS", "get_reader", *_CLASSES]
+
+
+def get_reader(name):
+    """
+    Returns a reader class, importing its module if needed.
+
+    Args:
+        name (str): The name of the reader in ``READERS`` (e.g. 'sql') or of its class.
+
+    Returns:
+        type: The reader class.
+
+    Raises:
+        KeyError: If there is no reader with that name.
+    """
+    path = READERS.get(name) or _CLASSES.get(name)
+    if path is None:
+        raise KeyError(f"Unknown reader: {name}")
+    module, _, cls = path.partition(":")
+    return getattr(importlib.import_module(module), cls)
+
+
+def __getattr__(name):
+    if name in _CLASSES:
+        return get_reader(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_CLASSES))
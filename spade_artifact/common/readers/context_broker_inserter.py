@@ -112,7 +112,8 @@ class InserterArtifact(spade_artifact.Artifact):
 
         Args:
             artifact (str): The name or identifier of the artifact sending the data.
-            payload (str): The JSON payload received from the artifact.
+            payload (str or dict): The JSON payload received from the artifact, or the
+                already decoded object if the publisher uses a codec.
 
         Raises:
             json.JSONDecodeError: If the payload is not valid JSON.
@@ -120,7 +121,7 @@ class InserterArtifact(spade_artifact.Artifact):
         logger.info(f"Received: [{artifact}] -> {payload}")
 
         try:
-            data = json.loads(payload)
+            data = json.loads(payload) if isinstance(payload, str) else payload
         except json.JSONDecodeError as e:
             logger.error(f"Failed to decode JSON payload: {str(e)}")
             return
@@ -1,4 +1,3 @@
-import pandas as pd
 import asyncio
 import spade_artifact
 from loguru import logger
@@ -46,7 +45,10 @@ class CSVReaderArtifact(spade_artifact.Artifact):
         Starts the artifact's main operation of reading from the CSV and publishing rows.
 
         This method reads the CSV file row by row, and if a time_column is specified, it waits for the time difference between the current and last row before publishing the next row. If no time_column is specified, it publishes rows at a fixed frequency defined by the `frequency` attribute.
+        Rows are published as dicts if the artifact has a codec (see ``set_codec``), or as their string representation otherwise.
         """
+        import pandas as pd
+
         self.presence.set_available()
         df = pd.read_csv(self.csv_file, usecols=self.columns if self.columns else None)
 
@@ -61,6 +63,9 @@ class CSVReaderArtifact(spade_artifact.Artifact):
             else:
                 await asyncio.sleep(self.frequency)
 
-            await self.publish(f"{row.to_dict()}")
+            if self.codec is not None:
+                await self.publish(row.to_dict())
+            else:
+                await self.publish(f"{row.to_dict()}")
         logger.info("Finished reading CSV file")
         self.presence.set_unavailable()
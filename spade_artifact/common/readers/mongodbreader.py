@@ -1,7 +1,6 @@
 import asyncio
 from loguru import logger
 import spade_artifact
-from motor.motor_asyncio import AsyncIOMotorClient
 
 
 class MongoDBQueryArtifact(spade_artifact.Artifact):
@@ -97,7 +96,10 @@ class MongoDBQueryArtifact(spade_artifact.Artifact):
     async def connect_to_database(self):
         """
         Asynchronously establishes a connection to the MongoDB database.
+        Motor is imported on the first connection.
         """
+        from motor.motor_asyncio import AsyncIOMotorClient
+
         self.client = AsyncIOMotorClient(self.connection_uri)
         self.db = self.client[self.database_name]
         self.collection = self.db[self.collection_name]
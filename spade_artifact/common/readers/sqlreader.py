@@ -1,10 +1,38 @@
 import asyncio
+import importlib
 
-import psycopg
 from loguru import logger
 import spade_artifact
-import sqlite3
-import pymysql
+
+DRIVERS = {"sqlite": "sqlite3", "postgresql": "psycopg", "mysql": "pymysql"}
+
+
+def load_driver(db_type):
+    """
+    Imports the DB-API module used to connect to a type of database.
+    Drivers are imported the first time they are needed, so only the driver of
+    the databases actually used is loaded.
+
+    Args:
+        db_type (str): The type of the database ('sqlite', 'postgresql' or 'mysql').
+
+    Returns:
+        module: The driver module (sqlite3, psycopg or pymysql).
+
+    Raises:
+        ValueError: If `db_type` is not supported.
+        ImportError: If the driver is not installed.
+    """
+    try:
+        module = DRIVERS[db_type]
+    except KeyError:
+        raise ValueError("Unsupported database type") from None
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise ImportError(
+            f"The '{module}' package is required to query {db_type} databases"
+        ) from e
 
 
 class DatabaseQueryArtifact(spade_artifact.Artifact):
@@ -144,22 +172,17 @@ class DatabaseQueryArtifact(spade_artifact.Artifact):
     async def connect_to_database(self):
         """
         Asynchronously establishes a connection to the database using the appropriate library
-        based on `db_type`.
+        based on `db_type`. The library is imported on the first connection (see `load_driver`).
 
         Raises:
             ValueError: If `db_type` is not supported.
         """
+        driver = load_driver(self.db_type)
         if self.db_type == "sqlite":
-            self.conn = sqlite3.connect(self.prepare_connection_string())
-            self.cur = self.conn.cursor()
-        elif self.db_type == "postgresql":
-            self.conn = psycopg.connect(**self.prepare_connection_string())
-            self.cur = self.conn.cursor()
-        elif self.db_type == "mysql":
-            self.conn = pymysql.connect(**self.prepare_connection_string())
-            self.cur = self.conn.cursor()
+            self.conn = driver.connect(self.prepare_connection_string())
         else:
-            raise ValueError("Unsupported database type")
+            self.conn = driver.connect(**self.prepare_connection_string())
+        self.cur = self.conn.cursor()
 
     async def execute_query(self):
         """
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Compression of large payloads published by artifacts."""
+
+import base64
+import zlib
+from typing import Callable, Dict, Tuple
+
+# Decompressed items are capped, so a tiny item cannot exhaust the memory of its subscribers
+MAX_DECOMPRESSED_SIZE = 16 * 1024 * 1024
+
+
+def _zstd():
+    import zstandard
+
+    return zstandard
+
+
+def _zlib_decompress(data: bytes, max_size: int) -> bytes:
+    decompressor = zlib.decompressobj()
+    output = decompressor.decompress(data, max_size + 1)
+    if len(output) > max_size or decompressor.unconsumed_tail:
+        raise ValueError(f"Decompressed item exceeds {max_size} bytes")
+    if not decompressor.eof:
+        raise ValueError("Compressed item is truncated")
+    return output
+
+
+def _zstd_decompress(data: bytes, max_size: int) -> bytes:
+    chunks = []
+    size = 0
+    with _zstd().ZstdDecompressor().stream_reader(data) as reader:
+        while True:
+            chunk = reader.read(max_size + 1 - size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > max_size:
+                raise ValueError(f"Decompressed item exceeds {max_size} bytes")
+    return b"".join(chunks)
+
+
+_compressors: Dict[str, Tuple[Callable, Callable]] = {
+    "zlib": (zlib.compress, _zlib_decompress),
+    "zstd": (
+        lambda data: _zstd().ZstdCompressor().compress(data),
+        _zstd_decompress,
+    ),
+}
+
+
+def is_available(algorithm: str) -> bool:
+    """
+    Checks if a compression algorithm can be used.
+
+    Args:
+        algorithm (str): the name of the algorithm ("zlib" or "zstd")
+
+    Returns:
+        bool: whether the algorithm is known and its dependencies are installed
+    """
+    if algorithm not in _compressors:
+        return False
+    try:
+        compress(" ", algorithm)
+    except ImportError:
+        return False
+    return True
+
+
+def compress(text: str, algorithm: str) -> str:
+    """
+    Compresses a text and embeds the result as base64.
+
+    Args:
+        text (str): the text to be compressed
+        algorithm (str): the name of the algorithm ("zlib" or "zstd")
+
+    Returns:
+        str: the compressed text encoded as base64
+    """
+    compressor, _ = _compressors[algorithm]
+    return base64.b64encode(compressor(text.encode("utf-8"))).decode("ascii")
+
+
+def decompress(text: str, algorithm: str, max_size: int = MAX_DECOMPRESSED_SIZE) -> str:
+    """
+    Decompresses a text built by ``compress``.
+
+    Args:
+        text (str): the compressed text encoded as base64
+        algorithm (str): the name of the algorithm ("zlib" or "zstd")
+        max_size (int): maximum size in bytes of the decompressed text
+            (Default value = MAX_DECOMPRESSED_SIZE)
+
+    Returns:
+        str: the original text
+
+    Raises:
+        ValueError: if the decompressed text would exceed ``max_size``
+    """
+    _, decompressor = _compressors[algorithm]
+    return decompressor(base64.b64decode(text), max_size).decode("utf-8")
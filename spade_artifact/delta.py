@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Delta encoding of the states published by artifacts."""
+
+from collections import Counter
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+def _hashable(key: Any) -> Hashable:
+    """Keys decoded from JSON may be lists, which are not hashable."""
+    if isinstance(key, list):
+        return tuple(_hashable(k) for k in key)
+    return key
+
+
+class DeltaEncoder:
+    """
+    Remembers the last state published for every key and encodes new states
+    as the fields that were added, changed or removed since then.
+    A full snapshot of the state is sent every ``snapshot_every`` publications of a key.
+    """
+
+    def __init__(self, snapshot_every: int = 10):
+        """
+        Args:
+            snapshot_every (int): number of publications of a key between full snapshots
+        """
+        if snapshot_every < 1:
+            raise ValueError("snapshot_every must be a positive integer")
+        self.snapshot_every = snapshot_every
+        self.stats = Counter()
+        self._states: Dict[Hashable, Tuple[int, dict]] = {}
+
+    def encode(self, state: dict, key: Any = None) -> Optional[dict]:
+        """
+        Encodes a state as a snapshot or as a delta against the previous state of the key.
+
+        Args:
+            state (dict): the current state
+            key (object, optional): identifies the entity the state belongs to
+
+        Returns:
+            dict or None: the delta or snapshot to publish, or None if nothing changed
+        """
+        if not isinstance(state, dict):
+            raise TypeError(
+                f"Delta publishing requires dicts, not {type(state).__name__}"
+            )
+
+        previous = self._states.get(_hashable(key))
+        seq = previous[0] + 1 if previous is not None else 0
+        if previous is None or seq % self.snapshot_every == 0:
+            delta = {"key": key, "seq": seq, "snapshot": state}
+            self.stats["snapshots"] += 1
+        else:
+            last = previous[1]
+            changed = {k: v for k, v in state.items() if k not in last or last[k] != v}
+            removed = [k for k in last if k not in state]
+            if not changed and not removed:
+                self.stats["unchanged"] += 1
+                return None
+            delta = {"key": key, "seq": seq, "set": changed, "unset": removed}
+            self.stats["deltas"] += 1
+
+        self._states[_hashable(key)] = (seq, dict(state))
+        return delta
+
+    def reset(self):
+        """Forgets every state, so the next publication of each key is a snapshot."""
+        self._states.clear()
+
+
+class DeltaDecoder:
+    """
+    Rebuilds the full states of the keys published by each source from
+    the deltas and snapshots it receives.
+    """
+
+    def __init__(self):
+        self._states: Dict[Tuple[str, Hashable], Tuple[int, dict]] = {}
+
+    def apply(self, source: str, delta: dict) -> Optional[dict]:
+        """
+        Applies a delta or snapshot received from a source.
+
+        Args:
+            source (str): the node the delta was published in
+            delta (dict): the received delta or snapshot
+
+        Returns:
+            dict or None: the full state of the key, or None if it cannot be rebuilt
+            until the next snapshot (e.g. the previous delta was missed)
+        """
+        key = (source, _hashable(delta.get("key")))
+        if "snapshot" in delta:
+            state = dict(delta["snapshot"])
+        else:
+            current = self._states.get(key)
+            if current is None or current[0] != delta["seq"] - 1:
+                self._states.pop(key, None)
+                return None
+            state = dict(current[1])
+            state.update(delta["set"])
+            for field in delta["unset"]:
+                state.pop(field, None)
+
+        self._states[key] = (delta["seq"], state)
+        return dict(state)
+
+    def merge(self, other: "DeltaDecoder"):
+        """
+        Adopts the states of another decoder for the keys this one does not know yet.
+
+        Args:
+            other (DeltaDecoder): the decoder whose states are adopted
+        """
+        for key, state in other._states.items():
+            self._states.setdefault(key, state)
+
+    def forget(self, source: str):
+        """
+        Forgets the states of a source.
+
+        Args:
+            source (str): the node whose states are forgotten
+        """
+        for key in [key for key in self._states if key[0] == source]:
+            del self._states[key]
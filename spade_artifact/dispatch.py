@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Dispatch of the callbacks subscribed to artifact publications."""
+
+import asyncio
+import inspect
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from loguru import logger
+
+
+class CallbackDispatcher(object):
+    """
+    Invokes the callbacks of the subscriptions of an agent or artifact.
+
+    By default callbacks are invoked inline, as soon as an item is received.
+    Once queued dispatch is configured, every subscription gets its own bounded
+    queue and worker task, so a slow callback only delays its own subscription.
+    Callbacks may be coroutine functions in both modes.
+    """
+
+    def __init__(self):
+        self.queue_size: Optional[int] = None
+        self.stats = Counter()
+        self.histogram = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._queues: Dict[Hashable, asyncio.Queue] = {}
+        self._workers: Dict[Hashable, asyncio.Task] = {}
+        self._tasks = set()
+
+    def configure(self, queue_size: Optional[int], max_concurrency: Optional[int]):
+        """
+        Enables (or disables) queued dispatch.
+
+        Args:
+            queue_size (int or None): maximum number of pending items per subscription.
+                Callbacks are invoked inline if None.
+            max_concurrency (int or None): maximum number of callbacks running at once
+                across all subscriptions. Unlimited if None.
+        """
+        if queue_size is not None and queue_size < 1:
+            raise ValueError("queue_size must be a positive integer")
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be a positive integer")
+        self.close_all()
+        self.queue_size = queue_size
+        self._semaphore = (
+            asyncio.Semaphore(max_concurrency) if max_concurrency is not None else None
+        )
+
+    def dispatch(self, key: Hashable, callback: Callable, *args: Any):
+        """
+        Invokes a callback, or queues it if queued dispatch is enabled.
+        If the queue of the subscription is full, its oldest item is dropped.
+
+        Args:
+            key (str): identifies the subscription (e.g. its node)
+            callback (Callable): the callback to invoke
+            *args: the arguments of the callback
+        """
+        if self.queue_size is None:
+            self._call_inline(key, callback, args)
+            return
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.Queue(maxsize=self.queue_size)
+            self._workers[key] = asyncio.ensure_future(self._work(key, queue))
+        if queue.full():
+            queue.get_nowait()
+            queue.task_done()
+            self.stats["dropped"] += 1
+            logger.warning(f"Subscription <{key}> is not keeping up. Dropping item.")
+        queue.put_nowait((callback, args))
+
+    def pending(self) -> Dict[Hashable, int]:
+        """
+        Returns:
+            dict: the number of queued items of every subscription
+        """
+        return {key: queue.qsize() for key, queue in self._queues.items()}
+
+    async def join(self):
+        """Waits until every queued item has been dispatched."""
+        for queue in list(self._queues.values()):
+            await queue.join()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def close(self, key: Hashable):
+        """
+        Stops the worker of a subscription, discarding its pending items.
+
+        Args:
+            key (str): identifies the subscription
+        """
+        self._queues.pop(key, None)
+        worker = self._workers.pop(key, None)
+        if worker is not None:
+            worker.cancel()
+
+    def close_all(self):
+        """Stops the workers of every subscription, discarding their pending items."""
+        for key in list(self._queues):
+            self.close(key)
+
+    def _call_inline(self, key: Hashable, callback: Callable, args: tuple):
+        start = time.perf_counter()
+        try:
+            result = callback(*args)
+        except Exception:
+            logger.exception(f"Error in callback of subscription <{key}>")
+            result = None
+        if inspect.isawaitable(result):
+            if self.histogram is not None:
+                result = self._observe(result, start)
+            task = asyncio.ensure_future(result)
+            self._tasks.add(task)
+            task.add_done_callback(self._on_task_done)
+        elif self.histogram is not None:
+            self.histogram.observe(time.perf_counter() - start)
+
+    async def _observe(self, awaitable, start: float):
+        try:
+            return await awaitable
+        finally:
+            self.histogram.observe(time.perf_counter() - start)
+
+    def _on_task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.opt(exception=task.exception()).error(
+                "Error in subscription callback"
+            )
+
+    async def _work(self, key: Hashable, queue: asyncio.Queue):
+        while True:
+            callback, args = await queue.get()
+            try:
+                if self._semaphore is None:
+                    await self._call(callback, args)
+                else:
+                    async with self._semaphore:
+                        await self._call(callback, args)
+            except Exception:
+                logger.exception(f"Error in callback of subscription <{key}>")
+            finally:
+                queue.task_done()
+
+    async def _call(self, callback: Callable, args: tuple):
+        start = time.perf_counter()
+        try:
+            result = callback(*args)
+            if inspect.isawaitable(result):
+                await result
+        finally:
+            if self.histogram is not None:
+                self.histogram.observe(time.perf_counter() - start)
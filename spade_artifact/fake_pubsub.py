@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+"""
+In-process stand-in for an XMPP pubsub service.
+
+It lets artifacts and agents publish and focus on each other without an XMPP
+server, e.g. to measure the throughput and latency of the library itself (see
+``benchmarks/pubsub_throughput.py``) or to test artifacts end to end::
+
+    server = FakePubSubServer()
+    server.attach(artifact)
+    server.attach(agent)
+    await artifact.start()
+    await agent.start()
+
+Only pubsub is emulated: attached artifacts and agents are not connected to an
+XMPP server, so they cannot exchange messages.
+"""
+
+import asyncio
+import itertools
+from collections import Counter, deque
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from xml.etree.ElementTree import Element
+
+from loguru import logger
+from slixmpp import JID
+from slixmpp.exceptions import IqError
+from slixmpp.plugins.xep_0060 import stanza
+from slixmpp.stanza import Iq
+from slixmpp.stanza.message import Message as SlixmppMessage
+
+
+def _iq_error(condition: str, etype: str = "cancel") -> IqError:
+    iq = Iq(stype="error")
+    iq["error"]["condition"] = condition
+    iq["error"]["type"] = etype
+    return IqError(iq)
+
+
+class _Node(object):
+    __slots__ = ("name", "collection", "items", "subscriptions")
+
+    def __init__(self, name: str, collection: Optional[str], max_items: int):
+        self.name = name
+        self.collection = collection
+        self.items: deque = deque(maxlen=max_items)
+        self.subscriptions: Dict[str, "FakePubSubComponent"] = {}
+
+
+class FakePubSubServer(object):
+    """
+    An in-memory pubsub service shared by the artifacts and agents attached to it.
+
+    Nodes must be created before publishing to them (as artifacts do when they start).
+    Subscribers of a collection node receive the items published to its leaf nodes.
+    Events are delivered in publication order through the event loop, so publishers
+    never run the callbacks of their subscribers.
+    """
+
+    def __init__(
+        self, jid: str = "pubsub.localhost", max_items: int = 10, latency: float = 0
+    ):
+        """
+        Args:
+            jid (str): the JID of the service (Default value = pubsub.localhost)
+            max_items (int): number of items kept by every node (Default value = 10)
+            latency (float): seconds until events are delivered (Default value = 0)
+        """
+        self.jid = str(jid)
+        self.max_items = max_items
+        self.latency = latency
+        self.nodes: Dict[str, _Node] = {}
+        self.stats = Counter()
+        self._ids = itertools.count(1)
+
+    def attach(self, entity):
+        """
+        Makes an artifact or agent (with ``ArtifactMixin``) use this service instead
+        of connecting to an XMPP server. It must be attached before it is started.
+
+        Args:
+            entity (Artifact or spade.agent.Agent): the artifact or agent
+        """
+
+        async def connect():
+            logger.debug(f"{entity.jid} attached to fake pubsub service {self.jid}")
+
+        entity._async_connect = connect
+        entity.PubSubComponent = lambda client: FakePubSubComponent(
+            self, entity.jid, client
+        )
+        entity.pubsub_server = self.jid
+
+    def _node(self, target_jid: str, node: Optional[str]) -> _Node:
+        if str(target_jid) != self.jid:
+            raise _iq_error("service-unavailable")
+        try:
+            return self.nodes[node]
+        except KeyError:
+            raise _iq_error("item-not-found") from None
+
+    def create(self, target_jid: str, node: str, config=None) -> str:
+        """
+        Creates a node.
+
+        Args:
+            target_jid (str): the JID of the service
+            node (str): the name of the node
+            config (slixmpp.plugins.xep_0004.Form, optional): the configuration of the node.
+                Only ``pubsub#collection`` is taken into account.
+
+        Returns:
+            str: the name of the node
+
+        Raises:
+            slixmpp.exceptions.IqError: if the node already exists (conflict)
+                or its collection does not exist (item-not-found)
+        """
+        if str(target_jid) != self.jid:
+            raise _iq_error("service-unavailable")
+        if node in self.nodes:
+            raise _iq_error("conflict")
+        collection = None
+        if config is not None:
+            collection = config.get_values().get("pubsub#collection") or None
+        if collection is not None and collection not in self.nodes:
+            raise _iq_error("item-not-found")
+        self.nodes[node] = _Node(node, collection, self.max_items)
+        self.stats["nodes"] += 1
+        return node
+
+    def delete(self, target_jid: str, node: str):
+        """Deletes a node."""
+        self._node(target_jid, node)
+        del self.nodes[node]
+
+    def publish(
+        self,
+        target_jid: str,
+        node: str,
+        item_id: Optional[str],
+        payload: Element,
+        publisher: str,
+    ) -> str:
+        """
+        Publishes an item and schedules the delivery of its event to the subscribers
+        of the node and of its collection.
+
+        Args:
+            target_jid (str): the JID of the service
+            node (str): the name of the node
+            item_id (str or None): the id of the item. Generated if None.
+            payload (xml.etree.ElementTree.Element): the payload of the item
+            publisher (str): the JID of the publisher
+
+        Returns:
+            str: the id of the item
+
+        Raises:
+            slixmpp.exceptions.IqError: if the node does not exist (item-not-found)
+        """
+        target = self._node(target_jid, node)
+        item_id = item_id or str(next(self._ids))
+        target.items.append((item_id, payload))
+        self.stats["published"] += 1
+
+        msg = SlixmppMessage()
+        msg["from"] = self.jid
+        msg["type"] = "headline"
+        msg["pubsub_event"]["items"]["node"] = node
+        item = msg["pubsub_event"]["items"]["item"]
+        item["id"] = item_id
+        item["publisher"] = publisher
+        item["payload"] = payload
+
+        loop = asyncio.get_running_loop()
+        for subscriber in self._subscribers(target):
+            self.stats["delivered"] += 1
+            if self.latency:
+                loop.call_later(self.latency, subscriber._notify_published, msg)
+            else:
+                loop.call_soon(subscriber._notify_published, msg)
+        return item_id
+
+    def retract(self, target_jid: str, node: str, item_id: str, notify: bool = False):
+        """Retracts an item, notifying the subscribers if ``notify`` is True."""
+        target = self._node(target_jid, node)
+        items = [item for item in target.items if item[0] != item_id]
+        if len(items) == len(target.items):
+            raise _iq_error("item-not-found")
+        target.items = deque(items, maxlen=self.max_items)
+        if notify:
+            msg = SlixmppMessage()
+            msg["from"] = self.jid
+            msg["pubsub_event"]["items"]["node"] = node
+            msg["pubsub_event"]["items"]["retract"]["id"] = item_id
+            loop = asyncio.get_running_loop()
+            for subscriber in self._subscribers(target):
+                loop.call_soon(subscriber._notify_retracted, msg)
+
+    def _subscribers(self, node: _Node) -> List["FakePubSubComponent"]:
+        subscribers = {}
+        while node is not None:
+            for subscriber in node.subscriptions.values():
+                subscribers.setdefault(id(subscriber), subscriber)
+            node = self.nodes.get(node.collection) if node.collection else None
+        return list(subscribers.values())
+
+    def subscribe(self, target_jid: str, node: str, subscriber) -> str:
+        """
+        Subscribes a component to a node.
+
+        Returns:
+            str: the id of the subscription
+        """
+        target = self._node(target_jid, node)
+        subid = str(next(self._ids))
+        target.subscriptions[subid] = subscriber
+        return subid
+
+    def unsubscribe(
+        self, target_jid: str, node: str, subscriber, subid: Optional[str] = None
+    ):
+        """Removes the subscriptions of a component to a node."""
+        target = self._node(target_jid, node)
+        subids = [
+            key
+            for key, subscribed in target.subscriptions.items()
+            if subscribed is subscriber and subid in (None, key)
+        ]
+        if not subids:
+            raise _iq_error("unexpected-request")
+        for key in subids:
+            del target.subscriptions[key]
+
+
+class _FakeXEP0060(object):
+    """The subset of the slixmpp pubsub plugin used by artifacts."""
+
+    def __init__(self, component: "FakePubSubComponent"):
+        self.component = component
+
+    async def publish(
+        self, jid, node, id=None, payload=None, options=None, ifrom=None, **kwargs
+    ) -> str:
+        server = self.component.server
+        item_id = server.publish(
+            jid, node, id, payload, str(ifrom or self.component.jid.bare)
+        )
+        # The reply of the service arrives through the event loop like any other stanza
+        await asyncio.sleep(server.latency)
+        return item_id
+
+    async def get_items(self, jid, node, item_ids=None, max_items=None, **kwargs) -> Iq:
+        items = list(self.component.server._node(jid, node).items)
+        if item_ids is not None:
+            items = [item for item in items if item[0] in item_ids]
+        if max_items:
+            items = items[-max_items:]
+        iq = Iq(stype="result")
+        iq["from"] = str(jid)
+        iq["pubsub"]["items"]["node"] = node
+        for item_id, payload in items:
+            item = stanza.Item()
+            item["id"] = item_id
+            item["payload"] = payload
+            iq["pubsub"]["items"].append(item)
+        await asyncio.sleep(self.component.server.latency)
+        return iq
+
+
+class FakePubSubComponent(object):
+    """
+    Replaces ``PubSubMixin.PubSubComponent`` for the artifacts and agents attached
+    to a ``FakePubSubServer``. Errors are logged and swallowed like in spade_pubsub,
+    except in the ``pubsub.publish`` call of the slixmpp plugin, which raises them.
+    """
+
+    def __init__(self, server: FakePubSubServer, jid, client=None):
+        self.server = server
+        self.jid = JID(str(jid))
+        self.client = client
+        self.pubsub = _FakeXEP0060(self)
+        self._on_published: List[Callable] = []
+        self._on_retracted: List[Callable] = []
+
+    async def create(self, target_jid, target_node=None, config_form=None):
+        try:
+            return self.server.create(target_jid, target_node, config_form)
+        except IqError as e:
+            logger.error(f"Error creating node <{target_node}>: {e}")
+
+    async def delete(self, target_jid, target_node):
+        try:
+            return self.server.delete(target_jid, target_node)
+        except IqError as e:
+            logger.error(f"Error deleting node <{target_node}>: {e}")
+
+    async def purge(self, target_jid, target_node):
+        try:
+            self.server._node(target_jid, target_node).items.clear()
+        except IqError as e:
+            logger.error(f"Error purging node <{target_node}>: {e}")
+
+    async def get_nodes(self, target_jid, target_node=None) -> List[dict]:
+        return [
+            {"jid": self.server.jid, "node": node.name, "name": None}
+            for node in self.server.nodes.values()
+            if node.collection == target_node
+            or (target_node is None and node.collection not in self.server.nodes)
+        ]
+
+    async def get_items(self, target_jid, target_node) -> List[Tuple[str, Element]]:
+        try:
+            return list(self.server._node(target_jid, target_node).items)
+        except IqError as e:
+            logger.error(f"Error retrieving items from node <{target_node}>: {e}")
+
+    async def get_node_subscriptions(self, target_jid, target_node) -> List[str]:
+        try:
+            node = self.server._node(target_jid, target_node)
+        except IqError as e:
+            logger.error(
+                f"Error retrieving owner subscriptions from node <{target_node}>: {e}"
+            )
+            return None
+        return list({str(sub.jid.bare) for sub in node.subscriptions.values()})
+
+    async def subscribe(
+        self, target_jid, target_node=None, subscription_jid=None, config=None
+    ):
+        try:
+            return self.server.subscribe(target_jid, target_node, self)
+        except IqError as e:
+            logger.error(f"Error subscribing to node <{target_node}>: {e}")
+
+    async def unsubscribe(
+        self, target_jid, target_node=None, subscription_jid=None, subid=None
+    ):
+        try:
+            return self.server.unsubscribe(target_jid, target_node, self, subid)
+        except IqError as e:
+            logger.error(f"Error unsubscribing to node <{target_node}>: {e}")
+
+    async def notify(self, target_jid, target_node):
+        logger.warning("Notifications without items are not supported")
+
+    async def publish(
+        self,
+        target_jid,
+        target_node,
+        payload: Union[Element, str],
+        item_id=None,
+        ifrom=None,
+    ):
+        payload_stanza = Element("payload", attrib={"xmlns": "spade.pubsub"})
+        payload_stanza.text = payload
+        try:
+            return await self.pubsub.publish(
+                target_jid, target_node, item_id, payload_stanza, ifrom=ifrom
+            )
+        except IqError as e:
+            logger.error(
+                f"Error publishing item <{item_id or 'undefined'}> to node <{target_node}>: {e}"
+            )
+
+    async def retract(self, target_jid, target_node, item_id, notify=False):
+        try:
+            return self.server.retract(target_jid, target_node, item_id, notify)
+        except IqError as e:
+            logger.error(
+                f"Error retracting item <{item_id}> to node <{target_node}>: {e}"
+            )
+
+    def set_on_item_published(self, callback: Callable):
+        self._on_published.append(callback)
+
+    def set_on_item_retracted(self, callback: Callable):
+        self._on_retracted.append(callback)
+
+    def _notify_published(self, msg: SlixmppMessage):
+        self._notify(self._on_published, msg)
+
+    def _notify_retracted(self, msg: SlixmppMessage):
+        self._notify(self._on_retracted, msg)
+
+    @staticmethod
+    def _notify(handlers: List[Callable], msg: SlixmppMessage):
+        for handler in handlers:
+            try:
+                handler(msg)
+            except Exception:
+                logger.exception("Error in pubsub event handler")
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Artifacts sharing a single XMPP connection."""
+
+from collections import Counter
+from typing import Dict
+
+from slixmpp.stanza.message import Message as SlixmppMessage
+
+from .artifact import Artifact
+
+
+class ArtifactHost(Artifact):
+    """
+    An artifact whose XMPP connection is shared by many hosted artifacts.
+
+    Hosted artifacts do not open their own connection nor log in: they publish
+    to their own nodes through the connection of the host, so their JIDs do not
+    need to be registered in the XMPP server. Their payloads are marked with
+    their JID, so agents focusing on them still receive it as the publisher.
+    The host delivers to its hosted artifacts the publications they are linked to,
+    but hosted artifacts cannot receive messages. All of them share the subscriptions
+    of the host, which subscribes to a node when the first of them (or the host itself)
+    links to it and unsubscribes when the last one unlinks.
+    """
+
+    def __init__(
+        self, jid, password, pubsub_server=None, port=5222, verify_security=False
+    ):
+        super().__init__(
+            jid=jid,
+            password=password,
+            pubsub_server=pubsub_server,
+            port=port,
+            verify_security=verify_security,
+        )
+        self.hosted: Dict[str, Artifact] = {}
+        self._subscribers = Counter()
+
+    def add(self, artifact: Artifact):
+        """
+        Hosts an artifact. It must be added before it is started.
+
+        Args:
+            artifact (Artifact): the artifact to host
+        """
+        if artifact.is_alive():
+            raise RuntimeError(f"Artifact {artifact.jid} is already started")
+        artifact._host = self
+        artifact.pubsub_server = self.pubsub_server
+        self.hosted[str(artifact.jid.bare)] = artifact
+
+    def remove(self, artifact: Artifact):
+        """
+        Stops hosting an artifact. It must be stopped before it is removed.
+
+        Args:
+            artifact (Artifact): the hosted artifact
+        """
+        if artifact.is_alive():
+            raise RuntimeError(f"Artifact {artifact.jid} must be stopped first")
+        self.hosted.pop(str(artifact.jid.bare), None)
+        artifact._host = None
+
+    async def run(self):
+        await self.join()
+
+    async def stop(self) -> None:
+        """
+        Stops the hosted artifacts and then the host.
+        """
+        for artifact in list(self.hosted.values()):
+            if artifact.is_alive():
+                await artifact.stop()
+        await super().stop()
+
+    async def _subscribe(self, node: str):
+        self._subscribers[node] += 1
+        if self._subscribers[node] > 1:
+            return
+        try:
+            await super()._subscribe(node)
+        except Exception:
+            del self._subscribers[node]
+            raise
+
+    async def _unsubscribe(self, node: str):
+        self._subscribers[node] -= 1
+        if self._subscribers[node] > 0:
+            return
+        del self._subscribers[node]
+        await super()._unsubscribe(node)
+
+    async def _on_reconnected(self):
+        for node in list(self._subscribers):
+            await self.pubsub.subscribe(self.pubsub_server, node)
+        await self._replay_offline_buffer()
+        for artifact in list(self.hosted.values()):
+            if artifact.is_alive():
+                await artifact._replay_offline_buffer()
+
+    def on_item_published(self, msg: SlixmppMessage):
+        """
+        Handles an item published event for the host and its hosted artifacts.
+
+        Args:
+            msg (slixmpp.stanza.Message): The pubsub event message.
+        """
+        super().on_item_published(msg)
+        node = msg["pubsub_event"]["items"]["node"]
+        for artifact in self.hosted.values():
+            if node in artifact.subscriptions:
+                artifact.on_item_published(msg)
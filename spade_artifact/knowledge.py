@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Knowledge base of the artifacts, with optional expiration and eviction."""
+
+import heapq
+import itertools
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class KnowledgeBase(object):
+    """
+    Stores the knowledge items of an artifact.
+
+    Items may have a time to live and the number of items may be bounded,
+    in which case the least recently used items are evicted first.
+    Pinned items (e.g. observable properties) are never evicted and do not count
+    towards the maximum number of items, although they may expire.
+    Expired items are removed lazily when the knowledge base is accessed,
+    so no timers are needed.
+    """
+
+    def __init__(
+        self,
+        max_items: Optional[int] = None,
+        default_ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            max_items (int, optional): maximum number of items. Unbounded if None.
+            default_ttl (float, optional): seconds an item lives if no ttl is given when it is set.
+            clock (Callable): returns the current time in seconds
+        """
+        self.max_items = None
+        self.default_ttl = None
+        self.stats = Counter()
+        self._clock = clock
+        self._items = OrderedDict()
+        self._pinned = set()
+        self._expires = {}
+        self._deadlines = []
+        self._sequence = itertools.count()
+        self.configure(max_items, default_ttl)
+
+    def configure(self, max_items: Optional[int], default_ttl: Optional[float]):
+        """
+        Changes the limits of the knowledge base, evicting items if needed.
+
+        Args:
+            max_items (int or None): maximum number of items. Unbounded if None.
+            default_ttl (float or None): seconds an item lives if no ttl is given when it is set.
+        """
+        if max_items is not None and max_items < 1:
+            raise ValueError("max_items must be a positive integer")
+        self.max_items = max_items
+        self.default_ttl = default_ttl
+        self._evict()
+
+    def set(self, name: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Stores an item.
+
+        Args:
+            name (str): name of the item
+            value (object): value of the item
+            ttl (float, optional): seconds the item lives. Defaults to ``default_ttl``.
+        """
+        self._purge()
+        self._items[name] = value
+        self._items.move_to_end(name)
+        ttl = ttl if ttl is not None else self.default_ttl
+        if ttl is None:
+            self._expires.pop(name, None)
+        else:
+            entry = (self._clock() + ttl, next(self._sequence), name)
+            self._expires[name] = entry
+            heapq.heappush(self._deadlines, entry)
+            if len(self._deadlines) > 2 * len(self._expires) + 64:
+                self._compact()
+        self._evict()
+
+    def pin(self, name: Hashable):
+        """
+        Protects an item from eviction.
+
+        Args:
+            name (str): name of the item
+        """
+        self._pinned.add(name)
+
+    def get(self, name: Hashable, default: Any = None) -> Any:
+        """
+        Recovers an item, counting a hit or a miss.
+
+        Args:
+            name (str): name of the item
+            default (object): value returned if the item is not found
+
+        Returns:
+            object: the value of the item or default
+        """
+        self._purge()
+        if name in self._items:
+            self.stats["hits"] += 1
+            self._items.move_to_end(name)
+            return self._items[name]
+        self.stats["misses"] += 1
+        return default
+
+    def peek(self, name: Hashable, default: Any = None) -> Any:
+        """
+        Recovers an item without counting it as a use.
+
+        Args:
+            name (str): name of the item
+            default (object): value returned if the item is not found
+
+        Returns:
+            object: the value of the item or default
+        """
+        self._purge()
+        return self._items.get(name, default)
+
+    def __contains__(self, name: Hashable) -> bool:
+        self._purge()
+        return name in self._items
+
+    def __len__(self) -> int:
+        self._purge()
+        return len(self._items)
+
+    def _remove(self, name: Hashable):
+        del self._items[name]
+        self._expires.pop(name, None)
+
+    def _purge(self):
+        now = self._clock()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            entry = heapq.heappop(self._deadlines)
+            name = entry[2]
+            if self._expires.get(name) is entry:
+                self._remove(name)
+                self.stats["expirations"] += 1
+
+    def _evict(self):
+        if self.max_items is None:
+            return
+        pinned = sum(1 for name in self._pinned if name in self._items)
+        while len(self._items) - pinned > self.max_items:
+            name = next(iter(self._items))
+            if name in self._pinned:
+                self._items.move_to_end(name)
+                continue
+            self._remove(name)
+            self.stats["evictions"] += 1
+
+    def _compact(self):
+        self._deadlines = [
+            entry for entry in self._deadlines if self._expires.get(entry[2]) is entry
+        ]
+        heapq.heapify(self._deadlines)
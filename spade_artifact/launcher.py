@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""Launcher that shards artifacts across several worker processes."""
+
+import asyncio
+import importlib
+import multiprocessing
+import os
+import signal
+import time
+from itertools import count
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Union
+
+from loguru import logger
+from spade.container import Container
+
+READY = "ready"
+STATS = "stats"
+STOP = "stop"
+
+
+class ArtifactSpec(NamedTuple):
+    """
+    Describes how to build an artifact in a worker process.
+    The factory and its arguments must be picklable.
+
+    Args:
+        factory (type or str): the artifact class, or its import path as ``"module:Class"``
+        args (tuple): positional arguments of the factory (e.g. the JID and the password)
+        kwargs (dict, optional): keyword arguments of the factory
+    """
+
+    factory: Union[type, str]
+    args: tuple = ()
+    kwargs: Optional[Dict[str, Any]] = None
+
+    @property
+    def jid(self) -> str:
+        """The JID of the artifact, as given to the factory"""
+        return str(self.args[0]) if self.args else str((self.kwargs or {}).get("jid"))
+
+    def build(self):
+        """
+        Builds the artifact.
+
+        Returns:
+            Artifact: the artifact
+        """
+        factory = self.factory
+        if isinstance(factory, str):
+            module, _, name = factory.partition(":")
+            factory = getattr(importlib.import_module(module), name)
+        return factory(*self.args, **(self.kwargs or {}))
+
+
+def shard(specs: Sequence[ArtifactSpec], workers: int) -> List[List[ArtifactSpec]]:
+    """
+    Distributes artifact specs in round robin across workers.
+
+    Args:
+        specs (list of ArtifactSpec): the specs of the artifacts
+        workers (int): the number of workers
+
+    Returns:
+        list: the specs of every worker. Workers without specs are omitted.
+    """
+    shards = [list(specs[i::workers]) for i in range(workers)]
+    return [specs for specs in shards if specs]
+
+
+def _report(artifacts: Dict[str, Any], errors: Dict[str, str]) -> dict:
+    report = {jid: {"alive": False, "error": error} for jid, error in errors.items()}
+    for jid, artifact in artifacts.items():
+        report[jid] = {
+            "alive": artifact.is_alive(),
+            "error": None,
+            "mailbox": artifact.mailbox_stats(),
+            "knowledge": artifact.knowledge_stats(),
+            "in_flight": artifact.publications_in_flight(),
+        }
+    return report
+
+
+async def _serve(specs: List[ArtifactSpec], conn) -> None:
+    loop = asyncio.get_running_loop()
+    artifacts = {}
+    errors = {}
+    for spec in specs:
+        try:
+            artifact = spec.build()
+            await artifact.start()
+            artifacts[str(artifact.jid)] = artifact
+        except Exception as e:
+            logger.exception(f"Could not start artifact {spec.jid}")
+            errors[spec.jid] = repr(e)
+    conn.send((READY, 0, _report(artifacts, errors)))
+
+    while True:
+        try:
+            command, sequence = await loop.run_in_executor(None, conn.recv)
+        except EOFError:
+            command, sequence = STOP, None
+        if command == STATS:
+            conn.send((STATS, sequence, _report(artifacts, errors)))
+        elif command == STOP:
+            await asyncio.gather(
+                *[artifact.stop() for artifact in artifacts.values()],
+                return_exceptions=True,
+            )
+            try:
+                conn.send((STOP, sequence, _report(artifacts, errors)))
+            except (BrokenPipeError, OSError):
+                pass
+            return
+
+
+def _worker_main(specs: List[ArtifactSpec], conn) -> None:  # pragma: no cover
+    # Shutdown is coordinated by the launcher, so Ctrl+C must not kill the workers.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    Container().run(_serve(specs, conn))
+
+
+class Launcher(object):
+    """
+    Runs artifacts in several worker processes, each with its own event loop,
+    so CPU-heavy artifacts (e.g. readers with expensive data processors) use
+    every core of the machine.
+    """
+
+    def __init__(
+        self,
+        specs: Sequence[ArtifactSpec],
+        workers: Optional[int] = None,
+        start_method: Optional[str] = None,
+    ):
+        """
+        Args:
+            specs (list of ArtifactSpec): the artifacts to run
+            workers (int, optional): number of worker processes. Defaults to the number of CPUs.
+            start_method (str, optional): the multiprocessing start method ("spawn", "fork"...).
+                Defaults to the platform default.
+        """
+        workers = workers or os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError("workers must be a positive integer")
+        self.shards = shard(list(specs), workers)
+        self._context = multiprocessing.get_context(start_method)
+        self._processes = []
+        self._connections = []
+        self._sequence = count(1)
+
+    def start(self, timeout: Optional[float] = None) -> dict:
+        """
+        Starts the workers and waits until they have started their artifacts.
+
+        Args:
+            timeout (float, optional): seconds to wait for every worker
+
+        Returns:
+            dict: the health of the artifacts (see ``health``)
+        """
+        for specs in self.shards:
+            parent, child = self._context.Pipe()
+            process = self._context.Process(
+                target=_worker_main, args=(specs, child), daemon=True
+            )
+            process.start()
+            child.close()
+            self._processes.append(process)
+            self._connections.append(parent)
+        return self._collect(READY, 0, timeout)
+
+    def health(self, timeout: Optional[float] = 5) -> dict:
+        """
+        Checks the health of the workers and of their artifacts.
+
+        Args:
+            timeout (float, optional): seconds to wait for every worker
+
+        Returns:
+            dict: ``workers`` (number of workers), ``alive_workers``, ``artifacts``
+            (number of artifacts), ``alive_artifacts``, ``failed`` (JIDs of the artifacts
+            that could not be started or whose worker is dead) and ``pids``
+        """
+        return self._summary(self._request(STATS, timeout))
+
+    def stats(self, timeout: Optional[float] = 5) -> dict:
+        """
+        Aggregates the statistics of the artifacts of every worker.
+
+        Args:
+            timeout (float, optional): seconds to wait for every worker
+
+        Returns:
+            dict: the health of the workers (see ``health``), the sum of the
+            ``mailbox`` and ``knowledge`` statistics and of the publications ``in_flight``
+            of all the artifacts, and the statistics of every artifact (``by_artifact``)
+        """
+        reports = self._request(STATS, timeout)
+        stats = self._summary(reports)
+        mailbox, knowledge, in_flight = {}, {}, 0
+        by_artifact = {}
+        for report in reports:
+            for jid, artifact in (report or {}).items():
+                by_artifact[jid] = artifact
+                for totals, key in ((mailbox, "mailbox"), (knowledge, "knowledge")):
+                    for name, value in artifact.get(key, {}).items():
+                        if isinstance(value, int):
+                            totals[name] = totals.get(name, 0) + value
+                in_flight += artifact.get("in_flight", 0)
+        stats.update(
+            mailbox=mailbox,
+            knowledge=knowledge,
+            in_flight=in_flight,
+            by_artifact=by_artifact,
+        )
+        return stats
+
+    def stop(self, timeout: float = 10) -> dict:
+        """
+        Stops the artifacts of every worker and waits for the workers to exit.
+        Workers still running after the timeout are terminated.
+
+        Args:
+            timeout (float): seconds to wait for every worker
+
+        Returns:
+            dict: the health of the artifacts after stopping them (see ``health``)
+        """
+        reports = self._request(STOP, timeout)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"Worker {process.pid} did not stop. Terminating it.")
+                process.terminate()
+                process.join()
+        summary = self._summary(reports)
+        for conn in self._connections:
+            conn.close()
+        self._processes, self._connections = [], []
+        return summary
+
+    def _request(self, command: str, timeout: Optional[float]) -> List[Optional[dict]]:
+        sequence = next(self._sequence)
+        for process, conn in zip(self._processes, self._connections):
+            if process.is_alive():
+                try:
+                    conn.send((command, sequence))
+                except (BrokenPipeError, OSError):
+                    pass
+        return self._collect(command, sequence, timeout, summarize=False)
+
+    def _collect(
+        self, expected: str, sequence: int, timeout: Optional[float], summarize=True
+    ):
+        """
+        Waits for the answer of every worker to a request.
+        Late answers to previous requests, which timed out, are discarded.
+        """
+        reports = []
+        for process, conn in zip(self._processes, self._connections):
+            report = None
+            deadline = time.monotonic() + timeout if timeout is not None else None
+            try:
+                while report is None:
+                    remaining = (
+                        max(0, deadline - time.monotonic())
+                        if deadline is not None
+                        else None
+                    )
+                    if not conn.poll(remaining):
+                        break
+                    kind, answered, answer = conn.recv()
+                    if (kind, answered) == (expected, sequence):
+                        report = answer
+                    else:
+                        logger.debug(
+                            f"Discarding late <{kind}> of worker {process.pid}"
+                        )
+            except (EOFError, OSError):
+                pass
+            if report is None:
+                logger.warning(f"Worker {process.pid} did not answer <{expected}>")
+            reports.append(report)
+        return self._summary(reports) if summarize else reports
+
+    def _summary(self, reports: List[Optional[dict]]) -> dict:
+        artifacts = alive = 0
+        failed = []
+        for specs, report in zip(self.shards, reports):
+            if report is None:
+                artifacts += len(specs)
+                failed.extend(spec.jid for spec in specs)
+                continue
+            for jid, artifact in report.items():
+                artifacts += 1
+                if artifact["alive"]:
+                    alive += 1
+                elif artifact["error"] is not None:
+                    failed.append(jid)
+        return {
+            "workers": len(self._processes),
+            "alive_workers": sum(process.is_alive() for process in self._processes),
+            "artifacts": artifacts,
+            "alive_artifacts": alive,
+            "failed": failed,
+            "pids": [process.pid for process in self._processes],
+        }
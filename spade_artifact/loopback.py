@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+In-process delivery of publications to subscribers living in the same process.
+
+Artifacts with loopback enabled (see ``Artifact.set_loopback``) register here as
+local publishers. Agents and artifacts focusing on (or linking to) a local publisher
+register a receiver instead of subscribing through pubsub, and get the published
+payloads as Python objects, without serialization nor a round trip to the server.
+
+Receivers are invoked through the event loop in the order the payloads were
+published, so every local subscriber gets the payloads of a publisher in the same
+order and callbacks never run inside ``publish``. When a publisher leaves loopback,
+its receivers are moved to pubsub subscriptions through their fallbacks.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+_publishers: Set[Tuple[str, str]] = set()
+_receivers: Dict[Tuple[str, str], List[Callable]] = {}
+_fallbacks: Dict[Tuple[str, str, Callable], Callable[[str], Awaitable[None]]] = {}
+
+
+def owner_of(node: str) -> str:
+    """
+    Returns the JID of the artifact publishing in a node.
+
+    Args:
+        node (str): the node of an artifact or of one of its properties
+
+    Returns:
+        str: the bare JID of the artifact
+    """
+    return str(node).split("/", 1)[0]
+
+
+def register_publisher(pubsub_server: str, jid: str):
+    """
+    Registers an artifact as a local publisher.
+
+    Args:
+        pubsub_server (str): the JID of the pubsub service of the artifact
+        jid (str): the bare JID of the artifact
+    """
+    _publishers.add((str(pubsub_server), str(jid)))
+
+
+def unregister_publisher(pubsub_server: str, jid: str) -> List[asyncio.Future]:
+    """
+    Unregisters a local publisher.
+    The receivers of its nodes are unsubscribed and their fallbacks are scheduled,
+    so they subscribe to the nodes through pubsub.
+
+    Args:
+        pubsub_server (str): the JID of the pubsub service of the artifact
+        jid (str): the bare JID of the artifact
+
+    Returns:
+        list: the scheduled fallbacks
+    """
+    _publishers.discard((str(pubsub_server), str(jid)))
+    keys = [
+        key
+        for key in _receivers
+        if key[0] == str(pubsub_server) and owner_of(key[1]) == str(jid)
+    ]
+    fallbacks = []
+    for key in keys:
+        for receiver in _receivers.pop(key):
+            fallback = _fallbacks.pop(key + (receiver,), None)
+            if fallback is not None:
+                fallbacks.append(asyncio.ensure_future(_fall_back(fallback, key[1])))
+    return fallbacks
+
+
+def is_local(pubsub_server: str, node: str) -> bool:
+    """
+    Checks if the artifact publishing in a node is a local publisher.
+
+    Args:
+        pubsub_server (str): the JID of the pubsub service
+        node (str): the name of the node
+
+    Returns:
+        bool: whether the node can be subscribed to locally
+    """
+    return (str(pubsub_server), owner_of(node)) in _publishers
+
+
+def subscribe(
+    pubsub_server: str,
+    node: str,
+    receiver: Callable,
+    fallback: Optional[Callable[[str], Awaitable[None]]] = None,
+):
+    """
+    Subscribes a receiver to the payloads published locally in a node.
+
+    Args:
+        pubsub_server (str): the JID of the pubsub service
+        node (str): the name of the node
+        receiver (Callable): invoked with the node, the publisher JID and the list of payloads
+        fallback (coroutine function, optional): awaited with the node when the publisher
+            leaves loopback, to subscribe to the node through pubsub instead
+    """
+    key = (str(pubsub_server), str(node))
+    _receivers.setdefault(key, []).append(receiver)
+    if fallback is not None:
+        _fallbacks[key + (receiver,)] = fallback
+
+
+def unsubscribe(pubsub_server: str, node: str, receiver: Callable) -> bool:
+    """
+    Unsubscribes a receiver from a node.
+
+    Args:
+        pubsub_server (str): the JID of the pubsub service
+        node (str): the name of the node
+        receiver (Callable): the receiver
+
+    Returns:
+        bool: whether the receiver was subscribed locally to the node
+    """
+    key = (str(pubsub_server), str(node))
+    receivers = _receivers.get(key, [])
+    if receiver not in receivers:
+        return False
+    receivers.remove(receiver)
+    _fallbacks.pop(key + (receiver,), None)
+    if not receivers:
+        del _receivers[key]
+    return True
+
+
+def is_subscribed(pubsub_server: str, node: str, receiver: Callable) -> bool:
+    """
+    Checks if a receiver is subscribed locally to a node.
+
+    Args:
+        pubsub_server (str): the JID of the pubsub service
+        node (str): the name of the node
+        receiver (Callable): the receiver
+
+    Returns:
+        bool: whether the receiver gets the payloads of the node locally
+    """
+    return receiver in _receivers.get((str(pubsub_server), str(node)), ())
+
+
+def deliver(pubsub_server: str, node: str, jid: str, payloads: List[Any]) -> int:
+    """
+    Schedules the delivery of some payloads to the local receivers of a node.
+    Payloads are not copied, so they must not be modified once published.
+
+    Args:
+        pubsub_server (str): the JID of the pubsub service
+        node (str): the name of the node
+        jid (str): the JID of the publisher
+        payloads (list): the published payloads
+
+    Returns:
+        int: the number of receivers
+    """
+    receivers = _receivers.get((str(pubsub_server), str(node)))
+    if not receivers:
+        return 0
+    loop = asyncio.get_running_loop()
+    for receiver in receivers:
+        loop.call_soon(_receive, receiver, node, jid, payloads)
+    return len(receivers)
+
+
+def reset():
+    """Forgets every local publisher and receiver."""
+    _publishers.clear()
+    _receivers.clear()
+    _fallbacks.clear()
+
+
+async def _fall_back(fallback: Callable[[str], Awaitable[None]], node: str):
+    try:
+        await fallback(node)
+    except Exception:
+        logger.exception(f"Error subscribing to node <{node}> through pubsub")
+
+
+def _receive(receiver: Callable, node: str, jid: str, payloads: List[Any]):
+    try:
+        receiver(node, jid, payloads)
+    except Exception:
+        logger.exception(f"Error delivering local items of node <{node}>")
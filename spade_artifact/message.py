@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Lazy conversion of received XMPP messages."""
+
+import asyncio
+
+from spade.message import Message
+
+
+class LazyMessage:
+    """
+    Wraps a received slixmpp message and converts it to a spade message only
+    when it is first used, so messages that are dropped are never parsed.
+    """
+
+    __slots__ = ("_stanza", "_message")
+
+    def __init__(self, stanza):
+        """
+        Args:
+            stanza (slixmpp.stanza.Message): the message just received.
+        """
+        self._stanza = stanza
+        self._message = None
+
+    @property
+    def message(self) -> Message:
+        """Returns the spade message, converting the stanza if needed."""
+        if self._message is None:
+            self._message = Message.from_node(self._stanza)
+            self._stanza = None
+        return self._message
+
+    def __getattr__(self, name):
+        return getattr(self.message, name)
+
+    def __str__(self) -> str:
+        return str(self.message)
+
+
+class MessageQueue(asyncio.Queue):
+    """
+    A mailbox of received messages.
+    Messages are queued as ``LazyMessage`` and converted to spade messages when
+    they are taken out of the queue, so readers always get ``spade.message.Message``.
+    """
+
+    def _get(self):
+        item = super()._get()
+        return item.message if isinstance(item, LazyMessage) else item
+
+    def discard_nowait(self):
+        """
+        Removes the oldest message without converting it.
+
+        Returns:
+            LazyMessage: the removed message
+
+        Raises:
+            asyncio.QueueEmpty: if the queue is empty
+        """
+        if self.empty():
+            raise asyncio.QueueEmpty
+        return super()._get()
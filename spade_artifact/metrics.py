@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics of artifacts and agents, exported in the Prometheus text format.
+
+Metrics are disabled by default, and instrumented code only checks an attribute
+while they are disabled. Enable them before starting the artifacts and agents::
+
+    from spade_artifact import metrics
+
+    metrics.enable()
+    runner = await metrics.serve(port=9100)  # optional HTTP endpoint
+"""
+
+import bisect
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in labels]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterChild(object):
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class _HistogramChild(object):
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> "_Timer":
+        """Measures the time spent in a ``with`` block."""
+        return _Timer(self)
+
+
+class _Timer(object):
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: _HistogramChild):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Metric(object):
+    """
+    A family of metrics with the same name and different label values.
+    """
+
+    type: str = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """
+        Returns the metric with the given label values.
+
+        Args:
+            *values (str): the values of the labels, in the order of ``labelnames``
+        """
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> List[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        return [
+            ("", tuple(zip(self.labelnames, values)), child.value)
+            for values, child in self._children.items()
+        ]
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, labels, value in self._samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}"
+            )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A value that only increases (e.g. the number of published items)."""
+
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class Gauge(Metric):
+    """A value that goes up and down (e.g. the number of messages in a mailbox)."""
+
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class Histogram(Metric):
+    """The distribution of observed values (e.g. publication latencies)."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _samples(self):
+        samples = []
+        for values, child in self._children.items():
+            labels = tuple(zip(self.labelnames, values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                bucket = labels + (("le", _format_value(bound)),)
+                samples.append(("_bucket", bucket, cumulative))
+            samples.append(("_sum", labels, child.sum))
+            samples.append(("_count", labels, child.count))
+        return samples
+
+
+class MetricsRegistry(object):
+    """Holds the metrics exported together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def _get_or_create(self, kind: type, name: str, *args, **kwargs) -> Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = kind(name, *args, **kwargs)
+        elif not isinstance(metric, kind):
+            raise ValueError(f"Metric {name} is already registered as a {metric.type}")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        """Returns the counter with the given name, creating it if needed."""
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        """Returns the gauge with the given name, creating it if needed."""
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Returns the histogram with the given name, creating it if needed."""
+        return self._get_or_create(
+            Histogram, name, documentation, labelnames, buckets=buckets
+        )
+
+    def render(self) -> str:
+        """
+        Returns:
+            str: every metric in the Prometheus text exposition format
+        """
+        return "".join(metric.render() + "\n" for metric in self._metrics.values())
+
+
+registry = MetricsRegistry()
+_enabled = False
+
+
+def enable():
+    """Enables the metrics of the artifacts and agents started from now on."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Disables the metrics of the artifacts and agents started from now on."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class ArtifactMetrics(object):
+    """The metrics of an artifact or agent, bound to its JID."""
+
+    def __init__(self, jid: str, metrics_registry: Optional[MetricsRegistry] = None):
+        metrics_registry = metrics_registry or registry
+        labels = ("jid",)
+        self.jid = jid
+        self.published_items = metrics_registry.counter(
+            "spade_artifact_published_items_total", "Payloads published", labels
+        ).labels(jid)
+        self.publish_seconds = metrics_registry.histogram(
+            "spade_artifact_publish_seconds",
+            "Time until a publication is acknowledged",
+            labels,
+        ).labels(jid)
+        self.sent_messages = metrics_registry.counter(
+            "spade_artifact_sent_messages_total", "Messages sent", labels
+        ).labels(jid)
+        self.received_messages = metrics_registry.counter(
+            "spade_artifact_received_messages_total", "Messages received", labels
+        ).labels(jid)
+        self.mailbox_messages = metrics_registry.gauge(
+            "spade_artifact_mailbox_messages", "Messages waiting in the mailbox", labels
+        ).labels(jid)
+        self.received_items = metrics_registry.counter(
+            "spade_artifact_received_items_total",
+            "Payloads received from focused or linked artifacts",
+            labels,
+        ).labels(jid)
+        self.callback_seconds = metrics_registry.histogram(
+            "spade_artifact_callback_seconds",
+            "Time spent in focus and link callbacks",
+            labels,
+        ).labels(jid)
+        self._publish_queue = metrics_registry.gauge(
+            "spade_artifact_publish_queue_payloads",
+            "Payloads waiting in the publish queue of the rate limiter",
+            ("jid", "priority"),
+        )
+
+    def publish_queue(self, priority: str) -> _GaugeChild:
+        """
+        Returns the gauge of the payloads waiting in a lane of the publish queue.
+
+        Args:
+            priority (str): the priority of the lane
+        """
+        return self._publish_queue.labels(self.jid, priority)
+
+
+def bind(jid) -> Optional[ArtifactMetrics]:
+    """
+    Returns the metrics of an artifact or agent, or None if metrics are disabled.
+
+    Args:
+        jid (str): the JID of the artifact or agent
+    """
+    return ArtifactMetrics(str(jid)) if _enabled else None
+
+
+async def serve(
+    host: str = "127.0.0.1",
+    port: int = 9100,
+    metrics_registry: Optional[MetricsRegistry] = None,
+):
+    """
+    Serves the metrics in ``/metrics`` with aiohttp.
+
+    Args:
+        host (str): the address to listen to (Default value = 127.0.0.1)
+        port (int): the port to listen to (Default value = 9100)
+        metrics_registry (MetricsRegistry, optional): the registry to export.
+            Defaults to the registry of the artifacts.
+
+    Returns:
+        aiohttp.web.AppRunner: the runner of the server. Call its ``cleanup`` to stop it.
+    """
+    from aiohttp import web
+
+    metrics_registry = metrics_registry or registry
+
+    async def handle(request):
+        return web.Response(
+            text=metrics_registry.render(),
+            content_type="text/plain",
+            headers={"X-Content-Type-Options": "nosniff"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Names and configuration of the pubsub nodes used by artifacts."""
+
+from typing import Iterable, Set, Tuple
+
+from slixmpp.plugins.xep_0004 import Form
+
+NODE_CONFIG_FORM_TYPE = "http://jabber.org/protocol/pubsub#node_config"
+
+_known_nodes: Set[Tuple[str, str]] = set()
+
+
+def properties_node(artifact_jid) -> str:
+    """
+    Returns the collection node grouping the property nodes of an artifact.
+
+    Args:
+        artifact_jid (str or slixmpp.JID): the bare JID of the artifact
+
+    Returns:
+        str: the name of the collection node
+    """
+    return f"{artifact_jid}/properties"
+
+
+def property_node(artifact_jid, name: str) -> str:
+    """
+    Returns the leaf node where an artifact publishes one of its properties.
+
+    Args:
+        artifact_jid (str or slixmpp.JID): the bare JID of the artifact
+        name (str): the name of the property
+
+    Returns:
+        str: the name of the leaf node
+    """
+    return f"{properties_node(artifact_jid)}/{name}"
+
+
+def node_config(**options) -> Form:
+    """
+    Builds the configuration form used to create a node.
+
+    Args:
+        **options: node options without the ``pubsub#`` prefix (e.g. ``node_type="collection"``)
+
+    Returns:
+        slixmpp.plugins.xep_0004.Form: the configuration form
+    """
+    form = Form()
+    form["type"] = "submit"
+    form.add_field(var="FORM_TYPE", ftype="hidden", value=NODE_CONFIG_FORM_TYPE)
+    for option, value in options.items():
+        form.add_field(var=f"pubsub#{option}", value=value)
+    return form
+
+
+def is_node_known(pubsub_server: str, node: str) -> bool:
+    """
+    Checks if a node is known to exist, so it does not need to be created.
+
+    Args:
+        pubsub_server (str): the JID of the pubsub service
+        node (str): the name of the node
+
+    Returns:
+        bool: whether the node was created or discovered by this process
+    """
+    return (str(pubsub_server), str(node)) in _known_nodes
+
+
+def remember_nodes(pubsub_server: str, nodes: Iterable[str]):
+    """
+    Remembers that some nodes exist in a pubsub service.
+
+    Args:
+        pubsub_server (str): the JID of the pubsub service
+        nodes (list of str): the names of the nodes
+    """
+    _known_nodes.update((str(pubsub_server), str(node)) for node in nodes)
+
+
+def forget_node(pubsub_server: str, node: str):
+    """
+    Forgets a node, so it is created again the next time it is needed.
+
+    Args:
+        pubsub_server (str): the JID of the pubsub service
+        node (str): the name of the node
+    """
+    _known_nodes.discard((str(pubsub_server), str(node)))
+
+
+def forget_nodes():
+    """Forgets every known node."""
+    _known_nodes.clear()
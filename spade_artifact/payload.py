@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Helpers to build and parse the payload elements exchanged through pubsub."""
+
+import json
+from typing import Any, List, Optional
+from xml.etree.ElementTree import Element
+
+from .codecs import Codec, get_codec
+from .compression import compress, decompress
+
+PAYLOAD_NAMESPACE = "spade.pubsub"
+BATCH_TYPE = "batch"
+DELTA_MARKER = "delta"
+PUBLISHER_MARKER = "publisher"
+
+
+class PayloadError(Exception):
+    """Raised when a received payload cannot be decoded"""
+
+    pass
+
+
+def build_payload(text: str, **attrib) -> Element:
+    """
+    Builds a payload element compatible with the ones published by spade_pubsub.
+
+    Args:
+        text (str): the content of the payload
+        **attrib: extra attributes used as markers of the payload
+
+    Returns:
+        xml.etree.ElementTree.Element: the payload element
+    """
+    payload = Element("payload", attrib={"xmlns": PAYLOAD_NAMESPACE, **attrib})
+    payload.text = text
+    return payload
+
+
+def pack_item(payload: Any, codec: Optional[Codec] = None, **attrib) -> Element:
+    """
+    Packs a single payload, encoding it with the codec if provided.
+
+    Args:
+        payload (object): the payload to be packed
+        codec (Codec, optional): the codec used to encode the payload
+        **attrib: extra attributes used as markers of the payload
+
+    Returns:
+        xml.etree.ElementTree.Element: the payload element
+    """
+    if codec is None:
+        return build_payload(payload, **attrib)
+    return build_payload(codec.encode(payload), codec=codec.name, **attrib)
+
+
+def pack_batch(payloads: List[Any], codec: Optional[Codec] = None, **attrib) -> Element:
+    """
+    Packs several payloads into a single payload element.
+
+    Args:
+        payloads (list): the payloads to be packed
+        codec (Codec, optional): the codec used to encode the payloads
+        **attrib: extra attributes used as markers of the payload
+
+    Returns:
+        xml.etree.ElementTree.Element: the batch payload element
+    """
+    if codec is None:
+        return build_payload(json.dumps(list(payloads)), type=BATCH_TYPE, **attrib)
+    return build_payload(
+        codec.encode(list(payloads)), type=BATCH_TYPE, codec=codec.name, **attrib
+    )
+
+
+def is_delta(payload: Element) -> bool:
+    """
+    Checks if a payload element carries deltas (see ``spade_artifact.delta``).
+
+    Args:
+        payload (xml.etree.ElementTree.Element): the received payload element
+
+    Returns:
+        bool: whether the items of the payload are deltas
+    """
+    return payload.get(DELTA_MARKER) is not None
+
+
+def publisher_of(payload: Element, default: str) -> str:
+    """
+    Returns the artifact that published a payload element.
+    Artifacts sharing a connection (see ``spade_artifact.host``) mark their payloads
+    with their JID, since the pubsub service reports the JID of the connection.
+
+    Args:
+        payload (xml.etree.ElementTree.Element): the received payload element
+        default (str): the publisher reported by the pubsub service
+
+    Returns:
+        str: the JID of the publisher
+    """
+    return payload.get(PUBLISHER_MARKER) or default
+
+
+def compress_payload(payload: Element, algorithm: str) -> Element:
+    """
+    Compresses the content of a payload element and marks it as compressed.
+
+    Args:
+        payload (xml.etree.ElementTree.Element): the payload element
+        algorithm (str): the compression algorithm ("zlib" or "zstd")
+
+    Returns:
+        xml.etree.ElementTree.Element: the compressed payload element
+    """
+    compressed = build_payload(compress(payload.text, algorithm), compression=algorithm)
+    for key, value in payload.attrib.items():
+        compressed.set(key, value)
+    return compressed
+
+
+def unpack(payload: Element) -> List[Any]:
+    """
+    Returns the items carried by a payload element.
+    A plain payload carries a single item, while a batch carries many.
+    Compressed items are decompressed and items published with a codec are decoded.
+
+    Args:
+        payload (xml.etree.ElementTree.Element): the received payload element
+
+    Returns:
+        list: the items in publication order
+
+    Raises:
+        PayloadError: if the payload cannot be decoded
+    """
+    codec_name = payload.get("codec")
+    compression = payload.get("compression")
+    try:
+        text = payload.text
+        if compression is not None:
+            text = decompress(text, compression)
+        if codec_name is not None:
+            content = get_codec(codec_name).decode(text)
+        elif payload.get("type") == BATCH_TYPE:
+            content = json.loads(text)
+        else:
+            content = text
+    except (KeyError, ImportError) as e:
+        raise PayloadError(
+            f"Codec {codec_name} or compression {compression} is not available: {e}"
+        ) from e
+    except Exception as e:
+        raise PayloadError(f"Could not decode payload: {e}") from e
+
+    if payload.get("type") == BATCH_TYPE:
+        return list(content)
+    return [content]
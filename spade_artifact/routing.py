@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Routing of the messages received by an artifact (see ``Artifact.add_route``).
+
+Simple templates are indexed by the fields they match exactly (recipient, sender,
+body, thread and metadata), so finding the route of a message takes a dictionary
+lookup per distinct combination of fields, whatever the number of templates.
+Templates combined with operators (``&``, ``|``, ``^``, ``~``) are checked one by one.
+"""
+
+from itertools import count
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from spade.message import Message
+from spade.template import BaseTemplate, Template
+
+from .message import MessageQueue
+
+
+class Route(object):
+    """The destination of the messages matching a template."""
+
+    __slots__ = ("template", "handler", "queue", "order", "index")
+
+    def __init__(self, template: BaseTemplate, handler: Optional[Callable], order: int):
+        self.template = template
+        self.handler = handler
+        self.queue = MessageQueue() if handler is None else None
+        self.order = order
+        self.index: Optional[Tuple[Tuple[Hashable, ...], Tuple]] = None
+
+
+def _exact_fields(template: Template) -> List[Tuple[Hashable, Any]]:
+    fields = []
+    if not template.empty_to():
+        fields.append(("to", str(template.to)))
+    if not template.empty_sender():
+        fields.append(("sender", str(template.sender)))
+    if template.body:
+        fields.append(("body", template.body))
+    if template.thread:
+        fields.append(("thread", template.thread))
+    for key, value in sorted(template._metadata.items()):
+        fields.append((("metadata", key), value))
+    return fields
+
+
+def _value(message: Message, field: Hashable) -> Any:
+    if field == "to":
+        return str(message.to) if message.to else None
+    if field == "sender":
+        return str(message.sender) if message.sender else None
+    if field == "body":
+        return message.body
+    if field == "thread":
+        return message.thread
+    return message.get_metadata(field[1])
+
+
+class MessageRouter(object):
+    """
+    Finds the route of a message among the templates added to it.
+    When several templates match a message, the first one added wins.
+    """
+
+    def __init__(self):
+        self._routes: Dict[int, Route] = {}
+        self._index: Dict[Tuple[Hashable, ...], Dict[Tuple, List[Route]]] = {}
+        self._unindexed: List[Route] = []
+        self._order = count()
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def add(self, template: BaseTemplate, handler: Optional[Callable] = None) -> Route:
+        """
+        Adds a route, replacing the route of the same template if any.
+
+        Args:
+            template (spade.template.BaseTemplate): the template of the messages
+            handler (Callable, optional): invoked with every matching message.
+                Matching messages are queued in the route if not provided.
+
+        Returns:
+            Route: the new route
+        """
+        self.remove(template)
+        route = Route(template, handler, next(self._order))
+        self._routes[id(template)] = route
+        if not isinstance(template, Template):
+            self._unindexed.append(route)
+            return route
+        fields = _exact_fields(template)
+        signature = tuple(field for field, _ in fields)
+        key = tuple(value for _, value in fields)
+        self._index.setdefault(signature, {}).setdefault(key, []).append(route)
+        route.index = (signature, key)
+        return route
+
+    def remove(self, template: BaseTemplate) -> Optional[Route]:
+        """
+        Removes the route of a template.
+
+        Args:
+            template (spade.template.BaseTemplate): the template of the route
+
+        Returns:
+            Route: the removed route, or None if the template had no route
+        """
+        route = self._routes.pop(id(template), None)
+        if route is None:
+            return None
+        if route.index is None:
+            self._unindexed.remove(route)
+            return route
+        signature, key = route.index
+        buckets = self._index[signature]
+        buckets[key].remove(route)
+        if not buckets[key]:
+            del buckets[key]
+        if not buckets:
+            del self._index[signature]
+        return route
+
+    def get(self, template: BaseTemplate) -> Optional[Route]:
+        """
+        Args:
+            template (spade.template.BaseTemplate): the template of the route
+
+        Returns:
+            Route: the route of the template, or None if it has no route
+        """
+        return self._routes.get(id(template))
+
+    def route(self, message: Message) -> Optional[Route]:
+        """
+        Finds the route of a message.
+
+        Args:
+            message (spade.message.Message): the message
+
+        Returns:
+            Route: the first route added whose template matches the message, or None
+        """
+        best = None
+        for signature, buckets in self._index.items():
+            routes = buckets.get(tuple(_value(message, field) for field in signature))
+            if routes and (best is None or routes[0].order < best.order):
+                best = routes[0]
+        for route in self._unindexed:
+            if best is not None and route.order > best.order:
+                break
+            if route.template.match(message):
+                return route
+        return best
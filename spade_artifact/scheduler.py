@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Rate limiting and prioritization of the publications of an artifact.
+
+Once an artifact has a rate limit (see ``Artifact.set_rate_limit``), published
+payloads are queued in a lane per priority and a worker task publishes them,
+taking a token of a token bucket for every pubsub item. Higher priority lanes
+are always served first, so alarms are not delayed by bulk telemetry.
+"""
+
+import asyncio
+import time
+from collections import Counter, deque
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from loguru import logger
+
+
+class Priority(Enum):
+    """Priority of a publication, from the most to the least urgent"""
+
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
+
+
+class TokenBucket(object):
+    """
+    A token bucket refilled with ``rate`` tokens per second, up to ``burst`` tokens.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be a positive number")
+        if burst is not None and burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._clock = clock
+        self._tokens = self.burst
+        self._last = clock()
+
+    def delay(self) -> float:
+        """
+        Returns:
+            float: the seconds until a token is available (0 if there is one now)
+        """
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def consume(self, tokens: float = 1):
+        """
+        Takes tokens from the bucket, even if there are not enough.
+
+        Args:
+            tokens (float): the number of tokens to take (Default value = 1)
+        """
+        self._refill()
+        self._tokens -= tokens
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+
+class PublishScheduler(object):
+    """
+    Publishes queued payloads in priority order, at most at the rate of its bucket.
+
+    Payloads are kept in a bounded lane per priority. ``put`` only waits while the
+    lane of the payloads is full, and consecutive payloads of the same node are
+    packed into a single item of up to ``max_items`` payloads.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Optional[str], List[Any]], Awaitable[None]],
+        bucket: TokenBucket,
+        queue_size: int = 1000,
+        max_items: Optional[int] = None,
+    ):
+        if queue_size < 1:
+            raise ValueError("queue_size must be a positive integer")
+        self.bucket = bucket
+        self.queue_size = queue_size
+        self.max_items = max_items
+        self.metrics = None
+        self.stats = Counter()
+        self._send = send
+        self._lanes: Dict[Priority, deque] = {
+            priority: deque() for priority in Priority
+        }
+        self._depth = Counter()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._worker: Optional[asyncio.Task] = None
+
+    async def put(
+        self,
+        name: Optional[str],
+        payloads: List[Any],
+        priority: Union[Priority, str] = Priority.NORMAL,
+    ):
+        """
+        Queues payloads to be published, waiting while their lane is full.
+
+        Args:
+            name (str or None): the property of the payloads, or None for the artifact's node
+            payloads (list): the payloads, published in a single item if possible
+            priority (Priority or str): the lane of the payloads (Default value = normal)
+        """
+        priority = Priority(priority)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._work())
+        while self._depth[priority] >= self.queue_size:
+            self.stats["blocked"] += 1
+            self._space.clear()
+            await self._space.wait()
+        self._lanes[priority].append((name, payloads))
+        self._update_depth(priority, len(payloads))
+        self._idle.clear()
+        self._ready.set()
+
+    def depth(self) -> Dict[str, int]:
+        """
+        Returns:
+            dict: the number of queued payloads of every priority
+        """
+        return {priority.value: self._depth[priority] for priority in Priority}
+
+    async def join(self):
+        """Waits until every queued payload has been published."""
+        await self._idle.wait()
+
+    def close(self) -> int:
+        """
+        Stops the worker, discarding the queued payloads.
+
+        Returns:
+            int: the number of discarded payloads
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        discarded = sum(self._depth.values())
+        for priority, lane in self._lanes.items():
+            lane.clear()
+            self._update_depth(priority, -self._depth[priority])
+        self._idle.set()
+        self._space.set()
+        return discarded
+
+    def _next_lane(self) -> Optional[Priority]:
+        for priority, lane in self._lanes.items():
+            if lane:
+                return priority
+        return None
+
+    def _take(self, priority: Priority) -> Tuple[Optional[str], List[Any]]:
+        lane = self._lanes[priority]
+        name, payloads = lane.popleft()
+        payloads = list(payloads)
+        while (
+            self.max_items is not None
+            and lane
+            and lane[0][0] == name
+            and len(payloads) + len(lane[0][1]) <= self.max_items
+        ):
+            payloads.extend(lane.popleft()[1])
+        self._update_depth(priority, -len(payloads))
+        self._space.set()
+        return name, payloads
+
+    def _update_depth(self, priority: Priority, delta: int):
+        self._depth[priority] += delta
+        if self.metrics is not None:
+            self.metrics.publish_queue(priority.value).set(self._depth[priority])
+
+    async def _work(self):
+        while True:
+            priority = self._next_lane()
+            if priority is None:
+                self._idle.set()
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            delay = self.bucket.delay()
+            if delay > 0:
+                self.stats["throttled"] += 1
+                await asyncio.sleep(delay)
+                continue
+            name, payloads = self._take(priority)
+            self.bucket.consume()
+            try:
+                await self._send(name, payloads)
+                self.stats["published"] += len(payloads)
+            except Exception:
+                self.stats["failed"] += len(payloads)
+                logger.exception(f"Error publishing {len(payloads)} queued payloads")
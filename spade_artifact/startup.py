@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Bulk startup of artifacts."""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Sequence
+
+from loguru import logger
+
+from .artifact import Artifact
+from .nodes import is_node_known, remember_nodes
+
+
+async def start_all(
+    artifacts: Sequence[Artifact],
+    max_parallel: int = 10,
+    auto_register: bool = True,
+    discover: bool = True,
+) -> dict:
+    """
+    Starts many artifacts concurrently.
+    Artifacts are started in phases: first all of them connect, then the existing
+    nodes are discovered with a single disco#items query per pubsub service, then
+    the nodes that do not exist yet are created and finally the artifacts are set up
+    and run. At most ``max_parallel`` artifacts are in the same phase at once.
+    Artifacts that fail in a phase are reported and skip the next phases. The ones that
+    fail after connecting are disconnected and stopped.
+
+    Args:
+        artifacts (list of Artifact): the artifacts to start
+        max_parallel (int): maximum number of artifacts starting concurrently
+        auto_register (bool): register the artifacts in the server (Default value = True)
+        discover (bool): query the existing nodes before creating them (Default value = True)
+
+    Returns:
+        dict: the number of artifacts ``started``, the artifacts that ``failed`` (JID and error),
+        the number of nodes whose creation was skipped (``nodes_skipped``) and the seconds
+        spent in every phase (``times``: connect, discover, node, setup and total)
+    """
+    if max_parallel < 1:
+        raise ValueError("max_parallel must be a positive integer")
+    semaphore = asyncio.Semaphore(max_parallel)
+    failed: Dict[str, str] = {}
+    times: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    async def run_phase(
+        phase: str,
+        pending: List[Artifact],
+        step: Callable[[Artifact], Awaitable],
+        abort: bool = True,
+    ) -> List[Artifact]:
+        async def run(artifact: Artifact):
+            async with semaphore:
+                try:
+                    await step(artifact)
+                except Exception as e:
+                    logger.error(f"Artifact {artifact.jid} failed to {phase}: {e}")
+                    failed[str(artifact.jid)] = repr(e)
+                    if abort:
+                        await _abort(artifact)
+
+        phase_start = time.perf_counter()
+        await asyncio.gather(*[run(artifact) for artifact in pending])
+        times[phase] = time.perf_counter() - phase_start
+        return [artifact for artifact in pending if str(artifact.jid) not in failed]
+
+    pending = await run_phase(
+        "connect",
+        list(artifacts),
+        lambda a: a._startup_connect(auto_register),
+        abort=False,
+    )
+
+    phase_start = time.perf_counter()
+    if discover:
+        await _discover_nodes(pending)
+    times["discover"] = time.perf_counter() - phase_start
+
+    nodes_skipped = sum(
+        is_node_known(artifact.pubsub_server, str(artifact.jid.bare))
+        for artifact in pending
+    )
+    pending = await run_phase("node", pending, lambda a: a._startup_node())
+    pending = await run_phase("setup", pending, lambda a: a._startup_run())
+    times["total"] = time.perf_counter() - start
+
+    logger.info(
+        f"Started {len(pending)} artifacts in {times['total']:.2f}s ({len(failed)} failed)"
+    )
+    return {
+        "started": len(pending),
+        "failed": failed,
+        "nodes_skipped": nodes_skipped,
+        "times": times,
+    }
+
+
+async def _abort(artifact: Artifact):
+    try:
+        await artifact._abort_startup()
+    except Exception as e:
+        logger.warning(f"Could not stop artifact {artifact.jid}: {e}")
+
+
+async def _discover_nodes(artifacts: List[Artifact]):
+    by_server: Dict[str, Artifact] = {}
+    for artifact in artifacts:
+        by_server.setdefault(str(artifact.pubsub_server), artifact)
+    for server, artifact in by_server.items():
+        try:
+            nodes = await artifact.pubsub.get_nodes(server)
+        except Exception as e:
+            logger.warning(f"Could not discover the nodes of {server}: {e}")
+            continue
+        remember_nodes(server, [node["node"] for node in nodes])
@@ -1,6 +1,9 @@
 import pytest
 from slixmpp.jid import JID
 
+from spade_artifact import loopback
+from spade_artifact.nodes import forget_nodes
+
 from .factories import MockedConnectedArtifactAgentFactory
 
 
@@ -14,3 +17,15 @@ async def agent():
     agent = MockedConnectedArtifactAgentFactory()
     await agent.start()
     yield agent
+
+
+@pytest.fixture(autouse=True)
+def forget_known_nodes():
+    yield
+    forget_nodes()
+
+
+@pytest.fixture(autouse=True)
+def reset_loopback():
+    yield
+    loopback.reset()
@@ -32,6 +32,11 @@ class MockedConnectedArtifact(Artifact):
 
         self.pubsub = Mock()
         self.pubsub.create = AsyncMock()
+        self.pubsub.publish = AsyncMock()
+        self.pubsub.pubsub.publish = AsyncMock()
+        self.pubsub.subscribe = AsyncMock()
+        self.pubsub.unsubscribe = AsyncMock()
+        self.pubsub.get_nodes = AsyncMock(return_value=[])
 
     def mock_presence(self):
         show = self.show if self.show is not None else PresenceShow.NONE
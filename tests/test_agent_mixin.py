@@ -1,12 +1,14 @@
+import asyncio
 import collections
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 from xml.etree.ElementTree import Element
 
 from slixmpp.stanza.message import Message as SlixmppMessage
 
 from spade.behaviour import OneShotBehaviour
 from spade_artifact.agent import ArtifactComponent
-from .factories import MockedConnectedArtifactAgentFactory
+from spade_artifact.payload import build_payload, compress_payload, pack_batch, unpack
+from .factories import MockedConnectedArtifactAgentFactory, MockedConnectedArtifactFactory
 
 
 def test_pubsub_server_not_set():
@@ -38,7 +40,7 @@ async def test_focus(agent):
     await agent.stop()
     agent.pubsub.subscribe.assert_called_with(agent.pubsub_server, "artifact@server")
 
-    assert agent.artifacts.focus_callbacks["artifact@server"] == callback
+    assert agent.artifacts.focus_callbacks["artifact@server"] == [callback]
 
 
 async def test_ignore(agent):
@@ -85,3 +87,214 @@ async def test_set_on_item_published(agent):
 
     callback.assert_called_with("artifact@server", "payload")
     await agent.stop()
+
+
+async def test_on_item_published_unpacks_batch(agent):
+    callback = Mock()
+    agent.artifacts.focus_callbacks["artifact@server"] = [callback]
+
+    msg = SlixmppMessage()
+    msg['pubsub_event']['items']['node'] = "artifact@server"
+    msg['pubsub_event']['items']['item']['publisher'] = "artifact@server"
+    msg['pubsub_event']['items']['item']['payload'] = pack_batch(["1", "2", "3"])
+
+    agent.artifacts.on_item_published(msg)
+
+    assert [c.args for c in callback.call_args_list] == [
+        ("artifact@server", "1"),
+        ("artifact@server", "2"),
+        ("artifact@server", "3"),
+    ]
+    await agent.stop()
+
+
+async def test_on_item_published_decompresses(agent):
+    callback = Mock()
+    agent.artifacts.focus_callbacks["artifact@server"] = [callback]
+    payload = compress_payload(build_payload("payload " * 100), "zlib")
+
+    msg = SlixmppMessage()
+    msg['pubsub_event']['items']['node'] = "artifact@server"
+    msg['pubsub_event']['items']['item']['publisher'] = "artifact@server"
+    msg['pubsub_event']['items']['item']['payload'] = payload
+
+    agent.artifacts.on_item_published(msg)
+
+    callback.assert_called_once_with("artifact@server", "payload " * 100)
+    await agent.stop()
+
+
+async def test_focus_rebuilds_delta_states(agent):
+    publisher = MockedConnectedArtifactFactory(jid="artifact@server")
+    publisher.loop = asyncio.get_event_loop()
+    await publisher.start()
+    publisher.set_delta(snapshot_every=10, key=lambda row: row["id"])
+
+    states = [
+        {"id": 1, "temp": 20, "hum": 50},
+        {"id": 2, "temp": 18},
+        {"id": 1, "temp": 21, "hum": 50},
+        {"id": 1, "temp": 21, "hum": 50},
+        {"id": 1, "temp": 21},
+    ]
+    for state in states:
+        await publisher.publish(state)
+
+    published = [c.args[3] for c in publisher.pubsub.pubsub.publish.await_args_list]
+    assert len(published) == 4
+    assert unpack(published[2]) == [
+        {"key": 1, "seq": 1, "set": {"temp": 21}, "unset": []}
+    ]
+
+    callback = Mock()
+    agent.artifacts.focus_callbacks["artifact@server"] = [callback]
+    for payload in published:
+        msg = SlixmppMessage()
+        msg['pubsub_event']['items']['node'] = "artifact@server"
+        msg['pubsub_event']['items']['item']['publisher'] = "artifact@server"
+        msg['pubsub_event']['items']['item']['payload'] = payload
+        agent.artifacts.on_item_published(msg)
+
+    assert [c.args[1] for c in callback.call_args_list] == [
+        states[0],
+        states[1],
+        states[2],
+        states[4],
+    ]
+    await agent.stop()
+
+
+async def test_focus_properties(agent):
+    callback = Mock()
+    await agent.artifacts.focus("artifact@server", callback, properties=["temperature"])
+
+    agent.pubsub.subscribe.assert_awaited_once_with(
+        agent.pubsub_server, "artifact@server/properties/temperature"
+    )
+
+    publisher = MockedConnectedArtifactFactory(jid="artifact@server")
+    publisher.loop = asyncio.get_event_loop()
+    await publisher.start()
+    publisher.set_property_nodes()
+    await publisher.publish_property("temperature", 21.5)
+    await publisher.publish_property("humidity", 40)
+
+    for c in publisher.pubsub.pubsub.publish.await_args_list:
+        msg = SlixmppMessage()
+        msg['pubsub_event']['items']['node'] = c.args[1]
+        msg['pubsub_event']['items']['item']['publisher'] = "artifact@server"
+        msg['pubsub_event']['items']['item']['payload'] = c.args[3]
+        agent.artifacts.on_item_published(msg)
+
+    callback.assert_called_once_with("artifact@server", {"temperature": 21.5})
+
+    await agent.artifacts.ignore("artifact@server")
+    agent.pubsub.unsubscribe.assert_awaited_once_with(
+        agent.pubsub_server, "artifact@server/properties/temperature"
+    )
+    assert agent.artifacts.focus_callbacks == {}
+    await agent.stop()
+
+
+async def test_queued_dispatch_of_focus_callbacks(agent):
+    release = asyncio.Event()
+    received = []
+
+    async def slow(jid, payload):
+        await release.wait()
+        received.append(payload)
+
+    fast = Mock()
+    agent.artifacts.set_dispatch(queue_size=10)
+    agent.artifacts.focus_callbacks["slow@server"] = [slow]
+    agent.artifacts.focus_callbacks["fast@server"] = [fast]
+
+    for node in ["slow@server", "fast@server"]:
+        msg = SlixmppMessage()
+        msg['pubsub_event']['items']['node'] = node
+        msg['pubsub_event']['items']['item']['publisher'] = node
+        msg['pubsub_event']['items']['item']['payload'] = build_payload("payload")
+        agent.artifacts.on_item_published(msg)
+
+    fast.assert_not_called()
+    await asyncio.sleep(0.01)
+    fast.assert_called_once_with("fast@server", "payload")
+    assert received == []
+
+    release.set()
+    await agent.artifacts._dispatcher.join()
+    assert received == ["payload"]
+    await agent.artifacts.ignore("slow@server")
+    await agent.artifacts.ignore("fast@server")
+    await agent.stop()
+
+
+async def test_coroutine_property_callback(agent):
+    received = []
+
+    async def callback(jid, value):
+        received.append(value)
+
+    await agent.artifacts.focus("artifact@server", callback, properties=["temperature"])
+    msg = SlixmppMessage()
+    node = "artifact@server/properties/temperature"
+    msg['pubsub_event']['items']['node'] = node
+    msg['pubsub_event']['items']['item']['publisher'] = "artifact@server"
+    msg['pubsub_event']['items']['item']['payload'] = build_payload("20")
+    agent.artifacts.on_item_published(msg)
+    await agent.artifacts._dispatcher.join()
+
+    assert received == [{"temperature": "20"}]
+    await agent.artifacts.ignore("artifact@server")
+    await agent.stop()
+
+
+async def test_several_callbacks_share_a_subscription(agent):
+    first = Mock()
+    second = Mock()
+    await agent.artifacts.focus("artifact@server", first)
+    await agent.artifacts.focus("artifact@server", second)
+    agent.pubsub.subscribe.assert_awaited_once_with(agent.pubsub_server, "artifact@server")
+
+    msg = SlixmppMessage()
+    msg['pubsub_event']['items']['node'] = "artifact@server"
+    msg['pubsub_event']['items']['item']['publisher'] = "artifact@server"
+    msg['pubsub_event']['items']['item']['payload'] = pack_batch(["1", "2"])
+    with patch("spade_artifact.agent.unpack", wraps=unpack) as unpack_spy:
+        agent.artifacts.on_item_published(msg)
+
+    unpack_spy.assert_called_once()
+    assert [c.args for c in first.call_args_list] == [
+        ("artifact@server", "1"),
+        ("artifact@server", "2"),
+    ]
+    assert second.call_args_list == first.call_args_list
+
+    await agent.artifacts.ignore("artifact@server", first)
+    agent.pubsub.unsubscribe.assert_not_awaited()
+    assert agent.artifacts.focus_callbacks["artifact@server"] == [second]
+
+    await agent.artifacts.ignore("artifact@server", second)
+    agent.pubsub.unsubscribe.assert_awaited_once_with(
+        agent.pubsub_server, "artifact@server"
+    )
+    assert agent.artifacts.focus_callbacks == {}
+    await agent.stop()
+
+
+async def test_ignore_one_property_callback(agent):
+    first = Mock()
+    second = Mock()
+    await agent.artifacts.focus("artifact@server", first, properties=["temperature"])
+    await agent.artifacts.focus("artifact@server", second, properties=["temperature"])
+    await agent.artifacts.ignore("artifact@server", first)
+
+    agent.pubsub.unsubscribe.assert_not_awaited()
+    assert agent.artifacts.focused_properties == {"artifact@server": {"temperature"}}
+
+    await agent.artifacts.ignore("artifact@server", second)
+    agent.pubsub.unsubscribe.assert_awaited_once_with(
+        agent.pubsub_server, "artifact@server/properties/temperature"
+    )
+    assert agent.artifacts.focused_properties == {}
+    await agent.stop()
@@ -2,11 +2,20 @@
 # -*- coding: utf-8 -*-
 
 """Tests for `spade_artifact` package."""
+
 import asyncio
-from unittest.mock import Mock, AsyncMock, MagicMock
+from unittest.mock import Mock, AsyncMock, MagicMock, call, patch
 
+import pytest
+from loguru import logger
 from spade.message import Message
-from slixmpp import Message as SlixmppMessage
+from slixmpp import Iq, Message as SlixmppMessage
+from slixmpp.exceptions import IqTimeout
+
+from spade_artifact import MailboxPolicy
+from spade_artifact.message import LazyMessage
+from spade_artifact.codecs import get_codec
+from spade_artifact.payload import pack_batch, pack_item, unpack
 
 from .factories import MockedConnectedArtifactFactory, MockedConnectedArtifact
 
@@ -131,3 +140,675 @@ async def test_mailbox_size():
     assert artifact.msg == Message()
 
     assert artifact.mailbox_size() == 0
+
+
+async def test_publish_many_packs_payloads():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+
+    await artifact.publish_many(["1", "2", "3", "4", "5"], max_items=2)
+
+    assert artifact.pubsub.pubsub.publish.await_count == 3
+    payloads = [
+        unpack(c.args[3]) for c in artifact.pubsub.pubsub.publish.await_args_list
+    ]
+    assert payloads == [["1", "2"], ["3", "4"], ["5"]]
+
+
+async def test_auto_batching_flushes_on_max_items():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    artifact.set_batching(max_items=3, window=10)
+
+    for i in range(3):
+        await artifact.publish(str(i))
+
+    artifact.pubsub.pubsub.publish.assert_awaited_once()
+    assert unpack(artifact.pubsub.pubsub.publish.await_args.args[3]) == ["0", "1", "2"]
+
+
+async def test_auto_batching_flushes_on_window():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    artifact.set_batching(max_items=100, window=0.01)
+
+    await artifact.publish("a")
+    await artifact.publish("b")
+    artifact.pubsub.pubsub.publish.assert_not_awaited()
+
+    await asyncio.sleep(0.05)
+
+    artifact.pubsub.pubsub.publish.assert_awaited_once()
+    assert unpack(artifact.pubsub.pubsub.publish.await_args.args[3]) == ["a", "b"]
+
+
+async def test_on_item_published_unpacks_batch():
+    artifact = MockedConnectedArtifactFactory()
+    callback = Mock()
+    artifact.subscriptions["other@server"] = [callback]
+
+    msg = SlixmppMessage()
+    msg["pubsub_event"]["items"]["node"] = "other@server"
+    msg["pubsub_event"]["items"]["item"]["publisher"] = "other@server"
+    msg["pubsub_event"]["items"]["item"]["payload"] = pack_batch(["x", "y"])
+
+    artifact.on_item_published(msg)
+
+    assert callback.call_args_list == [
+        call("other@server", "x"),
+        call("other@server", "y"),
+    ]
+
+
+async def test_pipelined_publish_bounds_in_flight():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    acks = []
+
+    async def publish(*args, **kwargs):
+        ack = asyncio.get_running_loop().create_future()
+        acks.append(ack)
+        await ack
+
+    artifact.pubsub.pubsub.publish = publish
+    artifact.set_pipelining(max_in_flight=2)
+
+    await artifact.publish("1")
+    await artifact.publish("2")
+    assert artifact.publications_in_flight() == 2
+
+    blocked = asyncio.ensure_future(artifact.publish("3"))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    acks[0].set_result(None)
+    await asyncio.wait_for(blocked, timeout=1)
+    assert artifact.publications_in_flight() == 2
+
+    for ack in acks[1:]:
+        ack.set_result(None)
+    await artifact.drain()
+    assert artifact.publications_in_flight() == 0
+    artifact.pubsub.publish.assert_not_awaited()
+
+
+async def test_pipelined_publish_reports_errors():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    error = RuntimeError("rejected")
+    artifact.pubsub.pubsub.publish = AsyncMock(side_effect=error)
+    on_error = Mock()
+    artifact.set_pipelining(max_in_flight=4, on_error=on_error)
+
+    await artifact.publish("1")
+    await artifact.drain()
+
+    on_error.assert_called_once_with(["1"], error)
+
+
+async def test_join_timeout():
+    class A(MockedConnectedArtifact):
+        async def run(self):
+            await asyncio.sleep(10)
+
+    artifact = A(jid="fakejid", password="fakesecret")
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+
+    with pytest.raises(TimeoutError):
+        await artifact.join(timeout=0.01)
+
+    artifact.kill()
+    await artifact.join(timeout=1)
+    assert not artifact.is_alive()
+
+
+async def test_join_wakes_up_on_kill():
+    class A(MockedConnectedArtifact):
+        async def run(self):
+            await asyncio.sleep(0.05)
+            self.kill()
+
+    artifact = A(jid="fakejid", password="fakesecret")
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+
+    assert artifact.is_alive()
+    await artifact.join(timeout=1)
+    assert not artifact.is_alive()
+
+
+async def test_join_from_another_thread():
+    class A(MockedConnectedArtifact):
+        async def run(self):
+            await asyncio.sleep(0.05)
+            self.kill()
+
+    artifact = A(jid="fakejid", password="fakesecret")
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+
+    await asyncio.get_running_loop().run_in_executor(None, artifact.join, 1)
+    assert not artifact.is_alive()
+
+
+def _message(body, stream=None):
+    msg = SlixmppMessage(stream=stream)
+    msg["from"] = "sender@server"
+    msg["to"] = "fake@jid"
+    msg["body"] = body
+    return msg
+
+
+async def test_mailbox_drop_oldest():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.set_mailbox(2, "drop-oldest")
+
+    for body in ("1", "2", "3"):
+        artifact._message_received(_message(body))
+
+    assert artifact.mailbox_size() == 2
+    assert (await artifact.receive()).body == "2"
+    assert (await artifact.receive()).body == "3"
+    assert artifact.mailbox_stats()["dropped_oldest"] == 1
+
+
+async def test_mailbox_drop_newest():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.set_mailbox(2, MailboxPolicy.DROP_NEWEST)
+
+    for body in ("1", "2", "3"):
+        artifact._message_received(_message(body))
+
+    assert artifact.mailbox_size() == 2
+    assert (await artifact.receive()).body == "1"
+    assert (await artifact.receive()).body == "2"
+    assert artifact.mailbox_stats()["dropped_newest"] == 1
+
+
+async def test_mailbox_reject_bounces():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.set_mailbox(1, MailboxPolicy.REJECT)
+    stream = Mock()
+
+    artifact._message_received(_message("1", stream))
+    artifact._message_received(_message("2", stream))
+
+    assert artifact.mailbox_size() == 1
+    assert artifact.mailbox_stats() == {
+        "size": 1,
+        "capacity": 1,
+        "dropped_oldest": 0,
+        "dropped_newest": 0,
+        "rejected": 1,
+    }
+    bounce = stream.send.call_args.args[0]
+    assert bounce["type"] == "error"
+    assert bounce["to"] == "sender@server"
+    assert bounce["error"]["condition"] == "resource-constraint"
+
+
+async def test_mailbox_reject_does_not_bounce_errors():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.set_mailbox(1, MailboxPolicy.REJECT)
+    stream = Mock()
+    error = _message("2", stream)
+    error["type"] = "error"
+
+    artifact._message_received(_message("1", stream))
+    artifact._message_received(error)
+
+    stream.send.assert_not_called()
+    assert artifact.mailbox_size() == 1
+    assert artifact.mailbox_stats()["rejected"] == 1
+
+
+def test_mailbox_invalid_capacity():
+    artifact = MockedConnectedArtifactFactory()
+    with pytest.raises(ValueError):
+        artifact.set_mailbox(0)
+
+
+async def test_message_is_converted_when_received():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.set_mailbox(1, MailboxPolicy.DROP_OLDEST)
+
+    logger.disable("spade_artifact")
+    try:
+        with patch(
+            "spade_artifact.message.Message.from_node", wraps=Message.from_node
+        ) as from_node:
+            artifact._message_received(_message("1"))
+            artifact._message_received(_message("2"))
+            from_node.assert_not_called()
+
+            msg = await artifact.receive()
+            from_node.assert_called_once()
+    finally:
+        logger.enable("spade_artifact")
+
+    assert isinstance(msg, Message)
+    assert msg.body == "2"
+
+
+async def test_queue_holds_spade_messages():
+    artifact = MockedConnectedArtifactFactory()
+    artifact._message_received(_message("1"))
+    artifact._message_received(_message("2"))
+
+    first = artifact.queue.get_nowait()
+    second = await artifact.queue.get()
+
+    assert isinstance(first, Message) and first.body == "1"
+    assert isinstance(second, Message) and second.body == "2"
+
+
+def test_lazy_message_fields():
+    lazy = LazyMessage(_message("hello"))
+    assert lazy.body == "hello"
+    assert str(lazy.sender) == "sender@server"
+    assert lazy.message is lazy.message
+
+
+async def test_publish_with_codec():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    artifact.set_codec("json")
+
+    await artifact.publish({"temperature": 21.5})
+    await artifact.publish_many([{"a": 1}, {"a": 2}])
+
+    artifact.pubsub.publish.assert_not_awaited()
+    single, batch = [c.args[3] for c in artifact.pubsub.pubsub.publish.await_args_list]
+    assert single.get("codec") == "json"
+    assert unpack(single) == [{"temperature": 21.5}]
+    assert unpack(batch) == [{"a": 1}, {"a": 2}]
+
+
+async def test_on_item_published_decodes_codec():
+    artifact = MockedConnectedArtifactFactory()
+    callback = Mock()
+    artifact.subscriptions["other@server"] = [callback]
+
+    msg = SlixmppMessage()
+    msg["pubsub_event"]["items"]["node"] = "other@server"
+    msg["pubsub_event"]["items"]["item"]["publisher"] = "other@server"
+    msg["pubsub_event"]["items"]["item"]["payload"] = pack_item(
+        {"a": [1, 2]}, get_codec("json")
+    )
+
+    artifact.on_item_published(msg)
+
+    callback.assert_called_once_with("other@server", {"a": [1, 2]})
+
+
+async def test_publish_compresses_large_items():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    artifact.set_compression(threshold=100)
+
+    await artifact.publish("small")
+    await artifact.publish("large " * 100)
+
+    small, large = [c.args[3] for c in artifact.pubsub.pubsub.publish.await_args_list]
+    assert small.get("compression") is None
+    assert large.get("compression") == "zlib"
+    assert unpack(small) == ["small"]
+    assert unpack(large) == ["large " * 100]
+
+    stats = artifact.compression_stats()
+    assert stats["items"] == 1
+    assert stats["compressed"] == 1
+    assert stats["size_in"] == 600
+    assert stats["ratio"] < 0.5
+
+
+async def test_publish_does_not_compress_unencoded_objects():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    artifact.set_compression(threshold=1)
+
+    await artifact.publish(42)
+
+    element = artifact.pubsub.pubsub.publish.await_args.args[3]
+    assert element.get("compression") is None
+    assert artifact.compression_stats()["items"] == 0
+
+
+def test_set_compression_unknown_algorithm():
+    artifact = MockedConnectedArtifactFactory()
+    with pytest.raises(ValueError):
+        artifact.set_compression(100, "unknown")
+
+
+async def test_observable_properties_publish_once_per_tick():
+    class A(MockedConnectedArtifact):
+        async def setup(self):
+            self.define_observable("temperature", 20)
+            self.define_observable("humidity", 50)
+
+        async def run(self):
+            await asyncio.sleep(0)
+            for i in range(100):
+                self.set("temperature", i)
+            self.set("humidity", 60)
+            self.set("internal", "not observable")
+            await asyncio.sleep(0.01)
+            self.kill()
+
+    artifact = A(jid="fake@jid", password="fake_password")
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    await artifact.join()
+
+    published = [
+        unpack(c.args[3]) for c in artifact.pubsub.pubsub.publish.await_args_list
+    ]
+    assert published == [
+        [{"temperature": 20, "humidity": 50}],
+        [{"temperature": 99, "humidity": 60}],
+    ]
+    assert artifact.version("temperature") == 101
+    assert artifact.version("humidity") == 2
+    assert artifact.version("unknown") == 0
+
+
+async def test_observable_properties_are_not_published_before_start():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.loop = asyncio.get_event_loop()
+    artifact.define_observable("value", 1)
+    artifact.set("value", 2)
+    await asyncio.sleep(0.01)
+
+    assert artifact.get("value") == 2
+    assert artifact.codec is not None
+
+
+def test_knowledge_base_limits_and_stats():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.define_observable("state", "idle")
+    artifact.set_knowledge_base(max_items=2)
+    for i in range(10):
+        artifact.set(f"entity-{i}", i)
+
+    assert artifact.get("entity-9") == 9
+    assert artifact.get("entity-0") is None
+    assert artifact.get("state") == "idle"
+    assert artifact.knowledge_stats() == {
+        "size": 3,
+        "hits": 2,
+        "misses": 1,
+        "evictions": 8,
+        "expirations": 0,
+    }
+
+
+def test_knowledge_item_ttl():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.set("short", 1, ttl=0)
+
+    assert artifact.get("short") is None
+    assert artifact.knowledge_stats()["expirations"] == 1
+
+
+async def test_observable_properties_in_property_nodes():
+    class A(MockedConnectedArtifact):
+        async def setup(self):
+            self.set_property_nodes()
+            self.define_observable("temperature", 20)
+            self.define_observable("humidity", 50)
+
+        async def run(self):
+            await asyncio.sleep(0)
+            self.set("temperature", 21)
+            await asyncio.sleep(0.01)
+            self.kill()
+
+    artifact = A(jid="fake@jid", password="fake_password")
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    await artifact.join()
+
+    created = [c.args[1] for c in artifact.pubsub.create.await_args_list]
+    assert created == [
+        "fake@jid",
+        "fake@jid/properties",
+        "fake@jid/properties/temperature",
+        "fake@jid/properties/humidity",
+    ]
+    collection_config = artifact.pubsub.create.await_args_list[1].args[2]
+    assert collection_config.get_values()["pubsub#node_type"] == "collection"
+    leaf_config = artifact.pubsub.create.await_args_list[2].args[2]
+    assert leaf_config.get_values()["pubsub#collection"] == "fake@jid/properties"
+
+    published = [
+        (c.args[1], unpack(c.args[3]))
+        for c in artifact.pubsub.pubsub.publish.await_args_list
+    ]
+    assert published == [
+        ("fake@jid/properties/temperature", [20]),
+        ("fake@jid/properties/humidity", [50]),
+        ("fake@jid/properties/temperature", [21]),
+    ]
+
+
+async def test_publish_property_requires_property_nodes():
+    artifact = MockedConnectedArtifactFactory()
+    with pytest.raises(RuntimeError):
+        await artifact.publish_property("temperature", 20)
+
+
+async def test_link_reference_counting():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    first = Mock()
+    second = Mock()
+    await artifact.link("other@server", first)
+    await artifact.link("other@server", second)
+    artifact.pubsub.subscribe.assert_awaited_once_with(
+        artifact.pubsub_server, "other@server"
+    )
+
+    msg = SlixmppMessage()
+    msg["pubsub_event"]["items"]["node"] = "other@server"
+    msg["pubsub_event"]["items"]["item"]["publisher"] = "other@server"
+    msg["pubsub_event"]["items"]["item"]["payload"] = pack_item("x")
+    artifact.on_item_published(msg)
+    first.assert_called_once_with("other@server", "x")
+    second.assert_called_once_with("other@server", "x")
+
+    await artifact.unlink("other@server", first)
+    artifact.pubsub.unsubscribe.assert_not_awaited()
+    await artifact.unlink("other@server")
+    artifact.pubsub.unsubscribe.assert_awaited_once_with(
+        artifact.pubsub_server, "other@server"
+    )
+    assert artifact.subscriptions == {}
+
+
+class IdleArtifact(MockedConnectedArtifact):
+    async def run(self):
+        await self.join()
+
+
+async def test_property_nodes_enabled_after_start():
+    artifact = IdleArtifact(jid="fake@jid", password="fake_password")
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+
+    artifact.set_property_nodes()
+    await artifact.publish_property("temperature", 20)
+    await artifact.publish_property("humidity", 50)
+
+    created = [c.args[1] for c in artifact.pubsub.create.await_args_list]
+    assert created == [
+        "fake@jid",
+        "fake@jid/properties",
+        "fake@jid/properties/temperature",
+        "fake@jid/properties/humidity",
+    ]
+    artifact.kill()
+
+
+async def test_publications_are_buffered_while_disconnected():
+    artifact = IdleArtifact(jid="fake@jid", password="fake_password")
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    artifact.set_codec("json")
+    artifact.set_reconnect(buffer_size=3, initial_delay=0.001, max_delay=0.004)
+    artifact.subscriptions["other@server"] = [Mock()]
+    artifact._connect_again = AsyncMock(side_effect=[False, False, True])
+
+    artifact._on_disconnected(None)
+    assert not artifact.connection_stats()["connected"]
+    for i in range(4):
+        await artifact.publish(i)
+    artifact.pubsub.pubsub.publish.assert_not_awaited()
+    assert artifact.connection_stats()["buffered"] == 3
+
+    await artifact._reconnect_task
+
+    published = [
+        unpack(c.args[3]) for c in artifact.pubsub.pubsub.publish.await_args_list
+    ]
+    assert published == [[1, 2, 3]]
+    artifact.pubsub.subscribe.assert_awaited_once_with(
+        artifact.pubsub_server, "other@server"
+    )
+    assert artifact.connection_stats() == {
+        "connected": True,
+        "reconnections": 1,
+        "attempts": 3,
+        "buffered": 0,
+        "dropped": 1,
+        "replayed": 3,
+    }
+    artifact.kill()
+
+
+async def test_timed_out_plain_publications_are_buffered():
+    artifact = IdleArtifact(jid="fake@jid", password="fake_password")
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    artifact.set_reconnect(buffer_size=3, initial_delay=60)
+
+    async def drop_connection(*args, **kwargs):
+        artifact._on_disconnected(None)
+        raise IqTimeout(Iq())
+
+    artifact.pubsub.pubsub.publish = AsyncMock(side_effect=drop_connection)
+
+    await artifact.publish("payload")
+
+    assert artifact.connection_stats()["buffered"] == 1
+    assert list(artifact._offline_buffer) == [(None, "payload")]
+    artifact._reconnect_task.cancel()
+    artifact.kill()
+
+
+async def test_disconnection_is_ignored_without_reconnect():
+    artifact = IdleArtifact(jid="fake@jid", password="fake_password")
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+
+    artifact._on_disconnected(None)
+
+    assert artifact.connection_stats()["connected"]
+    assert artifact._reconnect_task is None
+    artifact.kill()
+
+
+async def test_connect_again_waits_for_session():
+    artifact = MockedConnectedArtifactFactory()
+    handlers = {}
+    artifact.client = Mock()
+    artifact.client.add_event_handler = lambda event, handler: handlers.setdefault(
+        event, handler
+    )
+    artifact.client.connect = Mock(
+        side_effect=lambda **kwargs: asyncio.get_running_loop().call_soon(
+            handlers["session_start"], None
+        )
+    )
+
+    assert await artifact._connect_again()
+    artifact.client.cancel_connection_attempt.assert_not_called()
+
+    artifact._reconnect_timeout = 0.01
+    artifact.client.connect = Mock()
+    assert not await artifact._connect_again()
+    artifact.client.cancel_connection_attempt.assert_called_once()
+
+
+async def test_receive_many():
+    artifact = MockedConnectedArtifactFactory()
+    for body in ("1", "2", "3"):
+        artifact._message_received(_message(body))
+
+    assert [msg.body for msg in await artifact.receive_many(2)] == ["1", "2"]
+    assert [msg.body for msg in await artifact.receive_many(2, timeout=1)] == ["3"]
+    assert await artifact.receive_many() == []
+    assert await artifact.receive_many(timeout=0.01) == []
+    with pytest.raises(ValueError):
+        await artifact.receive_many(0)
+
+
+async def test_receive_many_waits_for_the_first_message():
+    artifact = MockedConnectedArtifactFactory()
+    loop = asyncio.get_running_loop()
+    loop.call_later(0.01, artifact._message_received, _message("1"))
+    loop.call_later(0.01, artifact._message_received, _message("2"))
+
+    messages = await artifact.receive_many(10, timeout=1)
+
+    assert [msg.body for msg in messages] == ["1", "2"]
+    assert artifact.mailbox_size() == 0
+
+
+async def test_iterate_messages():
+    class A(MockedConnectedArtifact):
+        async def run(self):
+            self.bodies = []
+            async for msg in self.messages():
+                self.bodies.append(msg.body)
+                if msg.body == "3":
+                    self.kill()
+
+    artifact = A(jid="fakejid", password="fakesecret")
+    artifact.loop = asyncio.get_event_loop()
+    artifact._message_received(_message("1"))
+    artifact._message_received(_message("2"))
+
+    await artifact.start()
+    await asyncio.sleep(0.01)
+    artifact._message_received(_message("3"))
+    artifact._message_received(_message("4"))
+    await artifact.join(1)
+    await asyncio.sleep(0.01)
+
+    assert artifact.bodies == ["1", "2", "3", "4"]
+
+
+async def test_iteration_ends_when_the_artifact_stops():
+    class A(MockedConnectedArtifact):
+        async def run(self):
+            self.bodies = [msg.body async for msg in self.messages()]
+
+    artifact = A(jid="fakejid", password="fakesecret")
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    await asyncio.sleep(0.01)
+
+    artifact.kill()
+    await asyncio.sleep(0.01)
+
+    assert artifact.bodies == []
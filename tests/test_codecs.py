@@ -0,0 +1,69 @@
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from spade_artifact.codecs import (
+    Codec,
+    JSONCodec,
+    get_codec,
+    register_codec,
+    resolve_codec,
+)
+
+
+def test_json_codec_roundtrip():
+    codec = get_codec("json")
+    obj = {"a": [1, 2.5, None], "b": "text"}
+    assert codec.decode(codec.encode(obj)) == obj
+
+
+def test_json_codec_is_compact():
+    assert get_codec("json").encode({"a": 1, "b": 2}) == '{"a":1,"b":2}'
+
+
+def test_json_codec_converts_numpy_and_timestamps():
+    codec = get_codec("json")
+    row = {"value": np.int64(3), "time": pd.Timestamp("2021-01-01 00:00:02")}
+    assert codec.decode(codec.encode(row)) == {
+        "value": 3,
+        "time": "2021-01-01T00:00:02",
+    }
+
+
+def test_msgpack_codec_roundtrip():
+    pytest.importorskip("msgpack")
+    codec = get_codec("msgpack")
+    obj = {"a": [1, 2.5, None], "b": "text"}
+    encoded = codec.encode(obj)
+    assert isinstance(encoded, str)
+    assert codec.decode(encoded) == obj
+
+
+def test_resolve_codec_falls_back_to_json():
+    class MissingCodec(JSONCodec):
+        name = "missing"
+
+        def __init__(self):
+            raise ImportError("No module named 'missing'")
+
+    with patch.dict("spade_artifact.codecs._codecs", {"missing": MissingCodec}):
+        assert isinstance(resolve_codec("missing"), JSONCodec)
+
+
+def test_register_custom_codec():
+    class UpperCodec(Codec):
+        name = "upper"
+
+        def encode(self, obj):
+            return str(obj).upper()
+
+        def decode(self, text):
+            return text.lower()
+
+    codec = UpperCodec()
+    register_codec(codec)
+    assert get_codec("upper") is codec
+    assert resolve_codec("upper") is codec
+    assert resolve_codec(None) is None
@@ -0,0 +1,55 @@
+import base64
+import zlib
+
+import pytest
+
+from spade_artifact.compression import (
+    MAX_DECOMPRESSED_SIZE,
+    compress,
+    decompress,
+    is_available,
+)
+
+
+def test_zlib_roundtrip():
+    text = "value," * 1000
+    compressed = compress(text, "zlib")
+    assert len(compressed) < len(text)
+    assert decompress(compressed, "zlib") == text
+
+
+def test_zstd_roundtrip():
+    pytest.importorskip("zstandard")
+    text = "value," * 1000
+    assert decompress(compress(text, "zstd"), "zstd") == text
+
+
+def test_is_available():
+    assert is_available("zlib")
+    assert not is_available("unknown")
+
+
+@pytest.mark.parametrize("algorithm", ["zlib", "zstd"])
+def test_decompression_is_capped(algorithm):
+    if algorithm == "zstd":
+        pytest.importorskip("zstandard")
+    compressed = compress("x" * 1001, algorithm)
+
+    assert decompress(compressed, algorithm, max_size=1001) == "x" * 1001
+    with pytest.raises(ValueError):
+        decompress(compressed, algorithm, max_size=1000)
+
+
+def test_decompression_bombs_are_refused():
+    bomb = compress("\0" * (MAX_DECOMPRESSED_SIZE + 1), "zlib")
+
+    assert len(bomb) < MAX_DECOMPRESSED_SIZE / 100
+    with pytest.raises(ValueError):
+        decompress(bomb, "zlib")
+
+
+def test_truncated_zlib_is_refused():
+    truncated = base64.b64encode(zlib.compress(b"value," * 1000)[:-10]).decode()
+
+    with pytest.raises(ValueError):
+        decompress(truncated, "zlib")
@@ -40,5 +40,25 @@ class TestCSVReaderArtifact(unittest.IsolatedAsyncioTestCase):
             actual_data = call_arg[0][0]
             self.assertEqual(eval(actual_data), expected)
 
+    async def test_csv_reading_with_codec(self):
+        artifact = CSVReaderArtifact(
+            "jid@test.com", "password", self.temp_csv.name,
+            columns=["Time", "Value"], time_column="Time"
+        )
+        artifact.set_codec("json")
+
+        artifact.publish = AsyncMock()
+        artifact.presence = MagicMock()
+
+        await artifact.run()
+
+        self.assertEqual(
+            [call_arg[0][0] for call_arg in artifact.publish.call_args_list],
+            [
+                {"Time": "2021-01-01 00:00:00", "Value": 100},
+                {"Time": "2021-01-01 00:00:02", "Value": 101}
+            ]
+        )
+
     async def asyncTearDown(self):
         os.unlink(self.temp_csv.name)
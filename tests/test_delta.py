@@ -0,0 +1,63 @@
+import pytest
+
+from spade_artifact.delta import DeltaDecoder, DeltaEncoder
+
+
+def test_first_publication_is_snapshot():
+    encoder = DeltaEncoder()
+    assert encoder.encode({"a": 1}) == {"key": None, "seq": 0, "snapshot": {"a": 1}}
+
+
+def test_delta_contains_changes_only():
+    encoder = DeltaEncoder()
+    encoder.encode({"a": 1, "b": 2, "c": 3})
+    delta = encoder.encode({"a": 1, "b": 5, "d": 4})
+    assert delta == {"key": None, "seq": 1, "set": {"b": 5, "d": 4}, "unset": ["c"]}
+
+
+def test_unchanged_state_is_not_published():
+    encoder = DeltaEncoder()
+    encoder.encode({"a": 1})
+    assert encoder.encode({"a": 1}) is None
+    assert encoder.stats["unchanged"] == 1
+
+
+def test_periodic_snapshot():
+    encoder = DeltaEncoder(snapshot_every=3)
+    kinds = ["snapshot" in encoder.encode({"a": i}) for i in range(7)]
+    assert kinds == [True, False, False, True, False, False, True]
+
+
+def test_states_are_kept_per_key():
+    encoder = DeltaEncoder()
+    assert "snapshot" in encoder.encode({"v": 1}, key="x")
+    assert "snapshot" in encoder.encode({"v": 1}, key="y")
+    assert encoder.encode({"v": 2}, key="x")["set"] == {"v": 2}
+
+
+def test_encoder_requires_dicts():
+    with pytest.raises(TypeError):
+        DeltaEncoder().encode("not a dict")
+
+
+def test_decoder_rebuilds_state():
+    encoder, decoder = DeltaEncoder(), DeltaDecoder()
+    states = [{"a": 1, "b": 2}, {"a": 1, "b": 3}, {"b": 3, "c": 4}]
+    for state in states:
+        assert decoder.apply("node", encoder.encode(state, key=[1, 2])) == state
+
+
+def test_decoder_waits_for_snapshot_after_a_gap():
+    encoder, decoder = DeltaEncoder(snapshot_every=3), DeltaDecoder()
+    deltas = [encoder.encode({"a": i}) for i in range(4)]
+
+    assert decoder.apply("node", deltas[0]) == {"a": 0}
+    assert decoder.apply("node", deltas[2]) is None
+    assert decoder.apply("node", deltas[3]) == {"a": 3}
+
+
+def test_decoder_forget():
+    encoder, decoder = DeltaEncoder(), DeltaDecoder()
+    decoder.apply("node", encoder.encode({"a": 1}))
+    decoder.forget("node")
+    assert decoder.apply("node", encoder.encode({"a": 2})) is None
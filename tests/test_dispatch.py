@@ -0,0 +1,116 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+
+from spade_artifact.dispatch import CallbackDispatcher
+
+
+async def test_inline_dispatch():
+    dispatcher = CallbackDispatcher()
+    callback = Mock()
+    dispatcher.dispatch("node", callback, "jid", "payload")
+
+    callback.assert_called_once_with("jid", "payload")
+    assert dispatcher.pending() == {}
+
+
+async def test_inline_errors_do_not_stop_other_callbacks():
+    dispatcher = CallbackDispatcher()
+    failing = Mock(side_effect=ValueError("boom"))
+    healthy = Mock()
+    for payload in (1, 2):
+        for callback in (failing, healthy):
+            dispatcher.dispatch("node", callback, "jid", payload)
+
+    assert failing.call_count == 2
+    assert healthy.call_args_list == [(("jid", 1),), (("jid", 2),)]
+
+
+async def test_inline_dispatch_of_coroutines():
+    dispatcher = CallbackDispatcher()
+    received = []
+
+    async def callback(jid, payload):
+        received.append(payload)
+
+    dispatcher.dispatch("node", callback, "jid", "payload")
+    await dispatcher.join()
+
+    assert received == ["payload"]
+
+
+async def test_slow_subscription_does_not_block_others():
+    dispatcher = CallbackDispatcher()
+    dispatcher.configure(queue_size=10, max_concurrency=None)
+    release = asyncio.Event()
+    fast = []
+
+    async def slow(jid, payload):
+        await release.wait()
+
+    dispatcher.dispatch("slow", slow, "jid", 1)
+    dispatcher.dispatch("slow", slow, "jid", 2)
+    for i in range(3):
+        dispatcher.dispatch("fast", lambda jid, payload: fast.append(payload), "jid", i)
+    await asyncio.sleep(0.01)
+
+    assert fast == [0, 1, 2]
+    assert dispatcher.pending() == {"slow": 1, "fast": 0}
+    release.set()
+    await dispatcher.join()
+    dispatcher.close_all()
+
+
+async def test_full_queue_drops_oldest():
+    dispatcher = CallbackDispatcher()
+    dispatcher.configure(queue_size=2, max_concurrency=None)
+    received = []
+    for i in range(4):
+        dispatcher.dispatch("node", lambda jid, payload: received.append(payload), "jid", i)
+    await dispatcher.join()
+
+    assert received == [2, 3]
+    assert dispatcher.stats["dropped"] == 2
+    dispatcher.close_all()
+
+
+async def test_max_concurrency():
+    dispatcher = CallbackDispatcher()
+    dispatcher.configure(queue_size=10, max_concurrency=2)
+    running = 0
+    peak = 0
+
+    async def callback(jid, payload):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    for node in range(5):
+        dispatcher.dispatch(node, callback, "jid", node)
+    await dispatcher.join()
+
+    assert peak == 2
+    dispatcher.close_all()
+
+
+async def test_errors_do_not_stop_the_worker():
+    dispatcher = CallbackDispatcher()
+    dispatcher.configure(queue_size=10, max_concurrency=None)
+    callback = Mock(side_effect=[ValueError("boom"), None])
+    dispatcher.dispatch("node", callback, "jid", 1)
+    dispatcher.dispatch("node", callback, "jid", 2)
+    await dispatcher.join()
+
+    assert callback.call_count == 2
+    dispatcher.close_all()
+
+
+def test_configure_validates_arguments():
+    dispatcher = CallbackDispatcher()
+    with pytest.raises(ValueError):
+        dispatcher.configure(queue_size=0, max_concurrency=None)
+    with pytest.raises(ValueError):
+        dispatcher.configure(queue_size=1, max_concurrency=0)
@@ -0,0 +1,144 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+from slixmpp.exceptions import IqError
+from spade.agent import Agent
+
+from spade_artifact import Artifact, ArtifactMixin
+from spade_artifact.fake_pubsub import FakePubSubServer
+from spade_artifact.nodes import node_config
+
+
+class PublisherArtifact(Artifact):
+    async def run(self):
+        await self.join()
+
+
+class FocusingAgent(ArtifactMixin, Agent):
+    pass
+
+
+async def _start(server, *entities):
+    for entity in entities:
+        server.attach(entity)
+        if isinstance(entity, Artifact):
+            entity.set_loop(asyncio.get_running_loop())
+        await entity.start(auto_register=False)
+
+
+async def _stop(*entities):
+    for entity in entities:
+        await entity.stop()
+
+
+async def test_artifact_publishes_to_focusing_agents():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    agents = [FocusingAgent(f"agent{i}@localhost", "secret") for i in range(2)]
+    await _start(server, artifact, *agents)
+    callbacks = [Mock(), Mock()]
+    for agent, callback in zip(agents, callbacks):
+        await agent.artifacts.focus("publisher@localhost", callback)
+
+    await artifact.publish("1")
+    await artifact.publish_many(["2", "3"])
+    await asyncio.sleep(0)
+
+    for callback in callbacks:
+        assert [c.args for c in callback.call_args_list] == [
+            ("publisher@localhost", "1"),
+            ("publisher@localhost", "2"),
+            ("publisher@localhost", "3"),
+        ]
+    assert server.stats["published"] == 2
+    assert server.stats["delivered"] == 4
+    await _stop(artifact, *agents)
+
+
+async def test_artifact_links_to_artifact():
+    server = FakePubSubServer()
+    publisher = PublisherArtifact("publisher@localhost", "secret")
+    subscriber = PublisherArtifact("subscriber@localhost", "secret")
+    await _start(server, publisher, subscriber)
+    callback = Mock()
+    await subscriber.link("publisher@localhost", callback)
+
+    await publisher.publish("hello")
+    await asyncio.sleep(0)
+
+    callback.assert_called_once_with("publisher@localhost", "hello")
+    await subscriber.unlink("publisher@localhost")
+    await publisher.publish("bye")
+    await asyncio.sleep(0)
+    callback.assert_called_once()
+    await _stop(publisher, subscriber)
+
+
+async def test_events_are_delivered_with_latency():
+    server = FakePubSubServer(latency=0.05)
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, agent)
+    callback = Mock()
+    await agent.artifacts.focus("publisher@localhost", callback)
+
+    publication = asyncio.ensure_future(artifact.publish("1"))
+    await asyncio.sleep(0.01)
+    callback.assert_not_called()
+    await publication
+    await asyncio.sleep(0.01)
+    callback.assert_called_once()
+    await _stop(artifact, agent)
+
+
+async def test_collection_subscribers_receive_leaf_items():
+    server = FakePubSubServer()
+    server.create(server.jid, "collection")
+    server.create(server.jid, "leaf", node_config(collection="collection"))
+    subscriber = Mock()
+    server.subscribe(server.jid, "collection", subscriber)
+
+    server.publish(server.jid, "leaf", None, None, "publisher@localhost")
+    await asyncio.sleep(0)
+
+    msg = subscriber._notify_published.call_args.args[0]
+    assert msg["pubsub_event"]["items"]["node"] == "leaf"
+    assert msg["pubsub_event"]["items"]["item"]["publisher"] == "publisher@localhost"
+
+
+async def test_errors():
+    server = FakePubSubServer(max_items=2)
+    server.create(server.jid, "node")
+
+    with pytest.raises(IqError) as e:
+        server.create(server.jid, "node")
+    assert e.value.condition == "conflict"
+    with pytest.raises(IqError) as e:
+        server.publish(server.jid, "missing", None, None, "publisher@localhost")
+    assert e.value.condition == "item-not-found"
+    with pytest.raises(IqError) as e:
+        server.create("pubsub.other", "node")
+    assert e.value.condition == "service-unavailable"
+    with pytest.raises(IqError) as e:
+        server.create(server.jid, "leaf", node_config(collection="missing"))
+    assert e.value.condition == "item-not-found"
+
+    for i in range(3):
+        server.publish(server.jid, "node", str(i), None, "publisher@localhost")
+    assert [item_id for item_id, _ in server.nodes["node"].items] == ["1", "2"]
+
+
+async def test_retract_notifies_subscribers():
+    server = FakePubSubServer()
+    server.create(server.jid, "node")
+    subscriber = Mock()
+    server.subscribe(server.jid, "node", subscriber)
+    item_id = server.publish(server.jid, "node", None, None, "publisher@localhost")
+
+    server.retract(server.jid, "node", item_id, notify=True)
+    await asyncio.sleep(0)
+
+    msg = subscriber._notify_retracted.call_args.args[0]
+    assert msg["pubsub_event"]["items"]["retract"]["id"] == item_id
+    assert not server.nodes["node"].items
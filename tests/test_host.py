@@ -0,0 +1,150 @@
+import asyncio
+from unittest.mock import Mock, patch
+
+import pytest
+from slixmpp.stanza.message import Message as SlixmppMessage
+
+from spade_artifact import Artifact, ArtifactHost
+from spade_artifact.agent import ArtifactComponent
+from spade_artifact.payload import unpack
+
+from .factories import MockedConnectedArtifact
+
+
+class MockedArtifactHost(ArtifactHost, MockedConnectedArtifact):
+    pass
+
+
+class Sensor(Artifact):
+    async def run(self):
+        await self.join()
+
+
+async def _start_host():
+    host = MockedArtifactHost(jid="host@server", password="fake_password")
+    host.loop = asyncio.get_event_loop()
+    await host.start()
+    return host
+
+
+def _event(node, payload, publisher):
+    msg = SlixmppMessage()
+    msg["pubsub_event"]["items"]["node"] = node
+    msg["pubsub_event"]["items"]["item"]["publisher"] = publisher
+    msg["pubsub_event"]["items"]["item"]["payload"] = payload
+    return msg
+
+
+async def test_hosted_artifacts_share_the_connection():
+    host = await _start_host()
+    sensors = [Sensor(f"sensor{i}@server", "unused") for i in range(3)]
+    with patch("spade_artifact.artifact.XMPPClient") as client_class:
+        for sensor in sensors:
+            sensor.loop = host.loop
+            host.add(sensor)
+            await sensor.start()
+
+    client_class.assert_not_called()
+    assert all(sensor.client is host.client for sensor in sensors)
+    assert [c.args[1] for c in host.pubsub.create.await_args_list] == [
+        "host@server",
+        "sensor0@server",
+        "sensor1@server",
+        "sensor2@server",
+    ]
+    await host.stop()
+
+
+async def test_hosted_artifacts_publish_with_their_identity():
+    host = await _start_host()
+    sensor = Sensor("sensor@server", "unused")
+    sensor.loop = host.loop
+    host.add(sensor)
+    await sensor.start()
+    await sensor.publish("21.5")
+
+    call = host.pubsub.pubsub.publish.await_args
+    assert call.args[1] == "sensor@server"
+    assert call.kwargs["ifrom"] == host.jid.bare
+    assert call.args[3].get("publisher") == "sensor@server"
+    assert unpack(call.args[3]) == ["21.5"]
+
+    agent = Mock()
+    component = ArtifactComponent(agent)
+    callback = Mock()
+    component.focus_callbacks["sensor@server"] = [callback]
+    component.on_item_published(_event("sensor@server", call.args[3], "host@server"))
+    callback.assert_called_once_with("sensor@server", "21.5")
+    await host.stop()
+
+
+async def test_host_routes_publications_to_hosted_artifacts():
+    host = await _start_host()
+    sensor = Sensor("sensor@server", "unused")
+    sensor.loop = host.loop
+    host.add(sensor)
+    await sensor.start()
+    callback = Mock()
+    await sensor.link("other@server", callback)
+
+    host.pubsub.publish.reset_mock()
+    await sensor.publish("x")
+    element = host.pubsub.pubsub.publish.await_args.args[3]
+    host.on_item_published(_event("other@server", element, "host@server"))
+    host.on_item_published(_event("unrelated@server", element, "host@server"))
+
+    callback.assert_called_once_with("sensor@server", "x")
+    await host.stop()
+
+
+async def test_hosted_artifacts_share_subscriptions():
+    host = await _start_host()
+    sensors = [Sensor(f"sensor{i}@server", "unused") for i in range(2)]
+    callbacks = [Mock(), Mock()]
+    for sensor, callback in zip(sensors, callbacks):
+        sensor.loop = host.loop
+        host.add(sensor)
+        await sensor.start()
+        await sensor.link("other@server", callback)
+    host.pubsub.subscribe.assert_awaited_once_with(host.pubsub_server, "other@server")
+
+    await sensors[0].publish("x")
+    element = host.pubsub.pubsub.publish.await_args.args[3]
+    await sensors[0].unlink("other@server")
+    host.pubsub.unsubscribe.assert_not_awaited()
+    host.on_item_published(_event("other@server", element, "host@server"))
+    callbacks[0].assert_not_called()
+    callbacks[1].assert_called_once_with("sensor0@server", "x")
+
+    await sensors[1].unlink("other@server")
+    host.pubsub.unsubscribe.assert_awaited_once_with(
+        host.pubsub_server, "other@server"
+    )
+    await host.stop()
+
+
+async def test_host_must_be_started_first():
+    host = MockedArtifactHost(jid="host@server", password="fake_password")
+    sensor = Sensor("sensor@server", "unused")
+    sensor.loop = asyncio.get_event_loop()
+    host.add(sensor)
+
+    with pytest.raises(RuntimeError):
+        await sensor.start()
+
+
+async def test_stopping_the_host_stops_hosted_artifacts():
+    host = MockedArtifactHost(jid="host@server", password="fake_password")
+    host.loop = asyncio.get_event_loop()
+    await host.start()
+    sensor = Sensor("sensor@server", "unused")
+    sensor.loop = host.loop
+    host.add(sensor)
+    await sensor.start()
+
+    await host.stop()
+
+    assert not sensor.is_alive()
+    assert not host.is_alive()
+    host.remove(sensor)
+    assert host.hosted == {}
@@ -0,0 +1,99 @@
+from spade_artifact.knowledge import KnowledgeBase
+
+import pytest
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_counts_hits_and_misses():
+    kb = KnowledgeBase()
+    kb.set("a", 1)
+
+    assert kb.get("a") == 1
+    assert kb.get("b") is None
+    assert kb.get("b", 2) == 2
+    assert kb.stats["hits"] == 1
+    assert kb.stats["misses"] == 2
+
+
+def test_least_recently_used_items_are_evicted():
+    kb = KnowledgeBase(max_items=2)
+    kb.set("a", 1)
+    kb.set("b", 2)
+    kb.get("a")
+    kb.set("c", 3)
+
+    assert "b" not in kb
+    assert kb.get("a") == 1
+    assert kb.get("c") == 3
+    assert kb.stats["evictions"] == 1
+
+
+def test_pinned_items_are_not_evicted():
+    kb = KnowledgeBase(max_items=1)
+    kb.pin("a")
+    kb.set("a", 1)
+    kb.set("b", 2)
+    kb.set("c", 3)
+
+    assert kb.get("a") == 1
+    assert kb.get("c") == 3
+    assert "b" not in kb
+
+
+def test_items_expire_lazily():
+    clock = FakeClock()
+    kb = KnowledgeBase(default_ttl=10, clock=clock)
+    kb.set("a", 1)
+    kb.set("b", 2, ttl=30)
+
+    clock.now = 10
+    assert kb.get("a") is None
+    assert kb.get("b") == 2
+    assert kb.stats["expirations"] == 1
+
+    clock.now = 30
+    assert len(kb) == 0
+    assert kb.stats["expirations"] == 2
+
+
+def test_setting_again_renews_the_ttl():
+    clock = FakeClock()
+    kb = KnowledgeBase(clock=clock)
+    kb.set("a", 1, ttl=10)
+    clock.now = 5
+    kb.set("a", 2, ttl=10)
+    clock.now = 12
+    assert kb.get("a") == 2
+
+    kb.set("a", 3)
+    clock.now = 100
+    assert kb.get("a") == 3
+    assert kb.stats["expirations"] == 0
+
+
+def test_stale_deadlines_are_compacted():
+    clock = FakeClock()
+    kb = KnowledgeBase(clock=clock)
+    for i in range(1000):
+        kb.set("a", i, ttl=10)
+
+    assert len(kb._deadlines) <= 2 * len(kb._expires) + 64
+
+
+def test_configure_evicts_items():
+    kb = KnowledgeBase()
+    for i in range(10):
+        kb.set(i, i)
+    kb.configure(max_items=3, default_ttl=None)
+
+    assert len(kb) == 3
+    assert kb.stats["evictions"] == 7
+    with pytest.raises(ValueError):
+        kb.configure(max_items=0, default_ttl=None)
@@ -0,0 +1,180 @@
+import asyncio
+from unittest.mock import Mock
+
+from slixmpp.plugins.xep_0060 import stanza
+from slixmpp.stanza import Iq
+from slixmpp.stanza.message import Message as SlixmppMessage
+from spade.agent import Agent
+
+from spade_artifact import Artifact, ArtifactMixin
+from spade_artifact.fake_pubsub import FakePubSubServer
+from spade_artifact.payload import pack_item
+
+from .factories import MockedConnectedArtifactAgentFactory
+
+
+class PublisherArtifact(Artifact):
+    async def run(self):
+        await self.join()
+
+
+class FocusingAgent(ArtifactMixin, Agent):
+    pass
+
+
+async def _start(server, *entities):
+    for entity in entities:
+        server.attach(entity)
+        if isinstance(entity, Artifact):
+            entity.set_loop(asyncio.get_running_loop())
+        await entity.start(auto_register=False)
+
+
+async def _stop(*entities):
+    for entity in entities:
+        await entity.stop()
+
+
+async def test_focus_fetches_last_items():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, agent)
+    for payload in ("1", "2", "3"):
+        await artifact.publish(payload)
+    callback = Mock()
+
+    await agent.artifacts.focus("publisher@localhost", callback, last=2)
+
+    assert [c.args for c in callback.call_args_list] == [
+        ("publisher@localhost", "2"),
+        ("publisher@localhost", "3"),
+    ]
+    assert agent.artifacts.snapshot("publisher@localhost") == "3"
+
+    await artifact.publish("4")
+    await asyncio.sleep(0)
+    assert agent.artifacts.snapshot("publisher@localhost") == "4"
+
+    await agent.artifacts.ignore("publisher@localhost")
+    assert agent.artifacts.snapshot("publisher@localhost") is None
+    await _stop(artifact, agent)
+
+
+async def test_focus_fetches_last_property_values():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_property_nodes()
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, agent)
+    await artifact.publish_property("temperature", 20)
+    await artifact.publish_property("temperature", 21)
+    callback = Mock()
+
+    await agent.artifacts.focus(
+        "publisher@localhost", callback, properties=["temperature"], last=1
+    )
+
+    callback.assert_called_once_with("publisher@localhost", {"temperature": 21})
+    assert agent.artifacts.snapshot("publisher@localhost", "temperature") == 21
+    assert agent.artifacts.snapshot("publisher@localhost") is None
+    await _stop(artifact, agent)
+
+
+async def test_refocusing_with_history_keeps_the_delta_state():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_delta()
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, agent)
+    await artifact.publish({"level": 1, "unit": "m"})
+    first, second = Mock(), Mock()
+    await agent.artifacts.focus("publisher@localhost", first, last=1)
+    for level in (2, 3):
+        await artifact.publish({"level": level, "unit": "m"})
+    await asyncio.sleep(0)
+
+    await agent.artifacts.focus("publisher@localhost", second, last=1)
+    await artifact.publish({"level": 4, "unit": "m"})
+    await asyncio.sleep(0)
+
+    assert [c.args[1]["level"] for c in first.call_args_list] == [1, 2, 3, 4]
+    assert [c.args[1]["level"] for c in second.call_args_list] == [4]
+    assert agent.artifacts.snapshot("publisher@localhost") == {"level": 4, "unit": "m"}
+    await _stop(artifact, agent)
+
+
+async def test_focus_fetches_the_last_values_of_every_property_at_once():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_property_nodes()
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, agent)
+    await artifact.publish_property("temperature", 20)
+    await artifact.publish_property("humidity", 50)
+    callback = Mock()
+
+    await agent.artifacts.focus(
+        "publisher@localhost", callback, properties=["temperature", "humidity"], last=1
+    )
+
+    assert sorted(c.args[1].popitem() for c in callback.call_args_list) == [
+        ("humidity", 50),
+        ("temperature", 20),
+    ]
+    await _stop(artifact, agent)
+
+
+async def _mocked_agent():
+    agent = MockedConnectedArtifactAgentFactory()
+    await agent.start()
+    return agent
+
+
+async def test_focus_without_history_does_not_fetch():
+    agent = await _mocked_agent()
+    await agent.artifacts.focus("artifact@server", Mock())
+
+    agent.pubsub.pubsub.get_items.assert_not_called()
+
+
+async def test_fetch_errors_are_logged():
+    server = FakePubSubServer()
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, agent)
+    callback = Mock()
+
+    await agent.artifacts.focus("missing@localhost", callback, last=1)
+
+    callback.assert_not_called()
+    assert agent.artifacts.snapshot("missing@localhost") is None
+    await _stop(agent)
+
+
+async def test_history_is_skipped_if_newer_items_arrive():
+    agent = await _mocked_agent()
+    callback = Mock()
+
+    async def get_items(server, node, max_items=None):
+        agent.artifacts.on_item_published(_event(node, "new"))
+        iq = Iq(stype="result")
+        iq["pubsub"]["items"]["node"] = node
+        item = stanza.Item()
+        item["payload"] = pack_item("old")
+        iq["pubsub"]["items"].append(item)
+        return iq
+
+    agent.pubsub.pubsub.get_items = get_items
+
+    await agent.artifacts.focus("artifact@server", callback, last=1)
+
+    callback.assert_called_once_with("artifact@server", "new")
+    assert agent.artifacts.snapshot("artifact@server") == "new"
+
+
+def _event(node, payload):
+    msg = SlixmppMessage()
+    msg["pubsub_event"]["items"]["node"] = node
+    msg["pubsub_event"]["items"]["item"]["publisher"] = node
+    msg["pubsub_event"]["items"]["item"]["payload"] = pack_item(payload)
+    return msg
@@ -0,0 +1,100 @@
+import multiprocessing
+from unittest.mock import Mock
+
+from spade_artifact.launcher import STATS, ArtifactSpec, Launcher, shard
+
+from .factories import MockedConnectedArtifact
+
+
+class IdleArtifact(MockedConnectedArtifact):
+    async def run(self):
+        self.set("pid", "running")
+        await self.join()
+
+
+class BrokenArtifact(MockedConnectedArtifact):
+    async def setup(self):
+        raise ValueError("broken")
+
+
+def _spec(factory, jid):
+    return ArtifactSpec(factory, kwargs={"jid": jid, "password": "fake_password"})
+
+
+def test_shard_round_robin():
+    specs = [_spec(IdleArtifact, f"a{i}@server") for i in range(5)]
+
+    shards = shard(specs, 2)
+
+    assert [[spec.jid for spec in specs] for specs in shards] == [
+        ["a0@server", "a2@server", "a4@server"],
+        ["a1@server", "a3@server"],
+    ]
+    assert len(shard(specs[:1], 4)) == 1
+
+
+def test_spec_from_import_path():
+    spec = ArtifactSpec(
+        "tests.test_launcher:IdleArtifact",
+        kwargs={"jid": "a@server", "password": "fake_password"},
+    )
+
+    artifact = spec.build()
+
+    assert isinstance(artifact, IdleArtifact)
+    assert spec.jid == "a@server"
+
+
+def test_spec_without_kwargs():
+    factory = Mock()
+    spec = ArtifactSpec(factory, args=("a@server", "fake_password"))
+
+    assert spec.jid == "a@server"
+    assert spec.build() is factory.return_value
+    factory.assert_called_once_with("a@server", "fake_password")
+    assert ArtifactSpec(factory).kwargs is None
+
+
+def test_late_answers_are_discarded():
+    launcher = Launcher([_spec(IdleArtifact, "a@server")], workers=1)
+    parent, child = multiprocessing.Pipe()
+    launcher._processes = [Mock(pid=1, is_alive=Mock(return_value=True))]
+    launcher._connections = [parent]
+    report = {"a@server": {"alive": True, "error": None}}
+
+    assert launcher.health(timeout=0.01)["failed"] == ["a@server"]
+    assert child.recv() == (STATS, 1)
+    child.send((STATS, 1, {}))
+    child.send((STATS, 2, report))
+
+    assert launcher.health(timeout=1)["alive_artifacts"] == 1
+    assert child.recv() == (STATS, 2)
+    parent.close()
+    child.close()
+
+
+def test_launcher_runs_artifacts_in_workers():
+    specs = [_spec(IdleArtifact, f"a{i}@server") for i in range(4)]
+    specs.append(_spec(BrokenArtifact, "broken@server"))
+    launcher = Launcher(specs, workers=2, start_method="spawn")
+
+    started = launcher.start(timeout=30)
+    try:
+        assert started["workers"] == 2
+        assert started["alive_workers"] == 2
+        assert started["artifacts"] == 5
+        assert started["alive_artifacts"] == 4
+        assert started["failed"] == ["broken@server"]
+        assert len(set(started["pids"])) == 2
+
+        stats = launcher.stats()
+        assert stats["knowledge"]["size"] == 4
+        assert stats["mailbox"]["size"] == 0
+        assert stats["in_flight"] == 0
+        assert stats["by_artifact"]["a0@server"]["alive"]
+        assert "broken" in stats["by_artifact"]["broken@server"]["error"]
+    finally:
+        stopped = launcher.stop(timeout=30)
+
+    assert stopped["alive_artifacts"] == 0
+    assert stopped["alive_workers"] == 0
@@ -0,0 +1,204 @@
+import asyncio
+from unittest.mock import Mock, call
+
+from spade.agent import Agent
+
+from spade_artifact import Artifact, ArtifactMixin, loopback
+from spade_artifact.fake_pubsub import FakePubSubServer
+
+
+class PublisherArtifact(Artifact):
+    async def run(self):
+        await self.join()
+
+
+class FocusingAgent(ArtifactMixin, Agent):
+    pass
+
+
+async def _start(server, *entities):
+    for entity in entities:
+        server.attach(entity)
+        if isinstance(entity, Artifact):
+            entity.set_loop(asyncio.get_running_loop())
+        await entity.start(auto_register=False)
+
+
+async def _stop(*entities):
+    for entity in entities:
+        await entity.stop()
+
+
+async def test_local_subscribers_get_python_objects():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_loopback()
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, agent)
+    callback = Mock()
+    await agent.artifacts.focus("publisher@localhost", callback)
+
+    payload = {"temperature": 21.5}
+    await artifact.publish(payload)
+    await artifact.publish_many(["a", "b"])
+    await asyncio.sleep(0)
+
+    assert callback.call_args_list == [
+        call("publisher@localhost", payload),
+        call("publisher@localhost", "a"),
+        call("publisher@localhost", "b"),
+    ]
+    assert callback.call_args_list[0].args[1] is payload
+    assert server.stats["published"] == 2
+    assert server.stats["delivered"] == 0
+    await _stop(artifact, agent)
+
+
+async def test_remote_subscribers_are_served_through_pubsub():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    remote = FocusingAgent("remote@localhost", "secret")
+    local = FocusingAgent("local@localhost", "secret")
+    await _start(server, artifact, remote, local)
+    remote_callback, local_callback = Mock(), Mock()
+    await remote.artifacts.focus("publisher@localhost", remote_callback)
+    artifact.set_loopback()
+    await local.artifacts.focus("publisher@localhost", local_callback)
+
+    await artifact.publish("1")
+    await asyncio.sleep(0)
+
+    remote_callback.assert_called_once_with("publisher@localhost", "1")
+    local_callback.assert_called_once_with("publisher@localhost", "1")
+    assert server.stats["delivered"] == 1
+    await _stop(artifact, remote, local)
+
+
+async def test_local_delivery_order_is_deterministic():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_loopback(remote=False)
+    linked = PublisherArtifact("linked@localhost", "secret")
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, linked, agent)
+    received = []
+    await linked.link("publisher@localhost", lambda jid, p: received.append(("l", p)))
+    await agent.artifacts.focus(
+        "publisher@localhost", lambda jid, p: received.append(("a", p))
+    )
+
+    for i in range(3):
+        await artifact.publish(i)
+    assert received == []
+    await asyncio.sleep(0)
+
+    assert received == [("l", 0), ("a", 0), ("l", 1), ("a", 1), ("l", 2), ("a", 2)]
+    assert server.stats["published"] == 0
+    await _stop(artifact, linked, agent)
+
+
+async def test_property_nodes_and_deltas_are_delivered_locally():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_loopback()
+    artifact.set_property_nodes()
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, agent)
+    await artifact.publish_property("temperature", 20)
+    state_callback, property_callback = Mock(), Mock()
+    await agent.artifacts.focus("publisher@localhost", state_callback)
+    await agent.artifacts.focus(
+        "publisher@localhost", property_callback, properties=["temperature"]
+    )
+    artifact.set_delta()
+
+    await artifact.publish({"a": 1, "b": 2})
+    await artifact.publish({"a": 1, "b": 3})
+    await artifact.publish_property("temperature", 21)
+    await asyncio.sleep(0)
+
+    assert [c.args[1] for c in state_callback.call_args_list] == [
+        {"a": 1, "b": 2},
+        {"a": 1, "b": 3},
+    ]
+    property_callback.assert_called_once_with(
+        "publisher@localhost", {"temperature": 21}
+    )
+    await _stop(artifact, agent)
+
+
+async def test_ignore_unsubscribes_locally():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_loopback()
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, agent)
+    callback = Mock()
+    await agent.artifacts.focus("publisher@localhost", callback)
+    await agent.artifacts.ignore("publisher@localhost")
+
+    await artifact.publish("1")
+    await asyncio.sleep(0)
+
+    callback.assert_not_called()
+    assert not loopback.is_subscribed(
+        server.jid, "publisher@localhost", agent.artifacts._deliver
+    )
+    await _stop(artifact, agent)
+
+
+async def test_stopped_publisher_is_not_local():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_loopback()
+    await _start(server, artifact)
+    assert loopback.is_local(server.jid, "publisher@localhost/properties/x")
+
+    await artifact.stop()
+
+    assert not loopback.is_local(server.jid, "publisher@localhost")
+
+
+async def test_local_subscribers_move_to_pubsub_when_loopback_is_disabled():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_loopback(remote=False)
+    linked = PublisherArtifact("linked@localhost", "secret")
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, linked, agent)
+    link_callback, focus_callback = Mock(), Mock()
+    await linked.link("publisher@localhost", link_callback)
+    await agent.artifacts.focus("publisher@localhost", focus_callback)
+
+    artifact.set_loopback(False)
+    await asyncio.sleep(0.01)
+    await artifact.publish("1")
+    await asyncio.sleep(0.01)
+
+    link_callback.assert_called_once_with("publisher@localhost", "1")
+    focus_callback.assert_called_once_with("publisher@localhost", "1")
+    assert server.stats["delivered"] == 2
+    assert not loopback.is_subscribed(
+        server.jid, "publisher@localhost", agent.artifacts._deliver
+    )
+    await _stop(artifact, linked, agent)
+
+
+async def test_local_subscribers_move_to_pubsub_when_the_publisher_stops():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_loopback()
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, agent)
+    callback = Mock()
+    await agent.artifacts.focus("publisher@localhost", callback)
+
+    await artifact.stop()
+    await asyncio.sleep(0.01)
+    publisher = PublisherArtifact("publisher@localhost", "secret")
+    await _start(server, publisher)
+    await publisher.publish("1")
+    await asyncio.sleep(0.01)
+
+    callback.assert_called_once_with("publisher@localhost", "1")
+    await _stop(publisher, agent)
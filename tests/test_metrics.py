@@ -0,0 +1,172 @@
+import asyncio
+from unittest.mock import Mock
+
+import aiohttp
+import pytest
+from slixmpp import Message as SlixmppMessage
+from spade.message import Message
+from spade.template import Template
+
+from spade_artifact import metrics
+from spade_artifact.agent import ArtifactComponent
+from spade_artifact.dispatch import CallbackDispatcher
+from spade_artifact.metrics import MetricsRegistry
+from spade_artifact.payload import pack_batch
+
+from .factories import MockedConnectedArtifactFactory
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.enable()
+    yield metrics.registry
+    metrics.disable()
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("items_total", "Items", ("jid",)).labels('a@server/"x"\\\n').inc()
+
+    assert 'items_total{jid="a@server/\\"x\\"\\\\\\n"} 1' in registry.render()
+
+
+def test_render_counters_and_gauges():
+    registry = MetricsRegistry()
+    counter = registry.counter("items_total", "Items", ("jid",))
+    counter.labels("a@server").inc()
+    counter.labels("a@server").inc(2)
+    registry.gauge("size", "Size").labels().set(1.5)
+
+    assert registry.render() == (
+        "# HELP items_total Items\n"
+        "# TYPE items_total counter\n"
+        'items_total{jid="a@server"} 3\n'
+        "# HELP size Size\n"
+        "# TYPE size gauge\n"
+        "size 1.5\n"
+    )
+
+
+def test_render_histogram():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency", "Latency", buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.labels().observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'latency_bucket{le="0.1"} 1',
+        'latency_bucket{le="1"} 2',
+        'latency_bucket{le="+Inf"} 3',
+        "latency_sum 5.55",
+        "latency_count 3",
+    ]
+
+
+def test_registry_returns_existing_metrics():
+    registry = MetricsRegistry()
+    counter = registry.counter("items_total", "Items")
+
+    assert registry.counter("items_total", "Items") is counter
+    with pytest.raises(ValueError):
+        registry.gauge("items_total", "Items")
+    with pytest.raises(ValueError):
+        counter.labels("unexpected")
+
+
+def test_bind_is_none_while_disabled():
+    assert metrics.bind("a@server") is None
+
+
+async def test_dispatcher_observes_callback_time():
+    registry = MetricsRegistry()
+    dispatcher = CallbackDispatcher()
+    dispatcher.histogram = registry.histogram("seconds", "Seconds").labels()
+
+    async def callback(jid, payload):
+        pass
+
+    dispatcher.dispatch("node", Mock(), "jid", "payload")
+    dispatcher.dispatch("node", callback, "jid", "payload")
+    await dispatcher.join()
+
+    assert dispatcher.histogram.count == 2
+
+
+async def test_artifact_metrics(enabled_metrics):
+    artifact = MockedConnectedArtifactFactory(jid="metrics@server")
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    callback = Mock()
+    artifact.subscriptions["other@server"] = [callback]
+
+    await artifact.publish("1")
+    await artifact.publish_many(["2", "3"])
+    await artifact.send(Message(to="other@server"))
+    artifact._message_received(SlixmppMessage())
+    msg = SlixmppMessage()
+    msg["pubsub_event"]["items"]["node"] = "other@server"
+    msg["pubsub_event"]["items"]["item"]["publisher"] = "other@server"
+    msg["pubsub_event"]["items"]["item"]["payload"] = pack_batch(["x", "y"])
+    artifact.on_item_published(msg)
+
+    text = enabled_metrics.render()
+    assert 'spade_artifact_published_items_total{jid="metrics@server"} 3' in text
+    assert 'spade_artifact_publish_seconds_count{jid="metrics@server"} 2' in text
+    assert 'spade_artifact_sent_messages_total{jid="metrics@server"} 1' in text
+    assert 'spade_artifact_received_messages_total{jid="metrics@server"} 1' in text
+    assert 'spade_artifact_mailbox_messages{jid="metrics@server"} 1' in text
+    assert 'spade_artifact_received_items_total{jid="metrics@server"} 2' in text
+    assert 'spade_artifact_callback_seconds_count{jid="metrics@server"} 2' in text
+
+    await artifact.receive()
+    assert 'spade_artifact_mailbox_messages{jid="metrics@server"} 0' in (
+        enabled_metrics.render()
+    )
+
+
+async def test_routed_messages_do_not_change_the_mailbox_gauge(enabled_metrics):
+    artifact = MockedConnectedArtifactFactory(jid="router@server")
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    artifact.add_route(Template(body="routed"))
+    routed = SlixmppMessage()
+    routed["body"] = "routed"
+    artifact._metrics.mailbox_messages = Mock()
+
+    artifact._message_received(routed)
+    artifact._message_received(SlixmppMessage())
+
+    artifact._metrics.mailbox_messages.set.assert_called_once_with(1)
+    text = enabled_metrics.render()
+    assert 'spade_artifact_received_messages_total{jid="router@server"} 2' in text
+
+
+async def test_serve_metrics():
+    registry = MetricsRegistry()
+    registry.counter("items_total", "Items").labels().inc()
+    runner = await metrics.serve(port=0, metrics_registry=registry)
+    try:
+        port = runner.addresses[0][1]
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                assert response.status == 200
+                assert "items_total 1" in await response.text()
+    finally:
+        await runner.cleanup()
+
+
+async def test_agent_metrics(enabled_metrics):
+    agent = Mock()
+    agent.jid = "agent@server"
+    component = ArtifactComponent(agent)
+    component.focus_callbacks["other@server"] = [Mock()]
+    msg = SlixmppMessage()
+    msg["pubsub_event"]["items"]["node"] = "other@server"
+    msg["pubsub_event"]["items"]["item"]["publisher"] = "other@server"
+    msg["pubsub_event"]["items"]["item"]["payload"] = pack_batch(["x", "y"])
+
+    component.on_item_published(msg)
+
+    text = enabled_metrics.render()
+    assert 'spade_artifact_received_items_total{jid="agent@server"} 2' in text
+    assert 'spade_artifact_callback_seconds_count{jid="agent@server"} 2' in text
@@ -0,0 +1,63 @@
+import pytest
+
+from spade_artifact.codecs import get_codec
+from spade_artifact.compression import MAX_DECOMPRESSED_SIZE
+from spade_artifact.payload import (
+    PayloadError,
+    build_payload,
+    compress_payload,
+    pack_batch,
+    pack_item,
+    unpack,
+)
+
+
+def test_unpack_plain_payload():
+    assert unpack(build_payload("hello")) == ["hello"]
+
+
+def test_pack_and_unpack_batch():
+    payload = pack_batch(["a", "b", "c"])
+    assert payload.get("type") == "batch"
+    assert unpack(payload) == ["a", "b", "c"]
+
+
+def test_pack_and_unpack_with_codec():
+    codec = get_codec("json")
+    payload = pack_item({"a": 1}, codec)
+    assert payload.get("codec") == "json"
+    assert unpack(payload) == [{"a": 1}]
+
+    batch = pack_batch([{"a": 1}, [2, 3]], codec)
+    assert batch.get("type") == "batch"
+    assert unpack(batch) == [{"a": 1}, [2, 3]]
+
+
+def test_unpack_unknown_codec():
+    with pytest.raises(PayloadError):
+        unpack(build_payload("data", codec="unknown"))
+
+
+def test_unpack_corrupted_payload():
+    with pytest.raises(PayloadError):
+        unpack(build_payload("{not json", codec="json"))
+
+
+def test_compressed_payload_roundtrip():
+    batch = pack_batch([{"a": "x" * 100}, {"b": 2}], get_codec("json"))
+    compressed = compress_payload(batch, "zlib")
+    assert compressed.get("compression") == "zlib"
+    assert compressed.get("codec") == "json"
+    assert compressed.get("type") == "batch"
+    assert unpack(compressed) == [{"a": "x" * 100}, {"b": 2}]
+
+
+def test_compressed_plain_payload_roundtrip():
+    assert unpack(compress_payload(build_payload("hello"), "zlib")) == ["hello"]
+
+
+def test_unpack_refuses_decompression_bombs():
+    bomb = compress_payload(build_payload("\0" * (MAX_DECOMPRESSED_SIZE + 1)), "zlib")
+
+    with pytest.raises(PayloadError):
+        unpack(bomb)
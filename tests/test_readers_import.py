@@ -0,0 +1,68 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from spade_artifact.common import readers
+from spade_artifact.common.readers.sqlreader import DatabaseQueryArtifact, load_driver
+
+DRIVERS = ["psycopg", "pymysql", "sqlite3", "pandas", "motor"]
+
+# The import times are measured by benchmarks/reader_imports.py
+COLD_IMPORT = """
+import json, sys
+import spade_artifact
+{statement}
+print(json.dumps({{
+    "loaded": [name for name in {drivers!r} if name in sys.modules],
+}}))
+"""
+
+
+def _cold_import(statement):
+    code = COLD_IMPORT.format(statement=statement, drivers=DRIVERS)
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+@pytest.mark.parametrize(
+    "module",
+    ["apireader", "csvreader", "sqlreader", "mongodbreader", "context_broker_inserter"],
+)
+def test_readers_do_not_import_drivers(module):
+    result = _cold_import(f"import spade_artifact.common.readers.{module}")
+
+    assert result["loaded"] == []
+
+
+def test_connecting_imports_only_the_chosen_driver():
+    result = _cold_import(
+        "from spade_artifact.common.readers import get_reader\n"
+        "get_reader('sql')\n"
+        "from spade_artifact.common.readers.sqlreader import load_driver\n"
+        "load_driver('sqlite')"
+    )
+
+    assert result["loaded"] == ["sqlite3"]
+
+
+def test_reader_registry():
+    assert readers.get_reader("sql") is DatabaseQueryArtifact
+    assert readers.get_reader("DatabaseQueryArtifact") is DatabaseQueryArtifact
+    assert readers.DatabaseQueryArtifact is DatabaseQueryArtifact
+    assert "CSVReaderArtifact" in dir(readers)
+    with pytest.raises(KeyError):
+        readers.get_reader("unknown")
+    with pytest.raises(AttributeError):
+        readers.UnknownArtifact
+
+
+def test_load_driver():
+    import sqlite3
+
+    assert load_driver("sqlite") is sqlite3
+    with pytest.raises(ValueError):
+        load_driver("oracle")
@@ -0,0 +1,170 @@
+import asyncio
+from unittest.mock import Mock, patch
+
+import pytest
+from slixmpp import Message as SlixmppMessage
+from spade.message import Message
+from spade.template import Template
+
+from spade_artifact.routing import MessageRouter
+
+from .factories import MockedConnectedArtifactFactory
+
+
+def _message(body="", sender="sender@server", thread=None, **metadata):
+    msg = Message(to="fake@jid", sender=sender, body=body, thread=thread)
+    for key, value in metadata.items():
+        msg.set_metadata(key, value)
+    return msg
+
+
+def _stanza(body="", thread=None, **metadata):
+    client = Mock()
+    client.Message = SlixmppMessage
+    if thread:
+        metadata.setdefault("performative", "inform")
+    return _message(body, thread=thread, **metadata).prepare(client)
+
+
+def test_route_by_exact_fields():
+    router = MessageRouter()
+    inform = Template(metadata={"performative": "inform"})
+    request = Template(metadata={"performative": "request"})
+    thread = Template(thread="t1")
+    sender = Template(sender="boss@server")
+    router.add(inform)
+    router.add(request)
+    router.add(thread)
+    router.add(sender)
+
+    assert router.route(_message(performative="request")).template is request
+    assert router.route(_message(thread="t1")).template is thread
+    assert router.route(_message(sender="boss@server")).template is sender
+    assert router.route(_message(performative="query")) is None
+    assert router.route(_message(sender="boss@server/home")) is None
+    assert len(router) == 4
+
+
+def test_first_route_added_wins():
+    router = MessageRouter()
+    inform = Template(metadata={"performative": "inform"})
+    boss = Template(sender="boss@server", metadata={"performative": "inform"})
+    anything = Template()
+    router.add(inform)
+    router.add(boss)
+    router.add(anything)
+
+    msg = _message(sender="boss@server", performative="inform")
+    assert router.route(msg).template is inform
+    router.remove(inform)
+    assert router.route(msg).template is boss
+    assert router.route(_message()).template is anything
+
+
+def test_indexed_templates_are_not_matched_one_by_one():
+    router = MessageRouter()
+    templates = [Template(thread=f"t{i}") for i in range(1000)]
+    for template in templates:
+        router.add(template)
+
+    with patch.object(Template, "match") as match:
+        assert router.route(_message(thread="t999")).template is templates[999]
+        match.assert_not_called()
+
+
+def test_route_composite_templates():
+    router = MessageRouter()
+    indexed = Template(thread="t1")
+    either = Template(metadata={"performative": "inform"}) | Template(body="ping")
+    router.add(either)
+    router.add(indexed)
+
+    assert router.route(_message(body="ping")).template is either
+    assert router.route(_message(thread="t1", body="ping")).template is either
+    assert router.route(_message(thread="t1")).template is indexed
+    assert router.route(_message(body="pong")) is None
+
+    router.remove(either)
+    assert router.route(_message(body="ping")) is None
+    assert router.remove(either) is None
+
+
+def test_remove_route_of_modified_template():
+    router = MessageRouter()
+    template = Template(thread="t1")
+    router.add(template)
+    template.thread = "t2"
+
+    assert router.remove(template) is not None
+    assert len(router) == 0
+    assert router.route(_message(thread="t1")) is None
+
+
+async def test_artifact_routes_to_queues():
+    artifact = MockedConnectedArtifactFactory()
+    requests = Template(metadata={"performative": "request"})
+    artifact.add_route(requests)
+
+    artifact._message_received(_stanza("1", performative="request"))
+    artifact._message_received(_stanza("2"))
+    artifact._message_received(_stanza("3", performative="request"))
+
+    assert artifact.mailbox_size() == 1
+    assert artifact.mailbox_size(requests) == 2
+    assert [msg.body for msg in await artifact.receive_many(template=requests)] == [
+        "1",
+        "3",
+    ]
+    assert (await artifact.receive()).body == "2"
+    assert await artifact.receive(template=requests) is None
+    with pytest.raises(ValueError):
+        await artifact.receive(template=Template(thread="unknown"))
+
+
+async def test_route_queues_are_bounded_like_the_mailbox():
+    artifact = MockedConnectedArtifactFactory()
+    artifact.set_mailbox(1, "drop-oldest")
+    thread = Template(thread="t1")
+    artifact.add_route(thread)
+
+    artifact._message_received(_stanza("1", thread="t1"))
+    artifact._message_received(_stanza("2", thread="t1"))
+
+    assert (await artifact.receive(template=thread)).body == "2"
+    assert artifact.mailbox_stats()["dropped_oldest"] == 1
+
+
+async def test_artifact_routes_to_handlers():
+    artifact = MockedConnectedArtifactFactory()
+    handled = []
+
+    async def on_ping(msg):
+        handled.append(msg.body)
+
+    artifact.add_route(Template(body="ping"), on_ping)
+    failing = Mock(side_effect=RuntimeError("boom"))
+    artifact.add_route(Template(body="fail"), failing)
+
+    artifact._message_received(_stanza("ping"))
+    artifact._message_received(_stanza("fail"))
+    artifact._message_received(_stanza("pong"))
+    await asyncio.sleep(0)
+
+    assert handled == ["ping"]
+    failing.assert_called_once()
+    assert isinstance(failing.call_args.args[0], Message)
+    assert (await artifact.receive()).body == "pong"
+
+
+async def test_remove_route_moves_queued_messages_to_the_mailbox():
+    artifact = MockedConnectedArtifactFactory()
+    thread = Template(thread="t1")
+    artifact.add_route(thread)
+    artifact._message_received(_stanza("1", thread="t1"))
+
+    artifact.remove_route(thread)
+    artifact._message_received(_stanza("2", thread="t1"))
+
+    assert [msg.body for msg in await artifact.receive_many()] == ["1", "2"]
+    with pytest.raises(ValueError):
+        artifact.mailbox_size(thread)
@@ -0,0 +1,277 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+from spade.agent import Agent
+
+from spade_artifact import Artifact, ArtifactMixin, Priority, metrics
+from spade_artifact.fake_pubsub import FakePubSubServer
+from spade_artifact.scheduler import PublishScheduler, TokenBucket
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class PublisherArtifact(Artifact):
+    async def run(self):
+        await self.join()
+
+
+class FocusingAgent(ArtifactMixin, Agent):
+    pass
+
+
+def _recorder():
+    sent = []
+
+    async def send(name, payloads):
+        sent.append((name, payloads))
+
+    return sent, send
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(2, burst=3, clock=clock)
+
+    for _ in range(3):
+        assert bucket.delay() == 0
+        bucket.consume()
+    assert bucket.delay() == pytest.approx(0.5)
+
+    clock.now = 0.5
+    assert bucket.delay() == 0
+    clock.now = 100
+    bucket.consume(3)
+    assert bucket.delay() == pytest.approx(0.5)
+
+
+def test_token_bucket_defaults_to_one_second_burst():
+    assert TokenBucket(10).burst == 10
+    assert TokenBucket(0.2).burst == 1
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+    with pytest.raises(ValueError):
+        TokenBucket(1, burst=0.5)
+
+
+async def test_higher_priority_lanes_are_published_first():
+    sent, send = _recorder()
+    scheduler = PublishScheduler(send, TokenBucket(1000, burst=1))
+
+    await scheduler.put(None, ["low"], Priority.LOW)
+    await scheduler.put(None, ["normal"])
+    await scheduler.put(None, ["high"], "high")
+    assert scheduler.depth() == {"high": 1, "normal": 1, "low": 1}
+    await scheduler.join()
+
+    assert sent == [(None, ["high"]), (None, ["normal"]), (None, ["low"])]
+    assert scheduler.depth() == {"high": 0, "normal": 0, "low": 0}
+    assert scheduler.stats["published"] == 3
+    scheduler.close()
+
+
+async def test_consecutive_payloads_are_packed():
+    sent, send = _recorder()
+    scheduler = PublishScheduler(send, TokenBucket(1000, burst=1), max_items=3)
+
+    for i in range(4):
+        await scheduler.put(None, [i])
+    await scheduler.put("temperature", [20])
+    await scheduler.join()
+
+    assert sent == [(None, [0, 1, 2]), (None, [3]), ("temperature", [20])]
+    scheduler.close()
+
+
+async def test_put_waits_while_the_lane_is_full():
+    sent, send = _recorder()
+    scheduler = PublishScheduler(send, TokenBucket(20, burst=1), queue_size=2)
+
+    for i in range(3):
+        await asyncio.wait_for(scheduler.put(None, [i], Priority.LOW), 0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(scheduler.put(None, [3], Priority.LOW), 0.01)
+    await asyncio.wait_for(scheduler.put(None, ["alarm"], Priority.HIGH), 0.01)
+
+    await scheduler.put(None, [4], Priority.LOW)
+    await scheduler.join()
+
+    assert sent == [
+        (None, [0]),
+        (None, ["alarm"]),
+        (None, [1]),
+        (None, [2]),
+        (None, [4]),
+    ]
+    assert scheduler.stats["blocked"] >= 2
+    assert scheduler.stats["throttled"] > 0
+
+
+async def test_failures_do_not_stop_the_worker():
+    send = Mock(side_effect=[RuntimeError("rejected"), asyncio.sleep(0)])
+    scheduler = PublishScheduler(send, TokenBucket(1000))
+
+    await scheduler.put(None, [1])
+    await scheduler.put(None, [2])
+    await scheduler.join()
+
+    assert scheduler.stats["failed"] == 1
+    assert scheduler.stats["published"] == 1
+    scheduler.close()
+
+
+async def test_close_discards_queued_payloads():
+    sent, send = _recorder()
+    scheduler = PublishScheduler(send, TokenBucket(1, burst=1))
+
+    for i in range(3):
+        await scheduler.put(None, [i])
+    await asyncio.sleep(0)
+
+    assert scheduler.close() == 2
+    assert sent == [(None, [0])]
+    assert scheduler.depth() == {"high": 0, "normal": 0, "low": 0}
+
+
+async def _start(server, *entities):
+    for entity in entities:
+        server.attach(entity)
+        if isinstance(entity, Artifact):
+            entity.set_loop(asyncio.get_running_loop())
+        await entity.start(auto_register=False)
+
+
+async def test_artifact_rate_limit():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_rate_limit(1000, burst=1, queue_size=10)
+    artifact.set_property_nodes()
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, agent)
+    await artifact.publish_property("temperature", 19)
+    await artifact.drain()
+    callback = Mock()
+    await agent.artifacts.focus("publisher@localhost", callback)
+    await agent.artifacts.focus(
+        "publisher@localhost", callback, properties=["temperature"]
+    )
+
+    await artifact.publish_many(["a", "b", "c"], priority=Priority.LOW)
+    await artifact.publish("alarm", priority=Priority.HIGH)
+    await artifact.publish_property("temperature", 20)
+    assert artifact.publish_queue_stats()["queued"] == {
+        "high": 1,
+        "normal": 1,
+        "low": 3,
+    }
+    await artifact.drain()
+    await asyncio.sleep(0.01)
+
+    assert [c.args[1] for c in callback.call_args_list] == [
+        "alarm",
+        {"temperature": 20},
+        "a",
+        "b",
+        "c",
+    ]
+    stats = artifact.publish_queue_stats()
+    assert stats["published"] == 6
+    assert stats["capacity"] == 10
+    await artifact.stop()
+    await agent.stop()
+
+
+async def test_artifact_rate_limit_with_deltas():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_delta()
+    artifact.set_rate_limit(1000, burst=1)
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, agent)
+    callback = Mock()
+    await agent.artifacts.focus("publisher@localhost", callback)
+
+    await artifact.publish({"level": 1, "unit": "m"}, priority=Priority.LOW)
+    await artifact.publish({"level": 2, "unit": "m"}, priority=Priority.LOW)
+    await artifact.publish({"level": 9, "unit": "m"}, priority=Priority.HIGH)
+    await artifact.drain()
+    await asyncio.sleep(0.01)
+
+    assert [c.args[1]["level"] for c in callback.call_args_list] == [9, 1, 2]
+    await artifact.stop()
+    await agent.stop()
+
+
+async def test_rate_limit_can_be_disabled():
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_rate_limit(10)
+    artifact.set_rate_limit(None)
+
+    assert artifact._scheduler is None
+    assert artifact.publish_queue_stats()["queued"] == {
+        "high": 0,
+        "normal": 0,
+        "low": 0,
+    }
+
+
+async def test_queue_depth_metrics():
+    metrics.enable()
+    try:
+        server = FakePubSubServer()
+        artifact = PublisherArtifact("publisher@localhost", "secret")
+        artifact.set_rate_limit(1, burst=1)
+        await _start(server, artifact)
+
+        for i in range(3):
+            await artifact.publish(i, priority="low")
+        await asyncio.sleep(0.01)
+
+        assert (
+            'spade_artifact_publish_queue_payloads{jid="publisher@localhost",priority="low"} 2'
+            in metrics.registry.render()
+        )
+        await artifact.stop()
+    finally:
+        metrics.disable()
+
+
+async def test_stop_publishes_the_queued_payloads():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_rate_limit(1000, burst=1)
+    artifact.define_observable("t", 0)
+    agent = FocusingAgent("agent@localhost", "secret")
+    await _start(server, artifact, agent)
+    callback = Mock()
+    await agent.artifacts.focus("publisher@localhost", callback)
+
+    await artifact.publish_many(["a", "b"], priority=Priority.LOW)
+    artifact.set("t", 5)
+    await artifact.stop()
+    await asyncio.sleep(0.01)
+
+    assert [c.args[1] for c in callback.call_args_list] == [{"t": 5}, "a", "b"]
+    assert artifact.publish_queue_stats()["published"] == 3
+    await agent.stop()
+
+
+async def test_stop_discards_the_payloads_queued_after_the_timeout():
+    server = FakePubSubServer()
+    artifact = PublisherArtifact("publisher@localhost", "secret")
+    artifact.set_rate_limit(10, burst=1, stop_timeout=0.05)
+    await _start(server, artifact)
+
+    for i in range(5):
+        await artifact.publish(i)
+    await asyncio.wait_for(artifact.stop(), 1)
+
+    stats = artifact.publish_queue_stats()
+    assert 1 <= stats["published"] < 5
+    assert sum(stats["queued"].values()) == 0
@@ -0,0 +1,147 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+from slixmpp.exceptions import IqError
+from slixmpp.stanza import Iq
+
+from spade_artifact import start_all
+from spade_artifact.nodes import is_node_known, remember_nodes
+
+from .factories import MockedConnectedArtifact
+
+
+class IdleArtifact(MockedConnectedArtifact):
+    async def run(self):
+        await self.join()
+
+
+class Artifacts:
+    def __init__(self, n):
+        self.connecting = 0
+        self.peak = 0
+        self.artifacts = []
+        for i in range(n):
+            artifact = IdleArtifact(jid=f"a{i}@server", password="fake_password")
+            artifact.loop = asyncio.get_event_loop()
+            artifact._async_connect = AsyncMock(side_effect=self.connect)
+            self.artifacts.append(artifact)
+
+    async def connect(self):
+        self.connecting += 1
+        self.peak = max(self.peak, self.connecting)
+        await asyncio.sleep(0.01)
+        self.connecting -= 1
+
+    async def stop(self):
+        for artifact in self.artifacts:
+            await artifact.stop()
+
+
+async def test_start_all_bounds_parallelism():
+    artifacts = Artifacts(10)
+
+    report = await start_all(artifacts.artifacts, max_parallel=3)
+
+    assert report["started"] == 10
+    assert report["failed"] == {}
+    assert artifacts.peak == 3
+    assert all(artifact.is_alive() for artifact in artifacts.artifacts)
+    assert set(report["times"]) == {"connect", "discover", "node", "setup", "total"}
+    assert set(artifacts.artifacts[0].startup_times) == {"connect", "node", "setup"}
+    await artifacts.stop()
+
+
+async def test_start_all_skips_existing_nodes():
+    artifacts = Artifacts(3)
+    first = artifacts.artifacts[0]
+    first._hook_plugin_after_connection = _with_nodes(first, ["a1@server"])
+
+    report = await start_all(artifacts.artifacts)
+
+    assert report["nodes_skipped"] == 1
+    first.pubsub.get_nodes.assert_awaited_once_with(first.pubsub_server)
+    assert artifacts.artifacts[1].pubsub.create.await_count == 0
+    assert artifacts.artifacts[2].pubsub.create.await_count == 1
+    assert is_node_known(first.pubsub_server, "a2@server")
+    await artifacts.stop()
+
+
+async def test_start_all_reports_failures():
+    artifacts = Artifacts(3)
+    broken = artifacts.artifacts[1]
+    broken._async_connect = AsyncMock(side_effect=ConnectionError("refused"))
+
+    report = await start_all(artifacts.artifacts)
+
+    assert report["started"] == 2
+    assert list(report["failed"]) == ["a1@server"]
+    assert not broken.is_alive()
+    await artifacts.stop()
+
+
+async def test_start_all_stops_artifacts_failing_after_connecting():
+    artifacts = Artifacts(3)
+    broken_node, broken_setup = artifacts.artifacts[1:]
+    for artifact in (broken_node, broken_setup):
+        artifact._hook_plugin_after_connection = _with_disconnect(artifact)
+    broken_node._create_node = AsyncMock(side_effect=RuntimeError("forbidden"))
+    broken_setup.setup = AsyncMock(side_effect=RuntimeError("boom"))
+
+    report = await start_all(artifacts.artifacts)
+
+    assert report["started"] == 1
+    assert sorted(report["failed"]) == ["a1@server", "a2@server"]
+    for artifact in (broken_node, broken_setup):
+        artifact.client.disconnect.assert_awaited_once()
+        assert not artifact.is_alive()
+    await artifacts.artifacts[0].stop()
+
+
+def _with_disconnect(artifact):
+    hook = artifact._hook_plugin_after_connection
+
+    async def hook_with_disconnect(*args, **kwargs):
+        await hook(*args, **kwargs)
+        artifact.client.disconnect = AsyncMock()
+
+    return hook_with_disconnect
+
+
+async def test_known_nodes_are_not_created_again():
+    artifact = IdleArtifact(jid="a@server", password="fake_password")
+    artifact.loop = asyncio.get_event_loop()
+    remember_nodes(artifact.pubsub_server, ["a@server"])
+
+    await artifact.start()
+
+    artifact.pubsub.create.assert_not_awaited()
+    await artifact.stop()
+
+
+def _with_nodes(artifact, nodes):
+    hook = artifact._hook_plugin_after_connection
+
+    async def hook_with_nodes(*args, **kwargs):
+        await hook(*args, **kwargs)
+        artifact.pubsub.get_nodes = AsyncMock(
+            return_value=[
+                {"jid": artifact.pubsub_server, "node": n, "name": None} for n in nodes
+            ]
+        )
+
+    return hook_with_nodes
+
+
+async def test_deleted_nodes_are_forgotten():
+    artifact = IdleArtifact(jid="a@server", password="fake_password")
+    artifact.loop = asyncio.get_event_loop()
+    await artifact.start()
+    assert is_node_known(artifact.pubsub_server, "a@server")
+    error = Iq(stype="error")
+    error["error"]["condition"] = "item-not-found"
+    artifact.pubsub.pubsub.publish = AsyncMock(side_effect=IqError(error))
+
+    await artifact.publish("payload")
+
+    assert not is_node_known(artifact.pubsub_server, "a@server")
+    await artifact.stop()